@@ -26,32 +26,74 @@ try:
     from .graph2_1 import (
         enable_colab_bridge,
         start_server,
+        stop_server,
         get_current_node,
+        add_click_listener,
+        remove_click_listener,
         get_click_history,
         get_simple_click_history,
         clear_click_history,
         get_clicks_by_source,
         print_click_summary,
-        hello1_d3,
-        show_graph1,
-        show_graph_force1,
-        show_graph_force_vanilla1,
-        show_graph_force_vanilla_checklist1,
-        show_matrix_layout1,
-        show_radar_layout1,
-        show_dashboard_matrix_radar_force7,
-        show_linked_dashboard,
+        configure_click_store,
+        enable_click_persistence,
+        disable_click_persistence,
+        get_clicks_between,
+        get_session_clicks,
+        list_click_sessions,
+        close_click_session,
         show_dashboard_map_force_radar_linked,
-        show_click_timecurve,             
-        show_click_timecurve_from_history
+        show_click_timecurve,
+        show_click_timecurve_from_history,
+        show_catalogue_map,
+        push_dashboard_update,
     )
 except Exception:
     # Si no existe graph.py en esta build, tampoco reventamos el import base
     pass
 
 
+# --- Análisis del historial de clicks (transiciones, tiempos, embudos) ---
+try:
+    from .click_analytics import (
+        transition_matrix,
+        transitions,
+        dwell_times,
+        dwell_summary,
+        source_funnel,
+        brush_sizes,
+        click_report,
+    )
+    from .click_db import load_click_dataframe
+except Exception:
+    pass
+
+
+# --- Assets estáticos compartidos (D3 / topojson / geometría de Perú) ---
+try:
+    from .graph_assets import (
+        set_asset_mode,
+        reset_asset_cache,
+        vendor_static_assets,
+    )
+    from .graph_export import export_dashboard
+except Exception:
+    pass
+
+
 # --- API de turismo basada en modelos entrenados ---
-from .turismo_dashboard_model import show_turismo_dashboard_from_model
+from .turismo_dashboard_model import (
+    show_turismo_dashboard_from_model,
+    show_catalogue_map_from_model,
+    update_turismo_dashboard,
+)
+
+
+# --- Feedback implícito de clicks para el ranking ---
+try:
+    from .turismo_feedback import ClickFeedback
+except Exception:
+    pass
 
 
 # --- Visualizaciones extra de turismo (clima, transporte, denuncias) ---
@@ -62,6 +104,7 @@ try:
         show_temperature_sunflower,
         show_region_weather_face,
         show_region_footprint,
+        clear_dataset_cache,
     )
 except Exception:
     # Si no existe el módulo en alguna build, simplemente no se exportan
@@ -72,15 +115,7 @@ __all__ = [
     # grafos (solo estarán si graph.py existe)
     "enable_colab_bridge",
     "start_server",
-    "hello1_d3",
-    "show_graph1",
-    "show_graph_force1",
-    "show_graph_force_vanilla1",
-    "show_graph_force_vanilla_checklist1",
-    "show_matrix_layout1",
-    "show_radar_layout1",
-    "show_dashboard_matrix_radar_force7",
-    "show_linked_dashboard",
+    "stop_server",
     "show_dashboard_map_force_radar_linked",
     # recommender (si existiera)
     "load_recs",
@@ -91,23 +126,52 @@ __all__ = [
     "show_city_details",
     "show_rec_dashboard",
     "get_current_node",
+    "add_click_listener",
+    "remove_click_listener",
     "get_click_history",
     "get_simple_click_history",
     "clear_click_history",
     "get_clicks_by_source",
     "print_click_summary",
+    "configure_click_store",
+    "enable_click_persistence",
+    "disable_click_persistence",
+    "get_clicks_between",
+    "get_session_clicks",
+    "list_click_sessions",
+    "close_click_session",
     "show_dashboard_map_force_radar_linked",
     "show_click_timecurve",
     "show_click_timecurve_from_history",
+    "show_catalogue_map",
+    "push_dashboard_update",
 ]
 
 __all__ += [
     "show_turismo_dashboard_from_model",
+    "show_catalogue_map_from_model",
+    "update_turismo_dashboard",
+    "ClickFeedback",
     # vistas extra
     "show_transport_access",
     "show_crime_monthly_dashboard",
     "show_temperature_sunflower",
     "show_region_weather_face",
     "show_region_footprint",
+    "clear_dataset_cache",
+    # análisis de clicks
+    "transition_matrix",
+    "transitions",
+    "dwell_times",
+    "dwell_summary",
+    "source_funnel",
+    "brush_sizes",
+    "click_report",
+    "load_click_dataframe",
+    # assets
+    "set_asset_mode",
+    "reset_asset_cache",
+    "vendor_static_assets",
+    "export_dashboard",
 ]
 __version__ = "8.0.0"
\ No newline at end of file
@@ -0,0 +1,298 @@
+# src/our_library/click_analytics.py
+
+"""
+Análisis del historial de clicks, vectorizado sobre NumPy.
+
+Todas las funciones reciben el DataFrame de get_click_dataframe() (log en
+memoria) o de load_click_dataframe(path) (base de ClickDB de sesiones
+anteriores). Trabajan sobre los códigos de las columnas Categorical y los
+timestamps como int64, sin recorrer filas en Python:
+
+  - transition_matrix / transitions : de qué nodo (o source) a cuál se
+    pasa entre eventos consecutivos del mismo dashboard
+  - dwell_times / dwell_summary     : tiempo hasta el siguiente evento
+  - source_funnel                   : embudo map-brush -> grafo -> score
+  - brush_sizes                     : tamaño de las selecciones del brush
+
+Los eventos se ordenan por sesión (dashboard) y, dentro de cada una, por
+timestamp; un evento sin sesión cuenta en un grupo común.
+"""
+
+import numpy as np
+
+# (etiqueta, source, interaction o None = cualquiera)
+DEFAULT_FUNNEL = (
+    ("map-brush", "map", "brush"),
+    ("graph", "force", None),
+    ("score", "score", None),
+)
+# pausa a partir de la cual el "tiempo hasta el siguiente" ya no cuenta
+DEFAULT_MAX_GAP_S = 30 * 60
+# celdas máximas de la matriz densa (para más, transitions() en formato largo)
+MAX_MATRIX_CELLS = 4_000_000
+
+_NAT = np.iinfo(np.int64).min
+
+
+# ---- helpers ----
+def _codes(df, column):
+    """(códigos int, categorías) de una columna; -1 = nulo."""
+    import pandas as pd
+
+    s = df[column]
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        return s.cat.codes.to_numpy(), s.cat.categories
+    codes, cats = pd.factorize(s)
+    return codes, cats
+
+
+def _ns(df) -> np.ndarray:
+    """Timestamps como int64 ns en UTC (NaT = mínimo int64)."""
+    import pandas as pd
+
+    ts = df["timestamp"]
+    if not pd.api.types.is_datetime64_any_dtype(ts):
+        ts = pd.to_datetime(ts, errors="coerce", utc=True)
+    if getattr(ts.dt, "tz", None) is not None:
+        ts = ts.dt.tz_convert(None)
+    return ts.to_numpy(dtype="datetime64[ns]").view(np.int64)
+
+
+def _sequence(df):
+    """
+    Orden de las filas por (sesión, tiempo), la sesión de cada fila ya
+    ordenada (códigos >= 0) y la cantidad de sesiones.
+    """
+    ts = _ns(df)
+    if np.all(ts[1:] >= ts[:-1]):
+        order = np.arange(len(ts))  # el log ya viene en orden de llegada
+    else:
+        order = np.argsort(ts, kind="stable")
+    if "session" in df.columns:
+        sess, cats = _codes(df, "session")
+        n_sess = len(cats) + 1
+        sess = np.where(sess < 0, len(cats), sess)
+        # pocas sesiones: códigos chicos -> radix sort
+        small = sess[order].astype(np.int16 if n_sess < 2**15 else np.int32)
+        order = order[np.argsort(small, kind="stable")]
+        sess = sess[order]
+    else:
+        n_sess = 1
+        sess = np.zeros(len(order), dtype=np.int64)
+    return order, ts[order], sess, n_sess
+
+
+def _is(df, column, value) -> np.ndarray:
+    """Máscara column == value comparando códigos (sin comparar strings)."""
+    codes, cats = _codes(df, column)
+    code = cats.get_indexer([value])[0]
+    return codes == code if code >= 0 else np.zeros(len(codes), dtype=bool)
+
+
+def _matches(df, source, interaction) -> np.ndarray:
+    """Máscara de filas con ese source (e interaction, si no es None)."""
+    mask = _is(df, "source", source)
+    if interaction is not None and "interaction" in df.columns:
+        mask &= _is(df, "interaction", interaction)
+    return mask
+
+
+def _pairs(df, by: str):
+    """Pares (desde, hacia) consecutivos dentro de cada sesión, como códigos compactos."""
+    codes, cats = _codes(df, by)
+    order, _, sess, _ = _sequence(df)
+    c = codes[order]
+    keep = c >= 0
+    c, sess = c[keep], sess[keep]
+    same = sess[1:] == sess[:-1]
+    a, b = c[:-1][same], c[1:][same]
+    # solo las categorías que aparecen en algún par (remapeo sin ordenar)
+    seen = (np.bincount(a, minlength=len(cats)) + np.bincount(b, minlength=len(cats))) > 0
+    used = np.flatnonzero(seen)
+    remap = np.cumsum(seen) - 1
+    return remap[a], remap[b], cats[used]
+
+
+# ---- transiciones ----
+def transition_matrix(df, by: str = "id", normalize: bool = False):
+    """
+    Matriz (desde x hacia) de transiciones entre eventos consecutivos del
+    mismo dashboard. by="id" da nodo -> nodo (los brush, sin id, no cortan
+    la secuencia); by="source" da panel -> panel. normalize=True divide
+    cada fila por su total (probabilidad de ir a cada destino).
+    """
+    import pandas as pd
+
+    a, b, labels = _pairs(df, by)
+    k = len(labels)
+    if k * k > MAX_MATRIX_CELLS:
+        raise ValueError(
+            f"{k} valores distintos de {by!r}: la matriz densa sería de {k}x{k}; "
+            "usa transitions() (formato largo)"
+        )
+    m = np.bincount(a * k + b, minlength=k * k).reshape(k, k)
+    if normalize:
+        totals = m.sum(axis=1, keepdims=True)
+        m = np.divide(m, totals, out=np.zeros(m.shape), where=totals > 0)
+    labels = pd.Index(labels, name="from")
+    return pd.DataFrame(m, index=labels, columns=labels.rename("to"))
+
+
+def transitions(df, by: str = "id", top: int = None):
+    """
+    Transiciones en formato largo (from, to, count, share), de la más
+    frecuente a la menos. share = count / total de salidas de `from`.
+    """
+    import pandas as pd
+
+    a, b, labels = _pairs(df, by)
+    k = max(len(labels), 1)
+    key = a.astype(np.int64) * k + b
+    if k * k <= MAX_MATRIX_CELLS:
+        count = np.bincount(key, minlength=k * k)
+        pair = np.flatnonzero(count)
+        count = count[pair]
+    else:
+        pair, count = np.unique(key, return_counts=True)
+    src, dst = pair // k, pair % k
+    out_total = np.bincount(src, weights=count, minlength=k)
+    rank = np.argsort(-count, kind="stable")
+    if top is not None:
+        rank = rank[:top]
+    return pd.DataFrame({
+        "from": np.asarray(labels)[src[rank]],
+        "to": np.asarray(labels)[dst[rank]],
+        "count": count[rank],
+        "share": count[rank] / out_total[src[rank]],
+    })
+
+
+# ---- tiempos ----
+def dwell_times(df, max_gap_s: float = DEFAULT_MAX_GAP_S):
+    """
+    Segundos desde cada evento hasta el siguiente del mismo dashboard,
+    alineado con las filas de df. NaN en el último evento de cada sesión,
+    sin timestamp o si la pausa supera max_gap_s (el usuario se fue).
+    """
+    import pandas as pd
+
+    order, ts, sess, _ = _sequence(df)
+    gap = np.diff(ts).astype(np.float64) / 1e9
+    ok = (sess[1:] == sess[:-1]) & (ts[:-1] != _NAT) & (ts[1:] != _NAT)
+    if max_gap_s is not None:
+        ok &= gap <= max_gap_s
+    out = np.full(len(order), np.nan)
+    out[order[:-1][ok]] = gap[ok]
+    return pd.Series(out, index=df.index, name="dwell_s")
+
+
+def dwell_summary(df, by: str = "source", max_gap_s: float = DEFAULT_MAX_GAP_S):
+    """count / mediana / media / p90 del tiempo hasta el siguiente evento, por `by`."""
+    import pandas as pd
+
+    dwell = dwell_times(df, max_gap_s).to_numpy()
+    codes, cats = _codes(df, by)
+    ok = (codes >= 0) & ~np.isnan(dwell)
+    dwell, codes = dwell[ok], codes[ok]
+
+    # un solo sort (por valor y luego estable por grupo) da todos los cuantiles
+    order = np.argsort(dwell)
+    order = order[np.argsort(codes[order], kind="stable")]
+    values = dwell[order]
+    count = np.bincount(codes, minlength=len(cats))
+    start = np.concatenate([[0], np.cumsum(count)[:-1]])
+    has = np.flatnonzero(count)
+
+    def quantile(q):
+        pos = start[has] + (count[has] - 1) * q
+        lo = np.floor(pos).astype(np.int64)
+        hi = np.minimum(lo + 1, start[has] + count[has] - 1)
+        return values[lo] + (values[hi] - values[lo]) * (pos - lo)
+
+    out = pd.DataFrame({
+        "count": count[has],
+        "median_s": quantile(0.5),
+        "mean_s": np.bincount(codes, weights=dwell, minlength=len(cats))[has] / count[has],
+        "p90_s": quantile(0.9),
+    }, index=pd.Index(np.asarray(cats)[has], name=by))
+    return out.sort_values("count", ascending=False, kind="stable")
+
+
+# ---- embudo ----
+def source_funnel(df, steps=DEFAULT_FUNNEL):
+    """
+    Embudo por dashboard: cuántas sesiones hacen el paso 1, luego (después
+    en el tiempo) el paso 2, etc. steps: (etiqueta, source, interaction o
+    None). Por defecto brush en el mapa -> click en el grafo -> click en
+    el ranking de SCORE.
+
+    Columnas: sessions, rate (respecto del primer paso), step_rate
+    (respecto del anterior) y median_s (mediana del tiempo desde el paso
+    anterior).
+    """
+    import pandas as pd
+
+    order, ts, sess, n_sess = _sequence(df)
+    never = np.iinfo(np.int64).max
+    prev = None
+    rows = []
+    for label, source, interaction in steps:
+        mask = _matches(df, source, interaction)[order] & (ts != _NAT)
+        if prev is not None:
+            mask &= ts > prev[sess]
+        first = np.full(n_sess, never, dtype=np.int64)
+        np.minimum.at(first, sess[mask], ts[mask])
+        reached = first != never
+        wait = np.nan
+        if prev is not None and reached.any():
+            wait = float(np.median(first[reached] - prev[reached])) / 1e9
+        rows.append((label, int(reached.sum()), wait))
+        prev = first
+
+    out = pd.DataFrame(rows, columns=["step", "sessions", "median_s"]).set_index("step")
+    n = out["sessions"].to_numpy()
+    base = n[0] if len(n) and n[0] else np.nan
+    out.insert(1, "rate", n / base)
+    out.insert(2, "step_rate", n / np.concatenate([[base], np.where(n[:-1] > 0, n[:-1], np.nan)]))
+    return out
+
+
+# ---- brush ----
+def brush_sizes(df):
+    """
+    Nodos seleccionados en cada brush del mapa (selected_count), indexado
+    por timestamp. .describe() o .value_counts() dan la distribución.
+    """
+    import pandas as pd
+
+    if "interaction" not in df.columns or "selected_count" not in df.columns:
+        return pd.Series([], dtype="float64", name="selected_count")
+    mask = (df["interaction"] == "brush").to_numpy()
+    sizes = df["selected_count"].to_numpy()[mask]
+    return pd.Series(sizes, index=pd.DatetimeIndex(df["timestamp"].to_numpy()[mask]),
+                     name="selected_count")
+
+
+def click_report(df=None, path: str = None, session: str = None, top: int = 10) -> dict:
+    """
+    Todo junto: {"transitions", "dwell", "funnel", "brush"}. Sin df usa el
+    historial en memoria (get_click_dataframe) o, con `path`, una base de
+    ClickDB.
+    """
+    if df is None:
+        if path is not None:
+            from .click_db import load_click_dataframe
+
+            df = load_click_dataframe(path, session=session)
+        else:
+            from .graph2_1 import get_click_dataframe
+
+            df = get_click_dataframe(session=session)
+    if df is None or len(df) == 0:
+        return {}
+    return {
+        "transitions": transitions(df, top=top),
+        "dwell": dwell_summary(df),
+        "funnel": source_funnel(df),
+        "brush": brush_sizes(df).describe(),
+    }
@@ -0,0 +1,251 @@
+# src/our_library/click_db.py
+
+"""
+Persistencia opcional de los eventos de click en SQLite.
+
+Los eventos llegan desde el thread de Flask o el callback de Colab; para
+no bloquearlos se encolan y un thread escritor los inserta por lotes (una
+transacción por lote) en una base en modo WAL, que permite leer desde el
+notebook mientras se escribe. Índices sobre timestamp, source, node_id y
+sesión para que los filtros sean consultas SQL.
+"""
+
+import atexit
+import json
+import queue
+import sqlite3
+import threading
+
+from .click_log import _NAT, _ts_to_ns
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS clicks (
+    seq         INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts_ns       INTEGER,
+    source      TEXT,
+    chart       TEXT,
+    node_id     TEXT,
+    interaction TEXT,
+    session     TEXT,
+    payload     TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_clicks_ts     ON clicks (ts_ns);
+CREATE INDEX IF NOT EXISTS idx_clicks_source ON clicks (source, ts_ns);
+CREATE INDEX IF NOT EXISTS idx_clicks_node   ON clicks (node_id, ts_ns);
+"""
+# el índice por sesión va aparte: en una base anterior primero hay que
+# agregar la columna
+_SESSION_INDEX = "CREATE INDEX IF NOT EXISTS idx_clicks_session ON clicks (session, ts_ns)"
+
+_INSERT = (
+    "INSERT INTO clicks (ts_ns, source, chart, node_id, interaction, session, payload) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    con = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA synchronous=NORMAL")
+    return con
+
+
+def _row(event: dict) -> tuple:
+    ts = _ts_to_ns(event.get("__ts"))
+    node_id = event.get("id")
+    return (
+        None if ts == _NAT else ts,
+        event.get("__src", "unknown"),
+        event.get("__chart", "unknown"),
+        None if node_id is None else str(node_id),
+        event.get("__interaction", "click"),
+        event.get("__session"),
+        json.dumps(event, default=str, ensure_ascii=False),
+    )
+
+
+class ClickDB:
+    """
+    Sumidero SQLite con escritor en segundo plano.
+
+    batch_size     : máximo de eventos por transacción
+    flush_interval : segundos que el escritor espera a que se junte un lote
+    """
+
+    def __init__(self, path: str = "clicks.sqlite", batch_size: int = 500,
+                 flush_interval: float = 0.5):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        con = _connect(path)
+        con.executescript(_SCHEMA)
+        cols = {row[1] for row in con.execute("PRAGMA table_info(clicks)")}
+        if "session" not in cols:
+            con.execute("ALTER TABLE clicks ADD COLUMN session TEXT")
+        con.execute(_SESSION_INDEX)
+        con.commit()
+        con.close()
+
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._writer, name="ourlib-clickdb", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # ---- escritura ----
+    def put(self, events):
+        """Encola eventos (no bloquea); el escritor los inserta por lotes."""
+        if self._stop.is_set():
+            raise ValueError(f"ClickDB cerrada ({self.path}): los eventos no se guardarían")
+        for e in events:
+            self._queue.put(e)
+
+    def _drain(self, first):
+        batch = [first]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get(timeout=self.flush_interval))
+            except queue.Empty:
+                break
+        return batch
+
+    def _writer(self):
+        con = _connect(self.path)
+        try:
+            while not (self._stop.is_set() and self._queue.empty()):
+                try:
+                    first = self._queue.get(timeout=0.2)
+                except queue.Empty:
+                    continue
+                batch = self._drain(first)
+                try:
+                    with con:
+                        con.executemany(_INSERT, [_row(e) for e in batch])
+                    self.written += len(batch)
+                except sqlite3.Error as err:  # pragma: no cover
+                    print(f"ClickDB: no se pudo escribir un lote de {len(batch)}: {err}")
+                finally:
+                    for _ in batch:
+                        self._queue.task_done()
+        finally:
+            con.close()
+
+    def flush(self):
+        """Espera a que todo lo encolado esté escrito."""
+        if self._thread.is_alive():
+            self._queue.join()
+
+    def close(self):
+        """Escribe lo pendiente y detiene el escritor; después put() falla."""
+        if not self._stop.is_set():
+            self._stop.set()
+            self._thread.join(timeout=10)
+            atexit.unregister(self.close)
+
+    # ---- lectura ----
+    def query(self, source: str = None, start=None, end=None, node_id: str = None,
+              limit: int = None, session: str = None) -> list:
+        """
+        Eventos (dicts, en orden de llegada) filtrados por source, rango de
+        tiempo [start, end), node_id y/o sesión (dashboard). start/end:
+        ISO-8601 o datetime.
+        """
+        where, args = [], []
+        if session is not None:
+            where.append("session = ?")
+            args.append(str(session))
+        if source is not None:
+            where.append("source = ?")
+            args.append(source)
+        if node_id is not None:
+            where.append("node_id = ?")
+            args.append(str(node_id))
+        if start is not None:
+            where.append("ts_ns >= ?")
+            args.append(_ts_to_ns(start))
+        if end is not None:
+            where.append("ts_ns < ?")
+            args.append(_ts_to_ns(end))
+        sql = "SELECT payload FROM clicks"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY seq"
+        if limit is not None:
+            sql += " LIMIT ?"
+            args.append(int(limit))
+
+        self.flush()
+        con = _connect(self.path)
+        try:
+            return [json.loads(p) for (p,) in con.execute(sql, args)]
+        finally:
+            con.close()
+
+    def to_dataframe(self, session: str = None, start=None, end=None):
+        """Como load_click_dataframe, esperando antes lo encolado."""
+        self.flush()
+        return load_click_dataframe(self.path, session=session, start=start, end=end)
+
+    def count_by_source(self) -> dict:
+        self.flush()
+        con = _connect(self.path)
+        try:
+            return dict(con.execute("SELECT source, COUNT(*) FROM clicks GROUP BY source"))
+        finally:
+            con.close()
+
+
+# columnas estructuradas (sin parsear el JSON de cada fila); selected_count
+# solo existe en los brushes y se extrae en SQLite
+_FRAME_SQL = (
+    "SELECT ts_ns, source, chart, node_id, interaction, session, "
+    "CASE WHEN interaction = 'brush' THEN json_extract(payload, '$.selected_count') END "
+    "FROM clicks"
+)
+_FRAME_TEXT = ["source", "chart", "id", "interaction", "session"]
+
+
+def load_click_dataframe(path: str, session: str = None, start=None, end=None):
+    """
+    Lee una base de ClickDB como DataFrame con las mismas columnas y tipos
+    que get_click_dataframe() (texto Categorical, id incluido; timestamp
+    datetime64[ns, UTC]): timestamp, source, chart, id, interaction, session,
+    selected_count. Sirve para analizar historiales de sesiones
+    anteriores (click_analytics) sin tener el kernel que los capturó.
+    """
+    import numpy as np
+    import pandas as pd
+
+    where, args = [], []
+    if session is not None:
+        where.append("session = ?")
+        args.append(str(session))
+    if start is not None:
+        where.append("ts_ns >= ?")
+        args.append(_ts_to_ns(start))
+    if end is not None:
+        where.append("ts_ns < ?")
+        args.append(_ts_to_ns(end))
+    sql = _FRAME_SQL
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY seq"
+
+    con = _connect(path)
+    try:
+        rows = con.execute(sql, args).fetchall()
+    finally:
+        con.close()
+
+    # una sola matriz de objetos: columnas sin armar una tupla por valor
+    table = np.array(rows, dtype=object).reshape(len(rows), 7)
+    ts = table[:, 0]
+    ns = np.where(ts == None, _NAT, ts).astype(np.int64)  # noqa: E711
+    data = {"timestamp": pd.DatetimeIndex(ns.view("M8[ns]"), copy=False).tz_localize("UTC")}
+    for j, name in enumerate(_FRAME_TEXT, start=1):
+        codes, values = pd.factorize(table[:, j])
+        data[name] = pd.Categorical.from_codes(codes, categories=values, validate=False)
+    count = table[:, 6]
+    data["selected_count"] = np.where(count == None, np.nan, count).astype(np.float64)  # noqa: E711
+    return pd.DataFrame(data)
@@ -0,0 +1,282 @@
+# src/our_library/click_log.py
+
+"""
+Log columnar (solo se agrega al final) de los eventos de click.
+
+Cada campo vive en un array NumPy tipado; los de texto (source, chart,
+region, id, name, interaction, session) se guardan como códigos Int32
+sobre un diccionario de valores. Así:
+  - get_click_dataframe() arma el DataFrame sobre vistas de los arrays
+    (las filas ya escritas no cambian nunca, no hace falta copiar)
+  - los conteos por source/chart/session se mantienen al agregar cada evento
+
+En graph2_1 el log no recibe los eventos directamente: se deriva del
+ClickStore (la única copia de los eventos) con sync(), que codifica solo
+los eventos nuevos y descarta las filas que el store ya no tiene.
+"""
+
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+
+_INITIAL_ROWS = 1024
+DEFAULT_MAX_ROWS = 1_000_000
+
+# campo del evento -> columna del DataFrame
+TEXT_FIELDS = {
+    "__src": "source",
+    "__chart": "chart",
+    "id": "id",
+    "name": "name",
+    "region": "region",
+    "__interaction": "interaction",
+    "__session": "session",
+}
+FLOAT_FIELDS = {
+    "SCORE": "SCORE",
+    "lat": "lat",
+    "lon": "lon",
+    "selected_count": "selected_count",
+}
+_TEXT_DEFAULTS = {"source": "unknown", "chart": "unknown", "interaction": "click"}
+COLUMNS = ["timestamp", "source", "chart", "id", "name", "region",
+           "SCORE", "lat", "lon", "interaction", "selected_count", "session"]
+
+_NAT = np.iinfo(np.int64).min
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _ts_to_ns(value) -> int:
+    """ISO-8601 (JS o Python) -> ns desde epoch en UTC. Sin zona = hora local."""
+    if isinstance(value, datetime):
+        dt = value
+    else:
+        try:
+            s = str(value)
+            if s.endswith("Z"):
+                s = s[:-1] + "+00:00"
+            dt = datetime.fromisoformat(s)
+        except ValueError:
+            return _NAT
+    if dt.tzinfo is None:
+        dt = dt.astimezone()  # hora local del kernel
+    delta = dt - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 10**9 + delta.microseconds * 1000
+
+
+def _to_float(v) -> float:
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class _Dictionary:
+    """Diccionario de strings -> código Int32 (-1 = nulo)."""
+
+    __slots__ = ("values", "_codes")
+
+    def __init__(self):
+        self.values = []
+        self._codes = {}
+
+    def encode(self, v) -> int:
+        if v is None or v == "":
+            return -1
+        s = str(v)
+        code = self._codes.get(s)
+        if code is None:
+            code = self._codes[s] = len(self.values)
+            self.values.append(s)
+        return code
+
+
+class ClickLog:
+    """
+    Log columnar thread-safe. Al superar max_rows se descarta la mitad
+    más antigua (la memoria queda acotada, igual que en ClickStore).
+    """
+
+    def __init__(self, max_rows: int = DEFAULT_MAX_ROWS):
+        self.max_rows = max(int(max_rows), 2)
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._n = 0
+        self.start_seq = 0  # nº de secuencia de la fila 0
+        self._ts = np.empty(_INITIAL_ROWS, dtype=np.int64)
+        self._text = {c: np.empty(_INITIAL_ROWS, dtype=np.int32) for c in TEXT_FIELDS.values()}
+        self._float = {c: np.empty(_INITIAL_ROWS, dtype=np.float64) for c in FLOAT_FIELDS.values()}
+        self._dicts = {c: _Dictionary() for c in TEXT_FIELDS.values()}
+        # conteos incrementales por código (lista indexada por código)
+        self._counts = {"source": [], "chart": [], "session": []}
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+
+    def __len__(self):
+        return self._n
+
+    def _grow(self, need: int):
+        cap = len(self._ts)
+        if need <= cap:
+            return
+        new_cap = max(need, min(cap * 2, self.max_rows))
+
+        # arrays nuevos: las vistas entregadas antes siguen apuntando a los viejos
+        def _resize(a):
+            b = np.empty(new_cap, dtype=a.dtype)
+            b[: self._n] = a[: self._n]
+            return b
+
+        self._ts = _resize(self._ts)
+        self._text = {c: _resize(a) for c, a in self._text.items()}
+        self._float = {c: _resize(a) for c, a in self._float.items()}
+
+    def _compact(self):
+        """Descarta la mitad más antigua de las filas."""
+        self._drop_oldest(self._n // 2)
+
+    def _drop_oldest(self, drop: int):
+        keep = self._n - drop
+        cap = max(_INITIAL_ROWS, len(self._ts))
+
+        def _tail(a):
+            b = np.empty(cap, dtype=a.dtype)
+            b[:keep] = a[drop: self._n]
+            return b
+
+        for col, counts in self._counts.items():
+            codes = self._text[col][:drop]
+            gone = np.bincount(codes[codes >= 0], minlength=len(counts))
+            for code, c in enumerate(gone.tolist()):
+                counts[code] -= c
+        self._ts = _tail(self._ts)
+        self._text = {c: _tail(a) for c, a in self._text.items()}
+        self._float = {c: _tail(a) for c, a in self._float.items()}
+        self._n = keep
+        self.start_seq += drop
+
+    def extend(self, events):
+        with self._lock:
+            self._extend_locked(list(events))
+
+    def _extend_locked(self, events):
+        if self._n + len(events) > self.max_rows:
+            self._compact()
+        self._grow(self._n + len(events))
+        i = self._n
+        for e in events:
+            self._ts[i] = _ts_to_ns(e.get("__ts"))
+            for field, col in TEXT_FIELDS.items():
+                v = e.get(field)
+                if v is None:
+                    v = _TEXT_DEFAULTS.get(col)
+                code = self._dicts[col].encode(v)
+                self._text[col][i] = code
+                counts = self._counts.get(col)
+                if counts is not None and code >= 0:
+                    if code == len(counts):
+                        counts.append(0)
+                    counts[code] += 1
+            for field, col in FLOAT_FIELDS.items():
+                self._float[col][i] = _to_float(e.get(field))
+            i += 1
+        self._n = i
+
+    def sync(self, store):
+        """
+        Pone el log al día con un ClickStore (misma numeración de eventos):
+        codifica solo los eventos nuevos y descarta las filas que el store
+        ya soltó. Devuelve la instantánea del store usada.
+        """
+        with self._lock:
+            snap = store.snapshot()
+            first, end = snap.start_seq, snap.start_seq + len(snap)
+            if end < self.start_seq + self._n:
+                self._reset()  # el store se vació por su cuenta
+            if self._n == 0:
+                self.start_seq = first
+            elif first > self.start_seq:
+                self._drop_oldest(min(first - self.start_seq, self._n))
+                self.start_seq = max(self.start_seq, first)
+            new = snap.since(self.start_seq + self._n)
+            if len(new):
+                self._extend_locked(new)
+        return snap
+
+    def append(self, event):
+        self.extend([event])
+
+    def counts(self, column: str = "source") -> dict:
+        """Conteo por valor de `column` ("source", "chart" o "session"), sin recorrer el log."""
+        with self._lock:
+            values = self._dicts[column].values
+            return {values[k]: c for k, c in enumerate(self._counts[column]) if c > 0}
+
+    def seqs_where(self, column: str, value, since: int = 0):
+        """Números de secuencia (>= since) de las filas con `column` == value."""
+        with self._lock:
+            code = self._dicts[column]._codes.get(str(value))
+            if code is None:
+                return np.empty(0, dtype=np.int64)
+            start = min(max(since - self.start_seq, 0), self._n)
+            rows = np.flatnonzero(self._text[column][start: self._n] == code)
+            return rows + (self.start_seq + start)
+
+    def last_seen(self, column: str = "session", since: int = 0) -> dict:
+        """valor -> nº de secuencia de su última fila (>= since), de la más antigua a la más reciente."""
+        with self._lock:
+            start = min(max(since - self.start_seq, 0), self._n)
+            codes = self._text[column][start: self._n][::-1]
+            values = self._dicts[column].values
+            base = self.start_seq + self._n - 1
+        uniq, first = np.unique(codes, return_index=True)
+        last = {values[c]: base - i for c, i in zip(uniq.tolist(), first.tolist()) if c >= 0}
+        return dict(sorted(last.items(), key=lambda kv: kv[1]))
+
+    def _views(self, since: int):
+        with self._lock:
+            n = self._n
+            start = min(max(since - self.start_seq, 0), n)
+            ts = self._ts[start:n]
+            text = {c: a[start:n] for c, a in self._text.items()}
+            floats = {c: a[start:n] for c, a in self._float.items()}
+            dicts = {c: list(d.values) for c, d in self._dicts.items()}
+        return ts, text, floats, dicts
+
+    def to_dataframe(self, since: int = 0):
+        """
+        DataFrame con COLUMNS. Texto como Categorical (códigos = vistas del
+        log; id también es texto: 25 llega como "25"), timestamp
+        datetime64[ns, UTC] (con zona: tz_convert para verlo en hora local),
+        numéricos como vistas float64.
+        since: número de secuencia desde el que se incluyen filas.
+        """
+        import pandas as pd
+
+        ts, text, floats, dicts = self._views(since)
+        data = {"timestamp": pd.DatetimeIndex(ts.view("M8[ns]"), copy=False).tz_localize("UTC")}
+        for col, codes in text.items():
+            data[col] = pd.Categorical.from_codes(codes, categories=dicts[col], validate=False)
+        data.update(floats)
+        return pd.DataFrame(data, columns=COLUMNS, copy=False)
+
+    def to_arrow(self, since: int = 0):
+        """pyarrow.Table con columnas de diccionario (requiere pyarrow)."""
+        try:
+            import pyarrow as pa
+        except ImportError as e:  # pragma: no cover
+            raise ImportError("to_arrow requiere pyarrow (pip install pyarrow)") from e
+
+        ts, text, floats, dicts = self._views(since)
+        arrays = {"timestamp": pa.array(ts.view("M8[ns]")).cast(pa.timestamp("ns", tz="UTC"))}
+        for col, codes in text.items():
+            idx = pa.array(codes, mask=codes < 0)
+            arrays[col] = pa.DictionaryArray.from_arrays(idx, pa.array(dicts[col], type=pa.string()))
+        for col, a in floats.items():
+            arrays[col] = pa.array(a)
+        return pa.table({c: arrays[c] for c in COLUMNS})
@@ -0,0 +1,193 @@
+# src/our_library/click_store.py
+
+"""
+Almacén de eventos de click acotado y thread-safe.
+
+El servidor Flask (thread aparte) y el callback de Colab agregan eventos
+mientras el notebook los lee. Los eventos viven en bloques de CHUNK_SIZE:
+un bloque lleno no se vuelve a modificar y al superar la capacidad se
+descarta el bloque más antiguo (opcionalmente se vuelca a disco en JSON
+Lines). Por eso una instantánea solo necesita la tupla de bloques y la
+cantidad de eventos del bloque activo: O(1) y sin copiar eventos.
+
+El store es la única copia de los eventos en memoria: el log columnar
+(click_log) y las vistas por dashboard (ClickView) se derivan de él.
+"""
+
+import json
+import threading
+from collections.abc import Sequence
+
+CHUNK_SIZE = 1024
+DEFAULT_CAPACITY = 100_000
+
+
+class ClickSnapshot(Sequence):
+    """Vista inmutable (solo lectura) de los eventos en un instante dado."""
+
+    __slots__ = ("_chunks", "_offset", "_len", "start_seq")
+
+    def __init__(self, chunks: tuple, tail: int, start_seq: int, offset: int = 0):
+        self._chunks = chunks
+        self._offset = offset  # eventos saltados al inicio del primer bloque
+        total = (len(chunks) - 1) * CHUNK_SIZE + tail if chunks else 0
+        self._len = max(total - offset, 0)
+        self.start_seq = start_seq  # nº de secuencia del primer evento visible
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._len))]
+        if i < 0:
+            i += self._len
+        if not 0 <= i < self._len:
+            raise IndexError("ClickSnapshot index out of range")
+        i += self._offset
+        return self._chunks[i // CHUNK_SIZE][i % CHUNK_SIZE]
+
+    def __iter__(self):
+        for i in range(self._offset, self._offset + self._len):
+            yield self._chunks[i // CHUNK_SIZE][i % CHUNK_SIZE]
+
+    def since(self, seq: int) -> "ClickSnapshot":
+        """Vista de los eventos con número de secuencia >= seq (sin copiar)."""
+        skip = min(max(seq - self.start_seq, 0), self._len)
+        snap = ClickSnapshot.__new__(ClickSnapshot)
+        snap._chunks = self._chunks
+        snap._offset = self._offset + skip
+        snap._len = self._len - skip
+        snap.start_seq = self.start_seq + skip
+        return snap
+
+    def __repr__(self):
+        return f"ClickSnapshot(n={self._len}, start_seq={self.start_seq})"
+
+
+class ClickView(Sequence):
+    """Vista de solo lectura de algunos eventos de una instantánea (por posición)."""
+
+    __slots__ = ("_snap", "_pos", "end_seq")
+
+    def __init__(self, snap: ClickSnapshot, positions):
+        self._snap = snap
+        self._pos = positions
+        self.end_seq = snap.start_seq + len(snap)  # primer nº de secuencia no incluido
+
+    def __len__(self):
+        return len(self._pos)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._snap[p] for p in self._pos[i]]
+        return self._snap[self._pos[i]]
+
+    def __iter__(self):
+        snap = self._snap
+        for p in self._pos:
+            yield snap[p]
+
+    def __repr__(self):
+        return f"ClickView(n={len(self._pos)})"
+
+
+class ClickStore:
+    """
+    Buffer circular por bloques, protegido con lock.
+
+    capacity   : máximo de eventos en memoria (redondeado a bloques).
+    spill_path : si se indica, los bloques descartados se agregan a ese
+                 archivo JSON Lines en vez de perderse.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, spill_path: str = None):
+        if capacity < 1:
+            raise ValueError("capacity debe ser >= 1")
+        self.max_chunks = max(1, -(-capacity // CHUNK_SIZE))
+        self.spill_path = spill_path
+        self._lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._chunks = ()
+        self._tail = 0
+        self._total = 0  # eventos agregados desde el último clear
+        self.dropped = 0  # eventos descartados sin volcar a disco
+        self.last = None  # último evento recibido (no se borra con clear)
+
+    @property
+    def capacity(self) -> int:
+        return self.max_chunks * CHUNK_SIZE
+
+    def _append_locked(self, event):
+        if not self._chunks or self._tail == CHUNK_SIZE:
+            # los bloques llenos quedan congelados; las instantáneas los comparten
+            self._chunks = self._chunks + ([None] * CHUNK_SIZE,)
+            self._tail = 0
+        self._chunks[-1][self._tail] = event
+        self._tail += 1
+        self._total += 1
+        self.last = event
+        if len(self._chunks) > self.max_chunks:
+            evicted = self._chunks[0]
+            self._chunks = self._chunks[1:]
+            return evicted
+        return None
+
+    def append(self, event):
+        with self._lock:
+            evicted = self._append_locked(event)
+        if evicted is not None:
+            self._evict(evicted)
+
+    def extend(self, events):
+        evicted = []
+        with self._lock:
+            for e in events:
+                ch = self._append_locked(e)
+                if ch is not None:
+                    evicted.append(ch)
+        for ch in evicted:
+            self._evict(ch)
+
+    def _evict(self, chunk):
+        if not self.spill_path:
+            self.dropped += len(chunk)
+            return
+        with self._spill_lock, open(self.spill_path, "a", encoding="utf-8") as fh:
+            for e in chunk:
+                fh.write(json.dumps(e, default=str, ensure_ascii=False))
+                fh.write("\n")
+
+    def snapshot(self) -> ClickSnapshot:
+        with self._lock:
+            chunks, tail, total = self._chunks, self._tail, self._total
+        n = (len(chunks) - 1) * CHUNK_SIZE + tail if chunks else 0
+        return ClickSnapshot(chunks, tail, total - n)
+
+    @property
+    def total(self) -> int:
+        """Eventos agregados desde el último clear (incluye descartados)."""
+        return self._total
+
+    def clear(self):
+        with self._lock:
+            self._chunks = ()
+            self._tail = 0
+            self._total = 0
+
+    def __len__(self):
+        with self._lock:
+            return (len(self._chunks) - 1) * CHUNK_SIZE + self._tail if self._chunks else 0
+
+    def iter_spilled(self):
+        """Lee los eventos volcados a disco (los más antiguos)."""
+        if not self.spill_path:
+            return
+        try:
+            fh = open(self.spill_path, encoding="utf-8")
+        except FileNotFoundError:
+            return
+        with fh:
+            for line in fh:
+                if line.strip():
+                    yield json.loads(line)
@@ -0,0 +1,217 @@
+# src/our_library/dashboard_live.py
+
+"""
+Canal Python -> navegador para actualizar dashboards ya montados.
+
+Cada dashboard mostrado con live=True registra un DashboardChannel con el
+estado que tiene el navegador (nodos por id + enlaces). Una actualización
+calcula el diff (nodos nuevos/cambiados, ids eliminados, enlaces) y lo
+reparte a los suscriptores, que lo reciben por Server-Sent Events en
+/events/<dash_id> (ver graph2_1). Cada mensaje lleva un número de
+secuencia: si un navegador se reconecta atrasado recibe el estado completo
+en vez del diff.
+
+Cada stream abierto ocupa un worker del servidor del puente mientras dure,
+así que el hub acota los streams abiertos (max_streams, start_server lo
+deja por debajo de sus workers): al pasar el límite se cierra el más
+viejo con un evento "close", que el JS respeta sin reconectarse. El
+heartbeat es un evento "ping" con el que el JS cierra el stream si el
+dashboard ya no está en la página.
+"""
+
+import json
+import queue
+import threading
+from collections import OrderedDict
+
+# dashboards vivos recordados (los más viejos se olvidan)
+MAX_CHANNELS = 32
+# mensajes pendientes por suscriptor; si se llena se le desconecta y al
+# reconectarse recibe el estado completo
+SUBSCRIBER_QUEUE = 16
+HEARTBEAT_S = 15.0
+# streams SSE abiertos entre todos los dashboards (start_server lo ajusta
+# a workers - 1 para dejar siempre un worker a los POST de clicks)
+MAX_STREAMS = 7
+
+# fin de stream sin reconexión (dashboard reemplazado o demasiados streams)
+_FINAL = "final"
+
+
+def _end(q: queue.Queue, final: bool = False):
+    """Marca el fin del stream aunque la cola esté llena."""
+    try:
+        q.get_nowait()
+    except queue.Empty:
+        pass
+    q.put_nowait(_FINAL if final else None)
+
+
+class DashboardChannel:
+    """
+    Estado de un dashboard y sus suscriptores.
+
+    pack(changed, removed_ids, nodes, links) -> payload serializable
+        (columnar/json); `nodes` es el estado completo (p.ej. para el Top-3)
+    options : datos del dashboard que necesita quien lo actualiza (layout)
+    """
+
+    def __init__(self, nodes, links, pack, options: dict = None):
+        self._pack = pack
+        self.options = dict(options or {})
+        self._lock = threading.Lock()
+        self._nodes = {str(n["id"]): n for n in nodes}
+        self._links = list(links)
+        # datos que acompañan al grafo (p.ej. el pool de re-ranking): van en
+        # el mensaje que los cambia y en cada estado completo
+        self._extra = {}
+        self.seq = 0
+        self._subscribers = []
+
+    def _message(self, changed, removed, reset: bool, extra: dict = None) -> str:
+        payload = self._pack(changed, removed, list(self._nodes.values()), self._links)
+        msg = {"seq": self.seq, "reset": reset, "payload": payload}
+        msg.update(self._extra if reset else (extra or {}))
+        return json.dumps(msg, default=str, ensure_ascii=False)
+
+    def update(self, nodes, links, extra: dict = None) -> dict:
+        """
+        Calcula el diff contra el último estado y lo envía a todos.
+        extra: claves adicionales del mensaje ({"rerank": ...}); se
+        recuerdan para los navegadores que se conecten después.
+        """
+        new = {str(n["id"]): n for n in nodes}
+        with self._lock:
+            changed = [n for k, n in new.items() if self._nodes.get(k) != n]
+            removed = [n["id"] for k, n in self._nodes.items() if k not in new]
+            self._nodes = new
+            self._links = list(links)
+            self._extra.update(extra or {})
+            self.seq += 1
+            item = (self.seq, self._message(changed, removed, reset=False, extra=extra))
+            # dentro del lock: todos reciben los diffs en orden
+            for q in list(self._subscribers):
+                try:
+                    q.put_nowait(item)
+                except queue.Full:
+                    # suscriptor lento: se le corta y al reconectarse
+                    # recibe el estado completo
+                    self._subscribers.remove(q)
+                    _end(q)
+            return {
+                "seq": self.seq,
+                "changed": len(changed),
+                "removed": len(removed),
+                "subscribers": len(self._subscribers),
+            }
+
+    def subscribe(self, since: int = 0) -> queue.Queue:
+        """Cola de mensajes (seq, json); None = fin del stream."""
+        q = queue.Queue(maxsize=SUBSCRIBER_QUEUE)
+        with self._lock:
+            if since != self.seq:
+                q.put_nowait((self.seq, self._message(list(self._nodes.values()), [], reset=True)))
+            self._subscribers.append(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            if q in self._subscribers:
+                self._subscribers.remove(q)
+
+    def close(self, final: bool = False):
+        """Corta los streams; con final=True el navegador no se reconecta."""
+        with self._lock:
+            subscribers, self._subscribers = self._subscribers, []
+        for q in subscribers:
+            _end(q, final)
+
+    def events(self, q: queue.Queue):
+        """Eventos SSE de una cola de subscribe() (con heartbeat "ping")."""
+        yield "retry: 2000\n\n"
+        while True:
+            try:
+                item = q.get(timeout=HEARTBEAT_S)
+            except queue.Empty:
+                yield "event: ping\ndata: \n\n"
+                continue
+            if item is None:
+                return
+            if item == _FINAL:
+                yield "event: close\ndata: \n\n"
+                return
+            seq, msg = item
+            yield f"id: {seq}\nevent: update\ndata: {msg}\n\n"
+
+    def stream(self, since: int = 0):
+        """Generador de eventos SSE (sin el límite de streams del hub)."""
+        q = self.subscribe(since)
+        try:
+            yield from self.events(q)
+        finally:
+            self.unsubscribe(q)
+
+
+class DashboardHub:
+    """Registro acotado dash_id -> DashboardChannel."""
+
+    def __init__(self, max_channels: int = MAX_CHANNELS, max_streams: int = MAX_STREAMS):
+        self.max_channels = max_channels
+        self.max_streams = max_streams
+        self._lock = threading.Lock()
+        self._channels = OrderedDict()
+        self._streams = OrderedDict()  # cola -> canal, del stream más viejo al más nuevo
+
+    def register(self, dash_id: str, nodes, links, pack, options: dict = None) -> DashboardChannel:
+        """Registra el dashboard; si dash_id ya existía cierra los streams del anterior."""
+        channel = DashboardChannel(nodes, links, pack, options)
+        with self._lock:
+            evicted = [self._channels.pop(dash_id)] if dash_id in self._channels else []
+            self._channels[dash_id] = channel
+            while len(self._channels) > self.max_channels:
+                evicted.append(self._channels.popitem(last=False)[1])
+        for ch in evicted:
+            ch.close(final=True)
+        return channel
+
+    def stream(self, dash_id: str, since: int = 0):
+        """
+        Generador SSE de un dashboard (None si no está registrado). Con más
+        de max_streams streams abiertos se cierra el más viejo.
+        """
+        channel = self.get(dash_id)
+        if channel is None:
+            return None
+        q = channel.subscribe(since)
+        with self._lock:
+            self._streams[q] = channel
+            evicted = []
+            while len(self._streams) > max(1, self.max_streams):
+                evicted.append(self._streams.popitem(last=False))
+        for old, ch in evicted:
+            ch.unsubscribe(old)
+            _end(old, final=True)
+        return self._follow(channel, q)
+
+    def _follow(self, channel, q):
+        try:
+            yield from channel.events(q)
+        finally:
+            channel.unsubscribe(q)
+            with self._lock:
+                self._streams.pop(q, None)
+
+    def open_streams(self) -> int:
+        with self._lock:
+            return len(self._streams)
+
+    def get(self, dash_id: str):
+        with self._lock:
+            return self._channels.get(dash_id)
+
+    def disconnect_all(self):
+        """Cierra los streams abiertos (los dashboards siguen registrados)."""
+        with self._lock:
+            channels = list(self._channels.values())
+        for ch in channels:
+            ch.close()
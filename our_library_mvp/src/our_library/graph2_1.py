@@ -4,8 +4,30 @@ from datetime import datetime
 from pathlib import Path
 from IPython.display import HTML
 # mylib/dashboard.py
-from flask import Flask, request, jsonify
-from threading import Thread
+import queue
+from collections import OrderedDict
+
+import numpy as np
+from flask import Flask, Response, request, jsonify
+from threading import Lock, Thread
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+from .click_db import ClickDB
+from .click_log import ClickLog, _ts_to_ns
+from .click_store import ClickStore, ClickView
+from .dashboard_live import DashboardHub
+from .graph_prep import grid_clusters, lttb, top_link_indices
+from .graph_layout import layout_for_links
+from .graph_assets import PERU_GEOMETRY_JS, register_asset
+from .graph_templates import ChartModule
+from .graph_payload import (
+    DASHBOARD_LINK_COLUMNS,
+    DASHBOARD_NODE_COLUMNS,
+    RERANK_POOL_COLUMNS,
+    pack_columnar,
+    pack_json,
+    payload_to_json,
+)
 
 # en graph2_1.py (y exportar en __init__.py)
 
@@ -19,235 +41,735 @@ try:
 except Exception:  # pragma: no cover
     _IN_COLAB = False
 
-global_node_ = None
-global_clicks_ = []
-global_click_history_ = []
+# historial de eventos JS → Python (acotado, ver click_store): es la única
+# copia de los eventos. El log columnar (DataFrames, resúmenes y vistas por
+# dashboard) se deriva de él al leer (_click_log.sync) y tiene su capacidad
+_click_store = ClickStore()
+_click_log = ClickLog(max_rows=_click_store.capacity)
+_record_lock = Lock()
+# vistas por dashboard (evento["__session"] = dash_id): eventos mostrados
+# por sesión, sesiones listadas, y desde qué secuencia se ve cada sesión
+# (clear_click_history(session) / close_click_session)
+_session_limits = {"capacity": 10_000, "sessions": 64}
+_session_from = {}
+# persistencia opcional en SQLite (enable_click_persistence)
+_click_db = None
+# secuencia desde la que leen get_click_history / get_simple_click_history
+# (cada una se puede "limpiar" por separado, como las dos listas de antes)
+_history_from = {"history": 0, "simple": 0}
+# dashboards mostrados con live=True (canal Python -> navegador)
+_dashboards = DashboardHub()
+# funciones que reciben cada lote de eventos ya guardado (p.ej. ClickFeedback)
+_click_listeners = []
+# una línea por click/lote en la salida del notebook (start_server /
+# enable_colab_bridge con verbose=True); por defecto en silencio
+_verbose_clicks = False
 app = Flask(__name__)
 
 
-def enable_colab_bridge():
+def _log_click(msg: str):
+    if _verbose_clicks:
+        print(msg)
+
+
+def _record_click(click_data: dict) -> dict:
+    """Guarda un evento en el historial (común a Colab, HTTP y lotes)."""
+    # Agregar timestamp si no viene
+    if "__ts" not in click_data:
+        click_data["__ts"] = datetime.now().isoformat()
+    _click_store.append(click_data)
+    db = _click_db  # una sola lectura: disable_click_persistence la pone en None
+    if db is not None:
+        db.put([click_data])
+    _notify_listeners([click_data])
+    return click_data
+
+
+def _record_batch(events) -> int:
+    """Guarda un lote de eventos (con verbose, lo resume en una línea)."""
+    events = [e for e in (events or []) if isinstance(e, dict)]
+    now = datetime.now().isoformat()
+    by_source = {}
+    for e in events:
+        e.setdefault("__ts", now)
+        src = e.get("__src", "unknown")
+        by_source[src] = by_source.get(src, 0) + 1
+    _click_store.extend(events)
+    db = _click_db
+    if db is not None and events:
+        db.put(events)
+    if events:
+        _notify_listeners(events)
+        detail = ", ".join(f"{k}: {v}" for k, v in by_source.items())
+        _log_click(f"Lote de {len(events)} evento(s) recibido ({detail})")
+    return len(events)
+
+
+def _notify_listeners(events):
+    for fn in list(_click_listeners):
+        try:
+            fn(events)
+        except Exception as err:  # un listener roto no frena el registro
+            print(f"Listener de clicks falló: {err!r}")
+
+
+def add_click_listener(fn):
+    """fn(events) se llama con cada lote de clicks recibido (ya guardado)."""
+    if fn not in _click_listeners:
+        _click_listeners.append(fn)
+
+
+def remove_click_listener(fn):
+    if fn in _click_listeners:
+        _click_listeners.remove(fn)
+
+
+def enable_colab_bridge(verbose: bool = False):
     """
     Registra el callback JS→Python en Colab para que el dashboard
-    pueda enviar el nodo clicado a Python.
+    pueda enviar el nodo clicado a Python. verbose=True imprime una línea
+    por click/lote recibido.
     """
+    global _verbose_clicks
     if not _IN_COLAB:
         return False
+    _verbose_clicks = verbose
 
     def _cb(click_data):
-        global global_node_, global_clicks_, global_click_history_  # <-- AÑADIR global_click_history_
-        global_node_ = click_data
-        
-        # Agregar timestamp si no viene
-        if "__ts" not in click_data:
-            click_data["__ts"] = datetime.now().isoformat()
-        
-        global_clicks_.append(global_node_)
-        global_click_history_.append(click_data)  # <-- AÑADIR esta línea
-        
-        print(f"Click capturado desde {click_data.get('__src', 'unknown')}: {click_data.get('id', 'unknown')}")
-        
+        _record_click(click_data)
+        _log_click(f"Click capturado desde {click_data.get('__src', 'unknown')}: {click_data.get('id', 'unknown')}")
         return {"status": "ok", "received": click_data}
 
+    def _cb_batch(events):
+        return {"status": "ok", "received": _record_batch(events)}
+
+    def _cb_timecurve(chart_id, lo, hi):
+        from IPython.display import JSON
+
+        with _timecurves_lock:
+            tc = _timecurves.get(chart_id)
+        view = _timecurve_window(tc, lo, hi) if tc is not None else None
+        return JSON(json.loads(json.dumps(view, default=str)))
+
     _colab_output.register_callback("ourlib.update_node", _cb)
+    _colab_output.register_callback("ourlib.update_nodes", _cb_batch)
+    _colab_output.register_callback("ourlib.timecurve_window", _cb_timecurve)
     return True
 
 
+@app.after_request
+def _allow_notebook_origin(resp):
+    # el notebook (otro origen) postea a 127.0.0.1:<port>
+    resp.headers["Access-Control-Allow-Origin"] = "*"
+    resp.headers["Access-Control-Allow-Headers"] = "Content-Type"
+    return resp
+
 
 @app.route("/update_node", methods=["POST"])
 def update_node():
     """Endpoint HTTP para que el JS notifique a Python el nodo clicado."""
-    global global_node_, global_clicks_, global_click_history_  # <-- AÑADIR global_click_history_
-    data = request.get_json() or {}
-    click_data = data.get("node", {})
-    
-    global_node_ = click_data
-    
-    # Agregar timestamp si no viene
-    if "__ts" not in click_data:
-        click_data["__ts"] = datetime.now().isoformat()
-    
-    if global_node_ is not None:
-        global_clicks_.append(global_node_)
-        global_click_history_.append(click_data)  # <-- AÑADIR esta línea
-    
-    print(f"Click recibido via HTTP desde {click_data.get('__src', 'unknown')}: {click_data.get('id', 'unknown')}")
-    
-    return jsonify({"status": "ok", "node": global_node_})
-
-def start_server(port: int = 5000):
+    data = request.get_json(force=True, silent=True)
+    node = data.get("node", {}) if isinstance(data, dict) else None
+    if not isinstance(node, dict):
+        return jsonify({"status": "error", "message": 'se esperaba {"node": {...}}'}), 400
+    click_data = _record_click(node)
+
+    _log_click(f"Click recibido via HTTP desde {click_data.get('__src', 'unknown')}: {click_data.get('id', 'unknown')}")
+
+    return jsonify({"status": "ok", "node": click_data})
+
+
+@app.route("/update_nodes", methods=["POST"])
+def update_nodes():
+    """
+    Endpoint por lotes: {"nodes": [evento, ...]}. Acepta text/plain porque
+    navigator.sendBeacon no puede mandar application/json sin preflight.
+    """
+    data = request.get_json(force=True, silent=True)
+    if data is None:
+        data = {}
+    nodes = data.get("nodes", []) if isinstance(data, dict) else None
+    if not isinstance(nodes, list):
+        return jsonify({"status": "error", "message": 'se esperaba {"nodes": [evento, ...]}'}), 400
+    n = _record_batch(nodes)
+    return jsonify({"status": "ok", "received": n})
+
+
+@app.route("/timecurve/<chart_id>")
+def timecurve_window(chart_id):
+    """Ventana [lo, hi] (por _order) de una time curve mostrada con expand=True."""
+    with _timecurves_lock:
+        tc = _timecurves.get(chart_id)
+    if tc is None:
+        return jsonify({"status": "error", "message": "time curve desconocida"}), 404
+    view = _timecurve_window(tc, request.args.get("lo", type=float), request.args.get("hi", type=float))
+    return Response(json.dumps(view, default=str, ensure_ascii=False), mimetype="application/json")
+
+
+@app.route("/events/<dash_id>")
+def dashboard_events(dash_id):
     """
-    Levanta un pequeño servidor Flask en un thread aparte para que
-    el JS del notebook pueda hacer POST a /update_node.
+    Server-Sent Events con los diffs de un dashboard mostrado con live=True
+    (ver push_dashboard_update). El navegador indica hasta qué versión
+    tiene con Last-Event-ID (reconexión) o ?since= (primera conexión).
     """
-    thread = Thread(
-        target=lambda: app.run(port=port, debug=False, use_reloader=False)
+    since = request.headers.get("Last-Event-ID") or request.args.get("since") or 0
+    try:
+        since = int(since)
+    except ValueError:
+        since = -1  # fuerza el estado completo
+    # cada stream ocupa un worker: el hub cierra el más viejo si hay demasiados
+    events = _dashboards.stream(dash_id, since)
+    if events is None:
+        return jsonify({"status": "error", "message": "dashboard desconocido"}), 404
+    return Response(
+        events,
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
-    thread.daemon = True
-    thread.start()
+
+# ============================================================
+#  Servidor del puente JS -> Python
+# ============================================================
+_server = None
+_server_port = 5000  # puerto que usa el JS de los dashboards
+
+_REJECT_503 = (
+    b"HTTP/1.1 503 Service Unavailable\r\n"
+    b"Retry-After: 1\r\n"
+    b"Access-Control-Allow-Origin: *\r\n"
+    b"Content-Length: 0\r\n"
+    b"Connection: close\r\n\r\n"
+)
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass  # sin una línea por POST en la salida del notebook
+
+
+class _PooledWSGIServer(BaseWSGIServer):
+    """
+    Servidor werkzeug con un pool fijo de workers y una cola de conexiones
+    acotada: si la cola está llena la conexión se responde con 503 (el JS
+    reintenta el lote) en vez de crear threads sin límite. werkzeug cierra
+    la conexión tras cada respuesta (sin keep-alive); con waitress
+    instalado start_server usa waitress.
+    """
+
+    multithread = True
+
+    def __init__(self, host, port, wsgi_app, workers=8, max_queue=64, timeout=5.0):
+        handler = type("_Handler", (_QuietHandler,), {"timeout": timeout})
+        super().__init__(host, port, wsgi_app, handler=handler)
+        self.rejected = 0
+        self._pending = queue.Queue(maxsize=max_queue)
+        self._workers = [
+            Thread(target=self._work, name=f"ourlib-bridge-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for t in self._workers:
+            t.start()
+
+    def process_request(self, request, client_address):
+        try:
+            self._pending.put_nowait((request, client_address))
+        except queue.Full:
+            self._reject(request)
+
+    def _reject(self, request):
+        self.rejected += 1
+        try:
+            # leer lo que ya mandó el cliente: si se cierra con datos sin
+            # leer el cliente recibe un RST en vez del 503
+            request.settimeout(0.05)
+            request.recv(65536)
+            request.sendall(_REJECT_503)
+        except OSError:
+            pass
+        self.shutdown_request(request)
+
+    def _work(self):
+        while True:
+            item = self._pending.get()
+            if item is None:
+                return
+            request, client_address = item
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    def start(self):
+        self._thread = Thread(target=self.serve_forever, name="ourlib-bridge", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Deja de aceptar, atiende lo encolado y cierra el socket."""
+        self.shutdown()
+        self._thread.join(timeout)
+        for _ in self._workers:
+            self._pending.put(None)
+        for t in self._workers:
+            t.join(timeout)
+        self.server_close()
+
+
+class _WaitressServer:
+    """
+    waitress (servidor WSGI de producción): pool de `workers` threads,
+    keep-alive, y a lo sumo workers + max_queue conexiones abiertas (las
+    demás esperan en el backlog del socket hasta que se libere una).
+    """
+
+    def __init__(self, host, port, wsgi_app, workers=8, max_queue=64, timeout=5.0):
+        import logging
+        from waitress.server import create_server
+
+        # un aviso por cada request encolado ensucia la salida del notebook
+        logging.getLogger("waitress.queue").setLevel(logging.ERROR)
+        idle = max(1, math.ceil(timeout))
+        self._server = create_server(
+            wsgi_app, host=host, port=port, threads=workers,
+            connection_limit=workers + max_queue,
+            channel_timeout=idle, cleanup_interval=idle, clear_untrusted_proxy_headers=True,
+        )
+        self.server_port = int(self._server.effective_port)
+
+    def start(self):
+        self._thread = Thread(target=self._server.run, name="ourlib-bridge", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Termina las tareas en curso, cierra socket y conexiones y espera al loop."""
+        from waitress import wasyncore
+
+        self._server.task_dispatcher.shutdown(cancel_pending=False, timeout=timeout)
+        # el map del loop solo se toca desde su thread: el cierre va como
+        # callback del trigger, que además despierta el select/poll; con el
+        # map vacío run() retorna y el puerto queda libre al volver de join
+        server_map = self._server._map
+        self._server.trigger.pull_trigger(lambda: wasyncore.close_all(server_map))
+        self._thread.join(timeout)
+
+
+def start_server(port: int = 5000, host: str = "127.0.0.1", workers: int = 8,
+                 max_queue: int = 64, keepalive_timeout: float = 5.0,
+                 backend: str = "auto", verbose: bool = False):
+    """
+    Levanta el servidor del puente en un thread aparte para que el JS del
+    notebook haga POST a /update_node(s).
+
+    workers           : threads que atienden requests
+    max_queue         : conexiones en espera antes de rechazar/encolar en el socket
+    keepalive_timeout : segundos que se mantiene una conexión ociosa
+    backend           : "waitress", "werkzeug" o "auto" (waitress si está instalado)
+    verbose           : imprime una línea por click/lote recibido
+
+    Los dashboards que se muestren después usan este puerto (port=0 elige
+    uno libre). Cada dashboard live=True abierto mantiene un stream SSE y
+    ocupa un worker mientras está suscrito; se admiten a lo sumo
+    workers - 1 streams (al pasar el límite se cierra el más viejo), así
+    que siempre queda un worker para los clicks.
+    """
+    global _server, _server_port, _verbose_clicks
+    if backend == "auto":
+        try:
+            import waitress  # noqa: F401
+            backend = "waitress"
+        except ImportError:
+            backend = "werkzeug"
+    if backend not in ("waitress", "werkzeug"):
+        raise ValueError("backend debe ser 'auto', 'waitress' o 'werkzeug'")
+
+    if workers < 2:
+        raise ValueError("workers debe ser >= 2 (uno queda libre de los streams SSE)")
+
+    stop_server()
+    _verbose_clicks = verbose
+    _dashboards.max_streams = workers - 1
+    server_cls = _WaitressServer if backend == "waitress" else _PooledWSGIServer
+    _server = server_cls(host, port, app, workers=workers,
+                         max_queue=max_queue, timeout=keepalive_timeout)
+    _server_port = _server.server_port
+    _server.start()
+    return _server
+
+
+def stop_server(timeout: float = 5.0):
+    """Detiene el servidor de start_server (si está corriendo)."""
+    global _server
+    if _server is not None:
+        _dashboards.disconnect_all()  # los streams SSE ocupan un worker cada uno
+        _server.stop(timeout)
+        _server = None
+
+
+# JS compartido por los dashboards: manda payloads a Python (callback de
+# Colab o POST al servidor de start_server). Se registra como asset
+# "bridge" (una vez por documento); cada dashboard fija window.__ourlibPort
+# al montarse y manda con __ourlibBridge.sender(dash_id).
+_BRIDGE_JS = """
+// Cola de eventos compartida por todos los dashboards del documento: los
+// eventos se agrupan y se mandan en lotes (ourlib.update_nodes en Colab,
+// POST /update_nodes fuera), con sendBeacon al ocultar la página.
+if (!window.__ourlibBridge) {
+  window.__ourlibBridge = (function() {
+    const FLUSH_MS = 300;    // ventana de agrupación
+    const MAX_BATCH = 200;   // lote máximo antes de forzar envío
+    const RETRY_MS = 1000;   // espera tras un 503 (servidor saturado)
+    const queue = [];
+    let timer = null;
+
+    // el puerto lo fija cada dashboard (window.__ourlibPort) al montarse
+    function port() { return window.__ourlibPort || 5000; }
+    function urls() {
+      return ['http://127.0.0.1:' + port() + '/update_nodes',
+              '/proxy/' + port() + '/update_nodes'];
+    }
+
+    function inColab() {
+      return !!(window.google && google.colab && google.colab.kernel && google.colab.kernel.invokeFunction);
+    }
+
+    function post(url, body) {
+      return fetch(url, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body,
+        keepalive: body.length < 60000
+      }).then(r => {
+        if (!r.ok) {
+          const err = new Error('HTTP ' + r.status);
+          err.status = r.status;
+          throw err;
+        }
+        return r;
+      });
+    }
+
+    function take() {
+      if (timer) clearTimeout(timer);
+      timer = null;
+      return queue.splice(0, queue.length);
+    }
+
+    // lote rechazado por saturación: vuelve al frente de la cola
+    function requeue(batch) {
+      queue.unshift(...batch);
+      if (timer) clearTimeout(timer);
+      timer = setTimeout(flush, RETRY_MS);
+    }
+
+    function flush() {
+      const batch = take();
+      if (!batch.length) return;
+      try {
+        if (inColab()) {
+          google.colab.kernel.invokeFunction('ourlib.update_nodes', [batch], {})
+            .catch(err => console.warn('Colab bridge error:', err));
+          return;
+        }
+        const body = JSON.stringify({ nodes: batch });
+        const [direct, proxied] = urls();
+        post(direct, body)
+          .catch(err => err.status === 503 ? Promise.reject(err) : post(proxied, body))
+          .catch(err => {
+            if (err.status === 503) requeue(batch);
+            else console.warn('Fetch bridge failed:', err);
+          });
+      } catch (e) {
+        console.warn('sendToPython failed:', e);
+      }
+    }
+
+    // al ocultar/cerrar la página: lo pendiente sale con sendBeacon
+    function beacon() {
+      if (!queue.length) return;
+      if (inColab() || !navigator.sendBeacon) return flush();
+      const batch = take();
+      const blob = new Blob([JSON.stringify({ nodes: batch })], { type: 'text/plain' });
+      const [direct, proxied] = urls();
+      if (!navigator.sendBeacon(direct, blob)) {
+        navigator.sendBeacon(proxied, blob);
+      }
+    }
+
+    function send(payload) {
+      queue.push(payload);
+      if (queue.length >= MAX_BATCH) flush();
+      else if (!timer) timer = setTimeout(flush, FLUSH_MS);
+    }
+
+    window.addEventListener('pagehide', beacon);
+    document.addEventListener('visibilitychange', () => {
+      if (document.visibilityState === 'hidden') beacon();
+    });
+
+    // send con __session fijo: el dashboard que originó el evento
+    // (particiona el historial en Python)
+    function sender(session) {
+      return payload => send(
+        session && payload.__session === undefined
+          ? Object.assign({ __session: session }, payload)
+          : payload
+      );
+    }
+
+    return { send, flush, sender };
+  })();
+}
+"""
+register_asset("bridge", _BRIDGE_JS, guard="window.__ourlibBridge")
 
 # ============================================================
 #  Funciones para obtener el historial de clicks
 # ============================================================
 
-def get_current_node():
-    """Devuelve el último nodo recibido desde JS (o None)."""
-    return global_node_
+def configure_click_store(capacity: int = 100_000, spill_path: str = None,
+                          session_capacity: int = 10_000, max_sessions: int = 64):
+    """
+    Reemplaza el almacén de clicks (se pierde el historial en memoria).
 
-def get_click_history(clear: bool = False):
-    """Devuelve el historial completo de clicks con metadata."""
-    global global_click_history_
-    hist = list(global_click_history_)
+    capacity: eventos máximos en memoria; los más antiguos se descartan
+    por bloques, o se vuelcan a `spill_path` (JSON Lines) si se indica.
+    session_capacity / max_sessions: eventos devueltos por dashboard (los
+    más recientes) y dashboards listados en list_click_sessions. Las vistas
+    por dashboard no copian eventos: se sacan del mismo almacén.
+    """
+    global _click_store, _click_log
+    with _record_lock:
+        _click_store = ClickStore(capacity=capacity, spill_path=spill_path)
+        _click_log = ClickLog(max_rows=_click_store.capacity)
+        _history_from.update(history=0, simple=0)
+        _session_limits.update(capacity=session_capacity, sessions=max_sessions)
+        _session_from.clear()
+    return _click_store
+
+
+def _history_view(which: str, clear: bool):
+    snap = _click_store.snapshot()
+    start = _history_from[which]
     if clear:
-        global_click_history_.clear()
-    return hist
+        _history_from[which] = snap.start_seq + len(snap)
+    return snap.since(start)
+
+
+def _session_view(session: str) -> ClickView:
+    """Eventos en memoria de un dashboard, buscados en el log columnar."""
+    log = _click_log
+    snap = log.sync(_click_store)
+    since = max(snap.start_seq, _session_from.get(str(session), 0))
+    seqs = log.seqs_where("session", session, since=since)
+    seqs = seqs[seqs < snap.start_seq + len(snap)][-_session_limits["capacity"]:]
+    return ClickView(snap, (seqs - snap.start_seq).tolist())
+
+
+def _hide_session(session: str) -> bool:
+    """Oculta los eventos actuales de un dashboard; False si no tenía."""
+    view = _session_view(session)
+    _session_from[str(session)] = view.end_seq
+    return len(view) > 0
+
+
+def get_current_node(session: str = None):
+    """Devuelve el último nodo recibido desde JS (o None), opcionalmente de un dashboard."""
+    if session is None:
+        return _click_store.last
+    view = _session_view(session)
+    return view[-1] if len(view) else None
+
+def get_click_history(clear: bool = False, copy: bool = True):
+    """
+    Devuelve el historial completo de clicks con metadata.
+
+    copy=False devuelve una instantánea de solo lectura (ClickSnapshot)
+    en O(1), sin copiar los eventos.
+    """
+    hist = _history_view("history", clear)
+    return list(hist) if copy else hist
 
 def get_simple_click_history(clear: bool = False):
     """Devuelve solo los nodos clicados (compatibilidad hacia atrás)."""
-    global global_clicks_
-    hist = list(global_clicks_)
+    return list(_history_view("simple", clear))
+
+def clear_click_history(session: str = None):
+    """
+    Limpia el historial de clics. Con `session` solo se vacía el
+    historial de ese dashboard (el global y los demás quedan intactos).
+    """
+    if session is not None:
+        _hide_session(session)
+        return
+    with _record_lock:
+        _click_store.clear()
+        _click_log.clear()
+        _history_from.update(history=0, simple=0)
+        _session_from.clear()
+
+def enable_click_persistence(path: str = "clicks.sqlite", batch_size: int = 500,
+                             flush_interval: float = 0.5):
+    """
+    Guarda además cada evento en una base SQLite (modo WAL, escritor en
+    segundo plano que inserta por lotes). Con la persistencia activa,
+    get_clicks_by_source y get_clicks_between consultan la base, que
+    conserva los eventos entre reinicios del kernel.
+    """
+    global _click_db
+    disable_click_persistence()
+    _click_db = ClickDB(path, batch_size=batch_size, flush_interval=flush_interval)
+    return _click_db
+
+def disable_click_persistence():
+    """Escribe lo pendiente y cierra la base de clicks (si estaba activa)."""
+    global _click_db
+    db, _click_db = _click_db, None  # primero se deja de encolar, después se cierra
+    if db is not None:
+        db.close()
+
+def get_session_clicks(session: str, clear: bool = False, copy: bool = True):
+    """
+    Clicks de un solo dashboard (session = html.dash_id), en orden de
+    llegada. Se buscan sobre la columna session del log (códigos Int32),
+    sin recorrer los dicts del historial. clear=True además vacía esa
+    sesión; copy=False devuelve una vista de solo lectura (ClickView).
+    """
+    view = _session_view(session)
     if clear:
-        global_clicks_.clear()
-    return hist
-
-def clear_click_history():
-    """Limpia el historial de clics."""
-    global global_clicks_, global_click_history_
-    global_clicks_.clear()
-    global_click_history_.clear()
-
-def get_clicks_by_source(source: str = None):
-    """Filtra el historial por fuente (graph, map, score, etc.)"""
-    history = get_click_history()
+        _session_from[str(session)] = view.end_seq
+    return list(view) if copy else view
+
+def list_click_sessions() -> dict:
+    """
+    dash_id -> clicks en memoria, de los dashboards con eventos (del menos
+    al más recientemente activo, como mucho max_sessions).
+    """
+    snap = _click_log.sync(_click_store)
+    last = _click_log.last_seen("session", since=snap.start_seq)
+    out = {}
+    for session in list(last)[::-1]:
+        n = len(_session_view(session))
+        if n:
+            out[session] = n
+            if len(out) == _session_limits["sessions"]:
+                break
+    return dict(reversed(out.items()))
+
+def close_click_session(session: str) -> bool:
+    """Olvida los clicks en memoria de un dashboard (no toca los demás)."""
+    return _hide_session(session)
+
+def get_clicks_by_source(source: str = None, session: str = None):
+    """Filtra el historial por fuente (graph, map, score, etc.) y/o dashboard."""
+    if _click_db is not None:
+        return _click_db.query(source=source or None, session=session)
+    history = get_session_clicks(session) if session is not None else get_click_history()
     if source:
         return [click for click in history if click.get('__src') == source]
     return history
 
-def print_click_summary():
-    """Imprime un resumen del historial de clicks."""
-    history = get_click_history()
-    if not history:
-        print("No hay clicks registrados")
-        return
-    
-    print(f"\n=== RESUMEN DE CLICKS ({len(history)} total) ===")
-    
-    by_source = {}
+def get_clicks_between(start=None, end=None, source: str = None, session: str = None):
+    """
+    Eventos con timestamp en [start, end) (ISO-8601 o datetime; None = sin
+    límite), opcionalmente de una sola fuente y/o dashboard.
+    """
+    if _click_db is not None:
+        return _click_db.query(source=source, start=start, end=end, session=session)
+    lo = None if start is None else _ts_to_ns(start)
+    hi = None if end is None else _ts_to_ns(end)
+    if session is not None:
+        history = get_session_clicks(session, copy=False)
+    else:
+        history = get_click_history(copy=False)
+    out = []
     for click in history:
-        source = click.get('__src', 'unknown')
-        if source not in by_source:
-            by_source[source] = []
-        by_source[source].append(click)
-    
-    for source, clicks in by_source.items():
-        print(f"\n{source.upper()}: {len(clicks)} clicks")
-        for click in clicks[-5:]:  # últimos 5 de cada fuente
-            node_id = click.get('id', 'unknown')
-            name = click.get('name', 'sin nombre')
-            timestamp = click.get('timestamp', 'sin timestamp')
-            print(f"  - {node_id}: {name} ({timestamp})")
+        if source and click.get("__src") != source:
+            continue
+        ts = _ts_to_ns(click.get("__ts"))
+        if (lo is None or ts >= lo) and (hi is None or ts < hi):
+            out.append(click)
+    return out
 
 def print_click_summary():
     """Imprime un resumen del historial de clicks como DataFrame."""
-    history = get_click_history()
-    if not history:
-        print("No hay clicks registrados")
+    df = get_click_dataframe()
+    if df is None:
         return None
-    
-    # Crear DataFrame
-    import pandas as pd
-    
-    # Preparar datos para el DataFrame
-    data = []
-    for click in history:
-        row = {
-            'timestamp': click.get('__ts', ''),
-            'source': click.get('__src', 'unknown'),
-            'chart': click.get('__chart', 'unknown'),
-            'id': click.get('id', ''),
-            'name': click.get('name', ''),
-            'region': click.get('region', ''),
-            'SCORE': click.get('SCORE', None),
-            'interaction': click.get('__interaction', 'click')
-        }
-        
-        # Para brush selections, mostrar información adicional
-        if click.get('__interaction') == 'brush':
-            row['selected_count'] = click.get('selected_count', 0)
-            row['selected_ids'] = str(click.get('selected_ids', []))[:50] + "..." if len(str(click.get('selected_ids', []))) > 50 else str(click.get('selected_ids', []))
-        
-        data.append(row)
-    
-    df = pd.DataFrame(data)
-    
+
     # Mostrar resumen
-    print(f"=== RESUMEN DE CLICKS ({len(history)} total) ===")
-    print(f"Por gráfico:")
-    print(df['source'].value_counts())
-    
-    print(f"\n=== DATAFRAME COMPLETO ===")
+    print(f"=== RESUMEN DE CLICKS ({len(df)} total) ===")
+    print("Por gráfico:")
+    print(_source_counts(df))
+
+    from .click_analytics import source_funnel, transitions
+
+    print("\n=== EMBUDO (por dashboard) ===")
+    print(source_funnel(df))
+    print("\n=== TRANSICIONES MÁS FRECUENTES ===")
+    print(transitions(df, top=5))
+
+    print("\n=== DATAFRAME COMPLETO ===")
     # Mostrar todas las filas sin truncar
-    with pd.option_context('display.max_rows', None, 
-                          'display.max_columns', None, 
+    import pandas as pd
+    with pd.option_context('display.max_rows', None,
+                          'display.max_columns', None,
                           'display.width', None,
                           'display.max_colwidth', 50):
         print(df)
-    
+
     return df
 
+
+def _source_counts(df):
+    """Clicks por source: conteo incremental del log si df es el log entero."""
+    import pandas as pd
+
+    if _history_from["history"] <= _click_log.start_seq:
+        counts = pd.Series(_click_log.counts("source"), name="count", dtype="int64")
+        counts.index.name = "source"
+        return counts.sort_values(ascending=False, kind="stable")
+    counts = df["source"].value_counts()
+    return counts[counts > 0]
+
+
 # Función adicional para obtener directamente como DataFrame
-def get_click_dataframe():
-    """Devuelve el historial de clicks como DataFrame de pandas."""
-    history = get_click_history()
-    if not history:
+def get_click_dataframe(session: str = None):
+    """
+    Devuelve el historial de clicks como DataFrame de pandas.
+
+    Se arma sobre los arrays del log columnar sin copiar: source, chart,
+    id, name, region, interaction y session son Categorical de texto (los
+    ids numéricos llegan como "25", no 25) y timestamp es datetime64[ns,
+    UTC], con zona; df["timestamp"].dt.tz_convert("America/Lima") lo
+    pasa a hora local. Con `session` solo las filas de ese dashboard.
+    """
+    _click_log.sync(_click_store)
+    df = _click_log.to_dataframe(since=_history_from["history"])
+    if session is not None:
+        df = df[df["session"] == session].reset_index(drop=True)
+    if df.empty:
         print("No hay clicks registrados")
         return None
-    
-    import pandas as pd
-    
-    data = []
-    for click in history:
-        row = {
-            'timestamp': click.get('__ts', ''),
-            'source': click.get('__src', 'unknown'),
-            'chart': click.get('__chart', 'unknown'),
-            'id': click.get('id', ''),
-            'name': click.get('name', ''),
-            'region': click.get('region', ''),
-            'SCORE': click.get('SCORE', None),
-            'lat': click.get('lat', None),
-            'lon': click.get('lon', None),
-            'interaction': click.get('__interaction', 'click'),
-            'selected_count': click.get('selected_count', None)
-        }
-        data.append(row)
-    
-    df = pd.DataFrame(data)
     return df
 
 
 # ============================================================
 # python -> js
 
+# time curves mostradas con expand=True: datos preparados por chart_id para
+# servir la ventana visible a resolución completa al hacer zoom
+_timecurves = OrderedDict()
+_timecurves_lock = Lock()
+_TIMECURVE_KEEP = 16
+_TIMECURVE_FIELDS = ["timestamp", "source", "chart", "id", "name", "region", "SCORE", "_order"]
 
-def show_click_timecurve(click_df, width: int = 900, height: int = 420):
-    """
-    Visualiza el historial de clicks como una "time curve":
 
-      - Cada fila del DataFrame es un nodo.
-      - El orden inicial es por timestamp (temporal).
-      - Color de nodo según `source` (force/map/score/...).
-      - Línea suave (curva) que conecta todos los puntos en orden temporal.
-      - Itinerario manual:
-          * Click en un nodo: lo agrega/quita del itinerario.
-          * El itinerario se dibuja como otra curva más gruesa.
-          * Panel inferior con la lista ordenada del itinerario.
-          * Botón para limpiar el itinerario.
-    """
+def _prepare_timecurve(click_df, max_points: int) -> dict:
+    """Ordena el historial en el tiempo y precalcula lo que usa cada ventana."""
     import pandas as pd
 
-    if click_df is None or len(click_df) == 0:
-        return HTML("<em>No hay clicks en el historial para dibujar la time curve.</em>")
-
     df = click_df.copy()
 
     # Aseguramos columnas mínimas
@@ -256,47 +778,93 @@ def show_click_timecurve(click_df, width: int = 900, height: int = 420):
             df[col] = ""
 
     # Parsear timestamp para ordenar (si se puede)
-    if "timestamp" in df.columns:
-        df["_ts"] = pd.to_datetime(df["timestamp"], errors="coerce")
-    else:
-        df["_ts"] = pd.NaT
+    df["_ts"] = pd.to_datetime(df["timestamp"], errors="coerce", utc=True)
 
     # Ordenar:
     # - si hay algún timestamp válido → ordenar por tiempo
     # - si no → usamos el índice tal cual
     if df["_ts"].notna().any():
-        df = df.sort_values("_ts").reset_index(drop=True)
+        df = df.sort_values("_ts", kind="stable").reset_index(drop=True)
     else:
         df = df.reset_index(drop=True)
 
     # _order = posición en la secuencia (0, 1, 2, ...)
     df["_order"] = df.index.astype(float)
 
-    # Asegurar SCORE como numérico (para tooltips)
+    # Asegurar SCORE como numérico (para tooltips); NaN -> null en el JSON
     if "SCORE" in df.columns:
-        df["SCORE"] = pd.to_numeric(df["SCORE"], errors="coerce")
+        score = pd.to_numeric(df["SCORE"], errors="coerce")
+        df["SCORE"] = score.astype(object).where(score.notna(), None)
     else:
         df["SCORE"] = None
 
-    # Build records for JS
-    records = df[
-        [
-            "timestamp",
-            "source",
-            "chart",
-            "id",
-            "name",
-            "region",
-            "SCORE",
-            "_order",
-        ]
-    ].to_dict(orient="records")
+    source = df["source"].astype(object).where(df["source"].notna(), "")
+    df["source"] = source.astype(str).replace("", "other")
+    codes, sources = pd.factorize(df["source"])
 
-    data_json = json.dumps(records, default=str, ensure_ascii=False)
-    chart_id = f"timecurve-{uuid.uuid4().hex}"
+    # eje "y" para LTTB: segundos desde el primer click (el ritmo de la
+    # sesión); sin timestamp, la posición
+    ts = df["_ts"]
+    if ts.notna().any():
+        sec = (ts - ts.min()).dt.total_seconds().ffill().bfill().to_numpy()
+    else:
+        sec = df["_order"].to_numpy()
+
+    return {
+        "df": df[_TIMECURVE_FIELDS],
+        "order": df["_order"].to_numpy(),
+        "sec": sec,
+        "codes": codes,
+        "sources": list(sources),
+        "max_points": max(int(max_points), 3),
+    }
 
-    html = f"""
-<div id="{chart_id}" style="width:100%; max-width:{width}px; margin:10px 0; font-family:system-ui;">
+
+def _timecurve_window(tc: dict, lo=None, hi=None) -> dict:
+    """
+    Clicks con _order en [lo, hi]. Si son más de max_points se reducen con
+    LTTB (graph_prep.lttb) sobre (orden, tiempo): cada punto elegido
+    representa a su bucket y lleva n, el rango _lo.._hi, los timestamps
+    extremos (tal como vienen en el historial) y el conteo por source.
+    """
+    df = tc["df"]
+    n = len(df)
+    lo = 0 if lo is None else min(max(int(math.floor(lo)), 0), n - 1)
+    hi = n - 1 if hi is None else min(max(int(math.ceil(hi)), lo), n - 1)
+    view = {"total": n, "lo": lo, "hi": hi, "sources": tc["sources"], "binned": False}
+
+    m = hi - lo + 1
+    if m <= tc["max_points"]:
+        view["rows"] = df.iloc[lo: hi + 1].to_dict(orient="records")
+        return view
+
+    idx, bounds = lttb(tc["order"][lo: hi + 1], tc["sec"][lo: hi + 1], tc["max_points"])
+    sizes = np.diff(bounds)
+    n_src = max(len(tc["sources"]), 1)
+    bucket = np.repeat(np.arange(len(idx)), sizes)
+    counts = np.bincount(
+        bucket * n_src + tc["codes"][lo: hi + 1], minlength=len(idx) * n_src
+    ).reshape(len(idx), n_src)
+
+    rows = df.iloc[lo + idx].to_dict(orient="records")
+    ts = df["timestamp"].to_numpy()
+    for r, b0, size, c in zip(rows, bounds[:-1], sizes, counts):
+        if size > 1:
+            r["n"] = int(size)
+            r["_lo"] = lo + int(b0)
+            r["_hi"] = lo + int(b0 + size - 1)
+            r["t_lo"] = ts[r["_lo"]]
+            r["t_hi"] = ts[r["_hi"]]
+            r["counts"] = {tc["sources"][k]: int(v) for k, v in enumerate(c) if v}
+    view["rows"] = rows
+    view["binned"] = True
+    return view
+
+
+_TIMECURVE_CHART = ChartModule(
+    "click_timecurve",
+    markup="""
+<div id="[CHART_ID]" style="width:100%; max-width:[WIDTH]px; margin:10px 0; font-family:system-ui;">
   <div style="border:2px solid #cfd8dc; border-radius:16px; padding:10px 12px; background:#fafafa;
               box-shadow:0 2px 8px rgba(0,0,0,0.05);">
     <div style="display:flex; justify-content:space-between; align-items:center; margin-bottom:6px;">
@@ -304,37 +872,37 @@ def show_click_timecurve(click_df, width: int = 900, height: int = 420):
         <div style="font-size:14px; font-weight:600; color:#263238;">Time curve · Itinerario interactivo</div>
         <div style="font-size:11px; color:#607d8b;">
           Cada punto es un click en el dashboard (orden temporal). Construye tu itinerario haciendo click sobre los puntos.
+          Rueda o arrastre para hacer zoom.
         </div>
+        <div id="[CHART_ID]-status" style="font-size:10px; color:#90a4ae;"></div>
       </div>
-      <button id="{chart_id}-clear"
+      <button id="[CHART_ID]-clear"
               style="font-size:11px; padding:4px 8px; border-radius:10px; border:1px solid #b0bec5;
                      background:#eceff1; cursor:pointer;">
         Limpiar itinerario
       </button>
     </div>
-    <div id="{chart_id}-svg" style="width:100%; height:{height}px;"></div>
+    <div id="[CHART_ID]-svg" style="width:100%; height:[HEIGHT]px;"></div>
   </div>
 
-  <div id="{chart_id}-itinerary"
+  <div id="[CHART_ID]-itinerary"
        style="margin-top:8px; font-size:11px; color:#37474f; background:#f5f5f5; border-radius:10px; padding:6px 8px;">
-    <strong>Itinerario:</strong> <span id="{chart_id}-itinerary-text"><em>haz click en los puntos para construirlo</em></span>
+    <strong>Itinerario:</strong> <span id="[CHART_ID]-itinerary-text"><em>haz click en los puntos para construirlo</em></span>
   </div>
 </div>
-
-<script src="https://cdn.jsdelivr.net/npm/d3@7"></script>
-<script>
-(function() {{
-  const data = {data_json};
-  const rootId = "{chart_id}";
+""",
+    script="""
+  const top = payload;               // vista inicial (completa o reducida con LTTB)
   const svgHost = document.getElementById(rootId + "-svg");
   const clearBtn = document.getElementById(rootId + "-clear");
   const itinBox = document.getElementById(rootId + "-itinerary-text");
+  const statusBox = document.getElementById(rootId + "-status");
 
   if (!svgHost) return;
 
-  const width = svgHost.clientWidth || {width};
-  const height = {height};
-  const margin = {{ top: 24, right: 24, bottom: 28, left: 24 }};
+  const width = svgHost.clientWidth || vars.WIDTH;
+  const height = vars.HEIGHT;
+  const margin = { top: 24, right: 24, bottom: 28, left: 24 };
   const innerWidth  = width  - margin.left - margin.right;
   const innerHeight = height - margin.top  - margin.bottom;
 
@@ -343,101 +911,147 @@ def show_click_timecurve(click_df, width: int = 900, height: int = 420):
     .attr("width", width)
     .attr("height", height);
 
+  svg.append("clipPath")
+    .attr("id", rootId + "-clip")
+    .append("rect")
+    .attr("x", -16)
+    .attr("y", -margin.top)
+    .attr("width", innerWidth + 32)
+    .attr("height", height);
+
   const g = svg.append("g")
-    .attr("transform", `translate(${{margin.left}},${{margin.top}})`);
+    .attr("transform", `translate(${margin.left},${margin.top})`);
+
+  // fondo transparente: recibe la rueda/arrastre del zoom
+  g.append("rect")
+    .attr("width", innerWidth)
+    .attr("height", innerHeight)
+    .attr("fill", "transparent");
 
-  // Orden temporal
-  const n = data.length;
-  const x = d3.scaleLinear()
-    .domain(d3.extent(data, d => +d._order))
+  const plot = g.append("g").attr("clip-path", `url(#${rootId}-clip)`);
+
+  // Orden temporal: el eje cubre todo el historial aunque lleguen menos puntos
+  const total = top.total;
+  const x0 = d3.scaleLinear()
+    .domain([0, Math.max(total - 1, 1)])
     .range([0, innerWidth]);
+  let x = x0;
+  let rows = top.rows;
 
   const yBase = innerHeight / 2;
 
   // Pequeño jitter vertical según source para que no sea línea totalmente recta
-  const sources = Array.from(new Set(data.map(d => d.source || "other")));
+  const sources = top.sources.length ? top.sources : ["other"];
   const sourceIndex = new Map(sources.map((s, i) => [s, i]));
   const sourceCount = Math.max(1, sources.length);
   const yOffsetScale = d3.scaleLinear()
     .domain([0, sourceCount - 1])
     .range([-innerHeight * 0.2, innerHeight * 0.2]);
 
-  data.forEach((d, i) => {{
-    const idx = sourceIndex.get(d.source || "other") ?? 0;
-    d.x = x(+d._order);
-    d.y = yBase + yOffsetScale(idx) * 0.4;  // jitter suave
-    d.idx = i;
-  }});
-
   // Colores por source
   const color = d3.scaleOrdinal()
     .domain(sources)
     .range(["#1e88e5","#43a047","#fb8c00","#8e24aa","#f4511e","#6d4c41","#00897b"]);
 
+  // un punto agrupado toma el source más frecuente de su tramo
+  function mainSource(d) {
+    if (!d.counts) return d.source || "other";
+    let best = null;
+    for (const s in d.counts) {
+      if (best === null || d.counts[s] > d.counts[best]) best = s;
+    }
+    return best || "other";
+  }
+
+  function radius(d) {
+    return d.n > 1 ? Math.min(6 + 2 * Math.sqrt(d.n - 1), 16) : 6;
+  }
+
+  function yOf(d) {
+    const idx = sourceIndex.get(mainSource(d)) ?? 0;
+    return yBase + (sourceCount > 1 ? yOffsetScale(idx) : 0) * 0.4;  // jitter suave
+  }
+
+  function tooltip(d) {
+    if (d.n > 1) {
+      const parts = Object.entries(d.counts || {})
+        .sort((a, b) => b[1] - a[1])
+        .map(([s, c]) => `${s}: ${c}`)
+        .join(" · ");
+      const span = d.t_lo ? `${d.t_lo} → ${d.t_hi}\\n` : "";
+      return `${span}${d.n} clicks (#${d._lo + 1}–${d._hi + 1})\\n${parts}\\nclick para acercar`;
+    }
+    const t = d.timestamp || "";
+    const name = d.name || d.id || "";
+    const src = d.source || "";
+    const rg = d.region || "";
+    const score = (d.SCORE != null && !isNaN(d.SCORE)) ? " · SCORE " + (+d.SCORE).toFixed(2) : "";
+    return `${t}\\n${name}${rg ? " · " + rg : ""}\\nsource: ${src}${score}`;
+  }
+
   // ----------------- Línea base (time curve) -----------------
   const line = d3.line()
-    .x(d => d.x)
-    .y(d => d.y)
+    .x(d => x(+d._order))
+    .y(d => yOf(d))
     .curve(d3.curveCatmullRom.alpha(0.8));
 
-  g.append("path")
-    .datum(data)
+  const basePath = plot.append("path")
     .attr("fill", "none")
     .attr("stroke", "#b0bec5")
     .attr("stroke-width", 2)
-    .attr("stroke-opacity", 0.8)
-    .attr("d", line);
+    .attr("stroke-opacity", 0.8);
 
   // ----------------- Estado del itinerario -----------------
-  let itinerary = [];  // array de índices (idx)
+  // filas elegidas (por _order): sobreviven a los cambios de ventana
+  let itinerary = [];
+  const chosen = () => new Set(itinerary.map(d => d._order));
 
-  function updateItineraryText() {{
+  function updateItineraryText() {
     if (!itinBox) return;
-    if (!itinerary.length) {{
+    if (!itinerary.length) {
       itinBox.innerHTML = "<em>haz click en los puntos para construirlo</em>";
       return;
-    }}
-    const items = itinerary.map((idx, i) => {{
-      const d = data[idx];
-      const name = d.name || d.id || ("Punto " + (idx+1));
+    }
+    const items = itinerary.map((d, i) => {
+      const name = d.name || d.id || ("Punto " + (d._order + 1));
       const region = d.region || "";
-      return `<span style="margin-right:6px;"><strong>${{i+1}}.</strong> ${{name}}${{region ? " · " + region : ""}}</span>`;
-    }}).join("");
+      return `<span style="margin-right:6px;"><strong>${i+1}.</strong> ${name}${region ? " · " + region : ""}</span>`;
+    }).join("");
     itinBox.innerHTML = items;
-  }}
+  }
 
-  function toggleInItinerary(d) {{
-    const pos = itinerary.indexOf(d.idx);
-    if (pos > -1) {{
+  function toggleInItinerary(d) {
+    const pos = itinerary.findIndex(r => r._order === d._order);
+    if (pos > -1) {
       itinerary.splice(pos, 1);
-    }} else {{
-      itinerary.push(d.idx);
-    }}
+    } else {
+      itinerary.push(d);
+    }
     updateItinerary();
-  }}
+  }
 
-  function clearItinerary() {{
+  function clearItinerary() {
     itinerary = [];
     updateItinerary();
-  }}
+  }
 
   // ----------------- Curva de itinerario -----------------
-  const itinLayer = g.append("g").attr("class", "itin-layer");
+  const itinLayer = plot.append("g").attr("class", "itin-layer");
 
-  function updateItinerary() {{
+  function updateItinerary() {
     updateItineraryText();
 
-    const itinNodes = itinerary.map(idx => data[idx]);
+    const on = chosen();
 
     // actualizar estilo de nodos (seleccionados vs no)
     nodeSel
-      .attr("stroke-width", d => itinerary.includes(d.idx) ? 2.8 : 1.4)
-      .attr("stroke", d => itinerary.includes(d.idx) ? "#263238" : "#ffffff")
-      .attr("opacity", d => itinerary.length ? (itinerary.includes(d.idx) ? 1.0 : 0.35) : 1.0);
+      .attr("stroke-width", d => on.has(d._order) ? 2.8 : 1.4)
+      .attr("stroke", d => on.has(d._order) ? "#263238" : "#ffffff")
+      .attr("opacity", d => itinerary.length ? (on.has(d._order) ? 1.0 : 0.35) : (d.n > 1 ? 0.85 : 1.0));
 
     // actualizar curva
     const sel = itinLayer.selectAll("path.itin")
-      .data(itinNodes.length >= 2 ? [itinNodes] : []);
+      .data(itinerary.length >= 2 ? [itinerary] : []);
 
     sel.join(
       enter => enter
@@ -453,131 +1067,221 @@ def show_click_timecurve(click_df, width: int = 900, height: int = 420):
         .attr("d", line),
       exit => exit.remove()
     );
-  }}
+  }
 
   // ----------------- Nodos -----------------
-  const nodeG = g.append("g").attr("class", "nodes");
-
-  const nodeSel = nodeG.selectAll("circle.node")
-    .data(data)
-    .join("circle")
-    .attr("class", "node")
-    .attr("cx", d => d.x)
-    .attr("cy", d => d.y)
-    .attr("r", 6)
-    .attr("fill", d => color(d.source || "other"))
-    .attr("stroke", "#ffffff")
-    .attr("stroke-width", 1.4)
-    .style("cursor", "pointer");
-
-  // tooltips sencillos con <title>
-  nodeSel.append("title")
-    .text(d => {{
-      const t = d.timestamp || "";
-      const name = d.name || d.id || "";
-      const src = d.source || "";
-      const rg = d.region || "";
-      const score = (d.SCORE != null && !isNaN(d.SCORE)) ? " · SCORE " + (+d.SCORE).toFixed(2) : "";
-      return `${{t}}\\n${{name}}${{rg ? " · " + rg : ""}}\\nsource: ${{src}}${{score}}`;
-    }});
-
-  nodeSel.on("click", (event, d) => {{
-    toggleInItinerary(d);
-    event.stopPropagation();
-  }});
+  const nodeG = plot.append("g").attr("class", "nodes");
+  let nodeSel = nodeG.selectAll("circle.node");
+
+  function render() {
+    basePath.datum(rows).attr("d", line);
+
+    nodeSel = nodeSel
+      .data(rows, d => d._order + ":" + (d.n || 1))
+      .join(enter => {
+        const c = enter.append("circle")
+          .attr("class", "node")
+          .style("cursor", "pointer")
+          .on("click", (event, d) => {
+            event.stopPropagation();
+            if (d.n > 1) zoomTo(d._lo, d._hi);
+            else toggleInItinerary(d);
+          });
+        c.append("title");
+        return c;
+      })
+      .attr("cx", d => x(+d._order))
+      .attr("cy", d => yOf(d))
+      .attr("r", radius)
+      .attr("fill", d => color(mainSource(d)));
+
+    nodeSel.select("title").text(tooltip);
+    updateItinerary();
+  }
+
+  // solo mueve lo ya dibujado (durante el gesto de zoom)
+  function reposition() {
+    basePath.attr("d", line);
+    nodeSel.attr("cx", d => x(+d._order));
+    itinLayer.selectAll("path.itin").interrupt().attr("d", line);
+  }
+
+  function setStatus(view) {
+    if (!statusBox) return;
+    const shown = rows.length;
+    const binned = rows.some(d => d.n > 1);
+    statusBox.textContent = binned
+      ? `${total} clicks · ${shown} puntos (tramos agrupados; click o zoom para ver el detalle)`
+      : `${total} clicks` + (view && view.hi - view.lo + 1 < total ? ` · #${view.lo + 1}–${view.hi + 1} a resolución completa` : "");
+  }
+
+  // ----------------- Zoom + ventana a resolución completa -----------------
+  const zoom = d3.zoom()
+    .scaleExtent([1, Math.max(1, total / 4)])
+    .extent([[0, 0], [innerWidth, innerHeight]])
+    .translateExtent([[0, 0], [innerWidth, innerHeight]])
+    .on("zoom", zoomed);
+
+  g.call(zoom).on("dblclick.zoom", null);
+
+  function zoomTo(lo, hi) {
+    const pad = Math.max(1, (hi - lo) * 0.05);
+    const a = x0(Math.max(0, lo - pad));
+    const b = x0(Math.min(total - 1, hi + pad));
+    const k = Math.min(innerWidth / Math.max(b - a, 1e-6), zoom.scaleExtent()[1]);
+    g.transition().duration(500)
+      .call(zoom.transform, d3.zoomIdentity.scale(k).translate(-a, 0));
+  }
+
+  function fetchWindow(lo, hi) {
+    if (window.google && google.colab && google.colab.kernel && google.colab.kernel.invokeFunction) {
+      return google.colab.kernel
+        .invokeFunction("ourlib.timecurve_window", [rootId, lo, hi], {})
+        .then(r => r.data["application/json"]);
+    }
+    // directo a 127.0.0.1:<port> y, si no responde, vía /proxy/<port>
+    const port = vars.port || 5000;
+    const q = vars.expand.path + "?lo=" + lo + "&hi=" + hi;
+    return fetch("http://127.0.0.1:" + port + q)
+      .catch(() => fetch("/proxy/" + port + q))
+      .then(r => (r.ok ? r.json() : null));
+  }
+
+  let timer = 0;
+  let seq = 0;
+  function zoomed(event) {
+    x = event.transform.rescaleX(x0);
+    reposition();
+    clearTimeout(timer);
+    timer = setTimeout(() => loadWindow(event.transform.k), 250);
+  }
+
+  function loadWindow(k) {
+    const mySeq = ++seq;
+    if (k <= 1.001) {
+      rows = top.rows;
+      render();
+      setStatus(top);
+      return;
+    }
+    if (!vars.expand) return;
+    const [a, b] = x.domain();
+    const lo = Math.max(0, Math.floor(a));
+    const hi = Math.min(total - 1, Math.ceil(b));
+    fetchWindow(lo, hi)
+      .then(view => {
+        if (mySeq !== seq || !view) return;  // llegó tarde: hubo otro zoom
+        // fuera de la ventana se mantienen los puntos de la vista inicial
+        const outside = top.rows.filter(
+          d => (d.n > 1 ? d._hi : d._order) < view.lo || (d.n > 1 ? d._lo : d._order) > view.hi
+        );
+        rows = outside.concat(view.rows).sort((p, q) => p._order - q._order);
+        render();
+        setStatus(view);
+      })
+      .catch(err => console.warn("ourlib: ventana de la time curve no disponible", err));
+  }
 
   // ----------------- Botón limpiar -----------------
-  if (clearBtn) {{
-    clearBtn.addEventListener("click", () => {{
+  if (clearBtn) {
+    clearBtn.addEventListener("click", () => {
       clearItinerary();
-    }});
-  }}
-
-  svg.on("click", function(event) {{
-    const target = event.target;
-    if (target.tagName.toLowerCase() === "svg") {{
-      // opcional: clearItinerary();
-    }}
-  }});
+    });
+  }
 
   // Inicializar
-  updateItinerary();
-}})();
-</script>
-"""
-    return HTML(html)
+  render();
+  setStatus(top);
+""",
+)
 
 
-
-def show_click_timecurve_from_history(width: int = 900, height: int = 420):
+def show_click_timecurve(click_df, width: int = 900, height: int = 420,
+                         max_points: int = 600, expand: bool = True):
     """
-    Atajo: toma el historial global de clicks (get_click_dataframe)
-    y dibuja la time curve sin que tengas que pasar el DataFrame a mano.
+    Visualiza el historial de clicks como una "time curve":
+
+      - Cada fila del DataFrame es un nodo.
+      - El orden inicial es por timestamp (temporal).
+      - Color de nodo según `source` (force/map/score/...).
+      - Línea suave (curva) que conecta todos los puntos en orden temporal.
+      - Itinerario manual:
+          * Click en un nodo: lo agrega/quita del itinerario.
+          * El itinerario se dibuja como otra curva más gruesa.
+          * Panel inferior con la lista ordenada del itinerario.
+          * Botón para limpiar el itinerario.
+      - Zoom horizontal (rueda/arrastre).
+
+    Con más de `max_points` clicks se manda una versión reducida con LTTB
+    sobre (orden, tiempo): cada punto grande agrupa un tramo del historial
+    (tamaño = cantidad, color = source más frecuente, tooltip con el conteo
+    por source); click en él acerca el zoom a ese tramo. Con expand=True y
+    el servidor de start_server() (o el bridge de Colab) cada zoom pide a
+    Python solo la ventana visible, a resolución completa si entra en
+    max_points.
     """
-    df = get_click_dataframe()
-    return show_click_timecurve(df, width=width, height=height)
+    if click_df is None or len(click_df) == 0:
+        return HTML("<em>No hay clicks en el historial para dibujar la time curve.</em>")
 
+    tc = _prepare_timecurve(click_df, max_points)
+    view = _timecurve_window(tc)
+    chart_id = f"timecurve-{uuid.uuid4().hex}"
 
+    expand_cfg = None
+    if expand and view["binned"]:
+        with _timecurves_lock:
+            _timecurves[chart_id] = tc
+            while len(_timecurves) > _TIMECURVE_KEEP:
+                _timecurves.popitem(last=False)
+        expand_cfg = {"path": f"/timecurve/{chart_id}"}
 
+    data_json = json.dumps(view, default=str, ensure_ascii=False)
+    return HTML(_TIMECURVE_CHART.render(chart_id, data_json, {
+        "WIDTH": width,
+        "HEIGHT": height,
+        "expand": expand_cfg,
+        "port": int(_server_port),
+    }))
 
 
 
+def show_click_timecurve_from_history(width: int = 900, height: int = 420,
+                                      max_points: int = 600, expand: bool = True,
+                                      session: str = None):
+    """
+    Atajo: toma el historial global de clicks (get_click_dataframe), o el
+    de un dashboard con `session`, y dibuja la time curve sin que tengas
+    que pasar el DataFrame a mano.
+    """
+    df = get_click_dataframe(session=session)
+    return show_click_timecurve(df, width=width, height=height,
+                                max_points=max_points, expand=expand)
 
 
-# ============================================================
-#  Main dashboard: Graph + Map + SCORE bars + Selection panel
-# ============================================================
 
 
-def show_dashboard_map_force_radar_linked(
-    nodes, links, width: int = 1200, height: int = 900, grid_cols: int = 2, grid_rows: int = 2
-):
-    """
-    Dashboard linkeado para recomendaciones de turismo:
 
-    - Graph (force) con top-3 aristas de similaridad por nodo.
-    - Map de Perú con puntos (lat, lon) y brush de selección.
-    - Panel de SCORE (barras horizontales por recomendación).
-    - Panel de Selection con la lista de recursos seleccionados.
-    - En cada click se manda un payload a Python (Colab o Flask).
 
-    Espera que cada nodo tenga al menos:
-      { "id", "name", "region", "lat", "lon", "SCORE", "want_to_go" }
 
-    Y cada enlace:
-      { "source", "target", "similarity" }.
-    """
-    dash_id = "dash-" + uuid.uuid4().hex
-    force_id = "force-" + uuid.uuid4().hex
-    map_id = "map-" + uuid.uuid4().hex
-    radar_id = "radar-" + uuid.uuid4().hex  # ahora SCORE bars
-    info_id = "info-" + uuid.uuid4().hex
 
-    data_json = json.dumps({"nodes": nodes, "links": links}, default=str)
+# ============================================================
+#  Main dashboard: Graph + Map + SCORE bars + Selection panel
+# ============================================================
 
-    # ---- Filtramos Top-3 conexiones por nodo para el Graph ----
-    filtered_links = []
-    for node in nodes:
-        nid = node.get("id")
-        outgoing = [l for l in links if l.get("source") == nid]
-        incoming = [l for l in links if l.get("target") == nid]
-        top3 = sorted(
-            outgoing + incoming,
-            key=lambda x: x.get("similarity", 0),
-            reverse=True,
-        )[:3]
-        filtered_links.extend(top3)
-
-    # Quitamos duplicados (pueden salir si la arista aparece desde source y target)
-    filtered_links = list(
-        {json.dumps(l, sort_keys=True): l for l in filtered_links}.values()
-    )
 
-    html = f"""
-<div id="{dash_id}" style="
-  width:{width}px; font-family:system-ui;
-  display:grid; grid-template-columns:repeat({grid_cols}, 1fr);
-  grid-template-rows:repeat({grid_rows}, 1fr);
+# markup + JS del dashboard linkeado (módulo estático, ver graph_templates)
+_DASHBOARD_CHART = ChartModule(
+    "linked_dashboard",
+    markup="""
+<div id="[CHART_ID]">
+<div id="[CHART_ID]-ctrl" style="
+  width:[WIDTH]px; font-family:system-ui; font-size:12px;
+  display:[CTRL_DISPLAY]; flex-wrap:wrap; gap:18px; align-items:center;
+  margin-bottom:10px;"></div>
+<div id="[CHART_ID]-grid" style="
+  width:[WIDTH]px; font-family:system-ui;
+  display:grid; grid-template-columns:repeat([GRID_COLS], 1fr);
+  grid-template-rows:repeat([GRID_ROWS], 1fr);
   gap:18px; align-items:start;">
 
   <!-- Graph -->
@@ -589,13 +1293,13 @@ def show_dashboard_map_force_radar_linked(
         <span style="display:inline-block; width:30px; height:5px; background:linear-gradient(to right, #f7fbff, #08306b); border:1px solid #ccc; vertical-align:middle;"></span>
       Más)</span>
     </div>
-    <div id="{force_id}" style="width:100%; height:450px; border:1px solid #ccc;"></div>
+    <div id="[CHART_ID]-force" style="width:100%; height:450px; border:1px solid #ccc;"></div>
   </div>
 
   <!-- Map -->
   <div style="border:3px solid #2e7d32; border-radius:12px; padding:10px; min-height:450px;">
     <h3 style="margin:0 0 6px;">Map</h3>
-    <div id="{map_id}" style="width:100%; height:450px; border:1px solid #ccc;"></div>
+    <div id="[CHART_ID]-map" style="width:100%; height:450px; border:1px solid #ccc;"></div>
     <div style="display:flex; gap:15px; margin-top:10px; font-size:12px;">
       <span><span style="color:#fbc02d; font-size:1.2em; -webkit-text-stroke: 1px #ccc;">●</span> Costa</span>
       <span><span style="color:#8D6E63; font-size:1.2em; -webkit-text-stroke: 1px #ccc;">●</span> Sierra</span>
@@ -606,7 +1310,7 @@ def show_dashboard_map_force_radar_linked(
   <!-- SCORE bars -->
   <div style="border:3px solid #1976d2; border-radius:12px; padding:10px; min-height:420px;">
     <h3 style="margin:0 0 6px;">Ranking · SCORE</h3>
-    <div id="{radar_id}" style="width:100%; height:420px; border:1px solid #ccc;"></div>
+    <div id="[CHART_ID]-radar" style="width:100%; height:420px; border:1px solid #ccc;"></div>
     <div style="margin-top:10px;">
       <p style="font-size:12px;">
         Barra horizontal = <strong>SCORE</strong> de recomendación ·
@@ -618,316 +1322,507 @@ def show_dashboard_map_force_radar_linked(
   <!-- Selection -->
   <div style="border:3px solid #7b1fa2; border-radius:12px; padding:10px; min-height:420px;">
     <h3 style="margin:0 0 6px;">Selection</h3>
-    <div id="{info_id}" style="min-height:420px; background:#f8f9fa; padding:10px; overflow:auto;">
+    <div id="[CHART_ID]-info" style="min-height:420px; background:#f8f9fa; padding:10px; overflow:auto;">
       <em>Haz click en el Graph, en las barras de SCORE o usa el brush en el mapa…</em>
     </div>
   </div>
 </div>
+</div>
+""",
+    script=PERU_GEOMETRY_JS + """
+  const raw = payload;
+  const RENDERER = vars.renderer;
+  const CANVAS_LABEL_MAX = 150;  // en canvas, etiquetas fijas solo en grafos chicos
+  const LIVE = vars.live;  // live=True: {path, seq} del canal de actualizaciones
+  const RERANK = vars.rerank;  // sliders de re-ranking: {topk, params, geo_anchor, rg_available}
+
+  window.__ourlibColumnar.load(raw).then(run).catch(err => {
+    console.warn("ourlib: no se pudo decodificar el payload", err);
+    const box = document.getElementById(rootId + "-info");
+    if (box) box.innerHTML = "<em>Error cargando datos del dashboard: " + err + "</em>";
+  });
+
+  function run(data) {
+    // d3.forceLink reemplaza source/target por objetos: copiamos los enlaces
+    let filteredLinks = (data.top || []).map(i => Object.assign({}, data.links[i]));
+
+    // =================== JS → Python bridge ====================
+    // el puerto puede cambiar entre salidas (start_server(port=...));
+    // los clicks llevan __session = rootId (= html.dash_id)
+    window.__ourlibPort = vars.port;
+    const _sendToPython = window.__ourlibBridge.sender(rootId);
+    const sendToPython = _sendToPython;
+    window.sendToPython = _sendToPython;
+
+    // =================== Estado compartido =====================
+    const bus   = new EventTarget();
+    const state = { selected: [] };  // array para preservar orden
+    let byId    = new Map((data.nodes || []).map(d => [String(d.id), d]));
+    const panels = [];  // update() de cada panel, se llaman tras aplicar un diff
+
+    // Región → Costa/Sierra/Selva
+    const zoneMap = {
+      // Costa
+      "LIMA":       { zone: "Costa",  scale: d3.scaleSequential(d3.interpolateRgb("#fff9c4", "#fbc02d")).domain([0,1]) },
+      "ICA":        { zone: "Costa",  scale: d3.scaleSequential(d3.interpolateRgb("#fff9c4", "#fbc02d")).domain([0,1]) },
+      "LALIBERTAD": { zone: "Costa",  scale: d3.scaleSequential(d3.interpolateRgb("#fff9c4", "#fbc02d")).domain([0,1]) },
+      "LAMBAYEQUE": { zone: "Costa",  scale: d3.scaleSequential(d3.interpolateRgb("#fff9c4", "#fbc02d")).domain([0,1]) },
+      "PIURA":      { zone: "Costa",  scale: d3.scaleSequential(d3.interpolateRgb("#fff9c4", "#fbc02d")).domain([0,1]) },
+      // Sierra
+      "ANCASH":     { zone: "Sierra", scale: d3.scaleSequential(d3.interpolateRgb("#d7ccc8", "#8D6E63")).domain([0,1]) },
+      "AREQUIPA":   { zone: "Sierra", scale: d3.scaleSequential(d3.interpolateRgb("#d7ccc8", "#8D6E63")).domain([0,1]) },
+      "PUNO":       { zone: "Sierra", scale: d3.scaleSequential(d3.interpolateRgb("#d7ccc8", "#8D6E63")).domain([0,1]) },
+      "CUSCO":      { zone: "Sierra", scale: d3.scaleSequential(d3.interpolateRgb("#d7ccc8", "#8D6E63")).domain([0,1]) },
+      // Selva
+      "LORETO":       { zone: "Selva", scale: d3.scaleSequential(d3.interpolateRgb("#c8e6c9", "#4CAF50")).domain([0,1]) },
+      "AMAZONAS":     { zone: "Selva", scale: d3.scaleSequential(d3.interpolateRgb("#c8e6c9", "#4CAF50")).domain([0,1]) },
+      "MADREDEDIOS":  { zone: "Selva", scale: d3.scaleSequential(d3.interpolateRgb("#c8e6c9", "#4CAF50")).domain([0,1]) },
+      // Fallback
+      "DEFAULT":    { zone: "Other", scale: d3.scaleSequential(d3.interpolateGreys).domain([0,1]) }
+    };
+
+    function getNodeColor(d) {
+      const mapping = zoneMap[d.region] || zoneMap["DEFAULT"];
+      const val = (+d.want_to_go - 4) / 5;  // normaliza (4–9) a (0–1)
+      return mapping.scale(isFinite(val) ? val : 0.5);
+    }
+
+    const radarColors = d3.scaleOrdinal(d3.schemeCategory10);
+
+    function setSelection(ids, src) {
+      const unique = [];
+      const seen = new Set();
+      ids.map(String).forEach(id => {
+        if (!seen.has(id)) {
+          seen.add(id);
+          unique.push(id);
+        }
+      });
+      state.selected = unique;
+      bus.dispatchEvent(new CustomEvent("selection", { detail: { ids: state.selected, src } }));
+    }
+
+    function toggleOne(id, src) {
+      const sid = String(id);
+      const current = state.selected.slice();
+      const idx = current.indexOf(sid);
+      if (idx > -1) {
+        current.splice(idx, 1);
+      } else {
+        current.push(sid);
+      }
+      setSelection(current, src);
+    }
+
+    // =================== Panel Selection =======================
+    function renderInfo(ids) {
+      const box = document.getElementById(rootId + "-info");
+      if (!ids.length) {
+        box.innerHTML = "<em>Sin selección</em>";
+        return;
+      }
+      const items = ids.map(id => byId.get(String(id))).filter(Boolean);
+      const lis = items.map(n => {
+        const nm = n.name || n.id;
+        const reg = n.region || "";
+        const color = radarColors(n.id);
+        const swatch = `<span style="color:${color}; font-size:1.2em; -webkit-text-stroke: 1px #ccc;">●</span> `;
+        const link = n.url
+          ? `<a href="${n.url}" target="_blank" rel="noopener noreferrer">${nm}</a>`
+          : nm;
+        return `<li>${swatch}<strong>${link}</strong>${reg ? " · " + reg : ""}</li>`;
+      }).join("");
+      box.innerHTML = `<p><strong>${ids.length}</strong> seleccionado(s):</p><ul>${lis}</ul>`;
+    }
+
+    bus.addEventListener("selection", e => {
+      renderInfo(e.detail.ids);
+    });
+
+    // =================== Canvas helpers ========================
+    // renderer="canvas": un <canvas> por panel, hit-testing con d3.quadtree
+    function makeCanvas(host, W, H) {
+      const dpr = window.devicePixelRatio || 1;
+      const canvas = d3.select(host).append("canvas")
+        .attr("width", Math.round(W * dpr))
+        .attr("height", Math.round(H * dpr))
+        .style("width", W + "px")
+        .style("height", H + "px")
+        .style("display", "block")
+        .node();
+      const ctx = canvas.getContext("2d");
+      ctx.scale(dpr, dpr);
+      return { canvas, ctx };
+    }
+
+    // redibujo agrupado en un solo frame
+    function frameScheduler(draw) {
+      let frame = 0;
+      return () => {
+        if (!frame) frame = requestAnimationFrame(() => { frame = 0; draw(); });
+      };
+    }
+
+    function drawLabel(ctx, text, x, y, size) {
+      ctx.font = `${size}px system-ui`;
+      ctx.lineJoin = "round";
+      ctx.lineWidth = 3;
+      ctx.strokeStyle = "white";
+      ctx.strokeText(text, x, y);
+      ctx.fillStyle = "#222";
+      ctx.fillText(text, x, y);
+    }
+
+    // =================== FORCE graph ===========================
+    (function initForce() {
+      const host = document.getElementById(rootId + "-force");
+      const W = host.clientWidth;
+      const H = 450;
+
+      const linkWidth = d3.scaleLinear().range([1, 4]);
+      const linkColor = d3.scaleSequential(d3.interpolateBlues);
+      function rescale() {
+        const simExtent = d3.extent(filteredLinks, d => +d.similarity || 0);
+        linkWidth.domain(simExtent);
+        linkColor.domain(simExtent);
+      }
+      rescale();
+
+      let simNodes = data.nodes.map(d => Object.assign({}, d));
+      // layout="python": posiciones fijas en [0, 1], sin simulación
+      const fixed = simNodes.length > 0 && simNodes.every(d => Number.isFinite(d.px));
+      let sim = null;
+
+      function place() {
+        const nodeById = new Map(simNodes.map(d => [String(d.id), d]));
+        simNodes.forEach(d => {
+          d.x = 20 + d.px * (W - 40);
+          d.y = 20 + d.py * (H - 40);
+        });
+        filteredLinks.forEach(l => {
+          l.source = nodeById.get(String(l.source));
+          l.target = nodeById.get(String(l.target));
+        });
+        filteredLinks = filteredLinks.filter(l => l.source && l.target);
+      }
+
+      if (fixed) {
+        place();
+      } else {
+        sim = d3.forceSimulation(simNodes)
+          .force("link", d3.forceLink(filteredLinks).id(d => String(d.id)).distance(70))
+          .force("charge", d3.forceManyBody().strength(-200))
+          .force("center", d3.forceCenter(W / 2, H / 2));
+      }
+
+      // diff aplicado: los nodos que siguen conservan posición y velocidad,
+      // los nuevos entran cerca del centro y la simulación solo se recalienta
+      function merge() {
+        const prev = new Map(simNodes.map(d => [String(d.id), d]));
+        simNodes = data.nodes.map(d => {
+          const old = prev.get(String(d.id));
+          if (old) return Object.assign(old, d);
+          return Object.assign({
+            x: W / 2 + (Math.random() - 0.5) * 40,
+            y: H / 2 + (Math.random() - 0.5) * 40
+          }, d);
+        });
+        rescale();
+        if (fixed) {
+          place();
+        } else {
+          sim.nodes(simNodes);
+          sim.force("link").links(filteredLinks);
+          sim.alpha(0.5).restart();
+        }
+      }
 
-<script src="https://cdn.jsdelivr.net/npm/d3@7"></script>
-<script src="https://cdn.jsdelivr.net/npm/topojson-client@3"></script>
-
-<script>
-(function() {{
-  const data = {data_json};
-  const filteredLinks = {json.dumps(filtered_links, default=str)};
-
-  // =================== JS → Python bridge ====================
-  function _sendToPython(payload) {{
-    try {{
-      const inColab = !!(window.google && google.colab && google.colab.kernel && google.colab.kernel.invokeFunction);
-      if (inColab) {{
-        google.colab.kernel.invokeFunction('ourlib.update_node', [payload], {{}})
-          .catch(err => console.warn('Colab bridge error:', err));
-      }} else {{
-        const body = JSON.stringify({{ node: payload }});
-        fetch('http://127.0.0.1:5000/update_node', {{
-          method: 'POST',
-          headers: {{ 'Content-Type': 'application/json' }},
-          body
-        }}).catch(() => {{
-          fetch('/proxy/5000/update_node', {{
-            method: 'POST',
-            headers: {{ 'Content-Type': 'application/json' }},
-            body
-          }}).catch(err => console.warn('Fetch bridge failed:', err));
-        }});
-      }}
-    }} catch(e) {{
-      console.warn('sendToPython failed:', e);
-    }}
-  }}
-  const sendToPython = _sendToPython;
-  window.sendToPython = _sendToPython;
-
-  // =================== Estado compartido =====================
-  const bus   = new EventTarget();
-  const state = {{ selected: [] }};  // array para preservar orden
-  const byId  = new Map((data.nodes || []).map(d => [String(d.id), d]));
-
-  // Región → Costa/Sierra/Selva
-  const zoneMap = {{
-    // Costa
-    "LIMA":       {{ zone: "Costa",  scale: d3.scaleSequential(d3.interpolateRgb("#fff9c4", "#fbc02d")).domain([0,1]) }},
-    "ICA":        {{ zone: "Costa",  scale: d3.scaleSequential(d3.interpolateRgb("#fff9c4", "#fbc02d")).domain([0,1]) }},
-    "LALIBERTAD": {{ zone: "Costa",  scale: d3.scaleSequential(d3.interpolateRgb("#fff9c4", "#fbc02d")).domain([0,1]) }},
-    "LAMBAYEQUE": {{ zone: "Costa",  scale: d3.scaleSequential(d3.interpolateRgb("#fff9c4", "#fbc02d")).domain([0,1]) }},
-    "PIURA":      {{ zone: "Costa",  scale: d3.scaleSequential(d3.interpolateRgb("#fff9c4", "#fbc02d")).domain([0,1]) }},
-    // Sierra
-    "ANCASH":     {{ zone: "Sierra", scale: d3.scaleSequential(d3.interpolateRgb("#d7ccc8", "#8D6E63")).domain([0,1]) }},
-    "AREQUIPA":   {{ zone: "Sierra", scale: d3.scaleSequential(d3.interpolateRgb("#d7ccc8", "#8D6E63")).domain([0,1]) }},
-    "PUNO":       {{ zone: "Sierra", scale: d3.scaleSequential(d3.interpolateRgb("#d7ccc8", "#8D6E63")).domain([0,1]) }},
-    "CUSCO":      {{ zone: "Sierra", scale: d3.scaleSequential(d3.interpolateRgb("#d7ccc8", "#8D6E63")).domain([0,1]) }},
-    // Selva
-    "LORETO":       {{ zone: "Selva", scale: d3.scaleSequential(d3.interpolateRgb("#c8e6c9", "#4CAF50")).domain([0,1]) }},
-    "AMAZONAS":     {{ zone: "Selva", scale: d3.scaleSequential(d3.interpolateRgb("#c8e6c9", "#4CAF50")).domain([0,1]) }},
-    "MADREDEDIOS":  {{ zone: "Selva", scale: d3.scaleSequential(d3.interpolateRgb("#c8e6c9", "#4CAF50")).domain([0,1]) }},
-    // Fallback
-    "DEFAULT":    {{ zone: "Other", scale: d3.scaleSequential(d3.interpolateGreys).domain([0,1]) }}
-  }};
-
-  function getNodeColor(d) {{
-    const mapping = zoneMap[d.region] || zoneMap["DEFAULT"];
-    const val = (+d.want_to_go - 4) / 5;  // normaliza (4–9) a (0–1)
-    return mapping.scale(isFinite(val) ? val : 0.5);
-  }}
-
-  const radarColors = d3.scaleOrdinal(d3.schemeCategory10);
-
-  function setSelection(ids, src) {{
-    const unique = [];
-    const seen = new Set();
-    ids.map(String).forEach(id => {{
-      if (!seen.has(id)) {{
-        seen.add(id);
-        unique.push(id);
-      }}
-    }});
-    state.selected = unique;
-    bus.dispatchEvent(new CustomEvent("selection", {{ detail: {{ ids: state.selected, src }} }}));
-  }}
-
-  function toggleOne(id, src) {{
-    const sid = String(id);
-    const current = state.selected.slice();
-    const idx = current.indexOf(sid);
-    if (idx > -1) {{
-      current.splice(idx, 1);
-    }} else {{
-      current.push(sid);
-    }}
-    setSelection(current, src);
-  }}
-
-  // =================== Panel Selection =======================
-  function renderInfo(ids) {{
-    const box = document.getElementById("{info_id}");
-    if (!ids.length) {{
-      box.innerHTML = "<em>Sin selección</em>";
-      return;
-    }}
-    const items = ids.map(id => byId.get(String(id))).filter(Boolean);
-    const lis = items.map(n => {{
-      const nm = n.name || n.id;
-      const reg = n.region || "";
-      const color = radarColors(n.id);
-      const swatch = `<span style="color:${{color}}; font-size:1.2em; -webkit-text-stroke: 1px #ccc;">●</span> `;
-      const link = n.url
-        ? `<a href="${{n.url}}" target="_blank" rel="noopener noreferrer">${{nm}}</a>`
-        : nm;
-      return `<li>${{swatch}}<strong>${{link}}</strong>${{reg ? " · " + reg : ""}}</li>`;
-    }}).join("");
-    box.innerHTML = `<p><strong>${{ids.length}}</strong> seleccionado(s):</p><ul>${{lis}}</ul>`;
-  }}
-
-  bus.addEventListener("selection", e => {{
-    renderInfo(e.detail.ids);
-  }});
-
-  // =================== FORCE graph ===========================
-  (function initForce() {{
-    const host = document.getElementById("{force_id}");
-    const W = host.clientWidth;
-    const H = 450;
-    const svg = d3.select(host).append("svg").attr("width", W).attr("height", H);
-    const g   = svg.append("g");
-
-    const simExtent = d3.extent(filteredLinks, d => +d.similarity || 0);
-    const linkWidth = d3.scaleLinear().domain(simExtent).range([1, 4]);
-    const linkColor = d3.scaleSequential(d3.interpolateBlues).domain(simExtent);
-
-    const simNodes = data.nodes.map(d => Object.assign({{}}, d));
-    const sim = d3.forceSimulation(simNodes)
-      .force("link", d3.forceLink(filteredLinks).id(d => String(d.id)).distance(70))
-      .force("charge", d3.forceManyBody().strength(-200))
-      .force("center", d3.forceCenter(W / 2, H / 2));
-
-    const link = g.append("g")
-      .attr("stroke-opacity", 0.4)
-      .selectAll("line")
-      .data(filteredLinks)
-      .join("line")
-      .attr("stroke-width", d => linkWidth(+d.similarity || 0))
-      .attr("stroke", d => linkColor(+d.similarity || 0));
-
-    link.append("title").text(d => `Similaridad: ${{(+d.similarity || 0).toFixed(2)}}`);
-
-    const nodeG = g.append("g")
-      .selectAll("g")
-      .data(sim.nodes())
-      .join("g")
-      .style("cursor", "pointer");
-
-    nodeG.append("circle")
-      .attr("r", 8)
-      .attr("fill", d => getNodeColor(d))
-      .attr("stroke", "#fff")
-      .attr("stroke-width", 2)
-      .call(
-        d3.drag()
-          .on("start", (event, d) => {{
+      let ticked = () => {};
+
+      // event.subject: el nodo (datum en SVG, quadtree en canvas)
+      function dragNodes() {
+        return d3.drag()
+          .on("start", event => {
+            const d = event.subject;
+            if (!sim) return;
             if (!event.active) sim.alphaTarget(0.3).restart();
             d.fx = d.x;
             d.fy = d.y;
-          }})
-          .on("drag", (event, d) => {{
+          })
+          .on("drag", event => {
+            const d = event.subject;
+            if (!sim) {
+              d.x = event.x;
+              d.y = event.y;
+              ticked();
+              return;
+            }
             d.fx = event.x;
             d.fy = event.y;
-          }})
-          .on("end", (event, d) => {{
+          })
+          .on("end", event => {
+            const d = event.subject;
+            if (!sim) return;
             if (!event.active) sim.alphaTarget(0);
             d.fx = null;
             d.fy = null;
-          }})
-      )
+          });
+      }
 
-      .on("click", (event, d) => {{
-        if (event.metaKey || event.ctrlKey) {{
+      function nodeClick(event, d) {
+        if (event.metaKey || event.ctrlKey) {
           toggleOne(d.id, "force");
-        }} else {{
+        } else {
           setSelection([d.id], "force");
-        }}
-          const clickData = {{
-            id: d.id,
-            name: d.name,
-            region: d.region,
-            SCORE: d.SCORE,
-            lat: d.lat,
-            lon: d.lon,
-            __ts: new Date().toISOString(),
-            __src: "force",
-            __chart: "graph"
-          }};
-
-        
+        }
+        const clickData = {
+          id: d.id,
+          name: d.name,
+          region: d.region,
+          SCORE: d.SCORE,
+          lat: d.lat,
+          lon: d.lon,
+          __ts: new Date().toISOString(),
+          __src: "force",
+          __chart: "graph"
+        };
         sendToPython(clickData);
         event.stopPropagation();
-      }});
-
-    nodeG.append("text")
-      .attr("x", 12)
-      .attr("y", 4)
-      .attr("font-size", "11px")
-      .attr("fill", "#222")
-      .style("paint-order", "stroke")
-      .style("stroke", "white")
-      .style("stroke-width", "3px")
-      .text(d => d.name || d.id);
-
-    sim.on("tick", () => {{
-      link
-        .attr("x1", d => d.source.x)
-        .attr("y1", d => d.source.y)
-        .attr("x2", d => d.target.x)
-        .attr("y2", d => d.target.y);
-
-      nodeG.attr("transform", d => `translate(${{d.x}},${{d.y}})`);
-    }});
-
-    bus.addEventListener("selection", e => {{
-      const sel = new Set(e.detail.ids);
-      const has = sel.size > 0;
-
-      nodeG.select("circle")
-        .attr("opacity", d => !has || sel.has(String(d.id)) ? 1.0 : 0.25)
-        .attr("stroke",  d => sel.has(String(d.id)) ? "#d32f2f" : "#fff")
-        .attr("stroke-width", d => sel.has(String(d.id)) ? 3 : 2);
-
-      link
-        .attr("stroke-opacity", d => {{
-          if (!has) return 0.25;
-          const s = String(d.source.id || d.source);
-          const t = String(d.target.id || d.target);
-          return sel.has(s) || sel.has(t) ? 0.6 : 0.08;
-        }})
-        .attr("stroke-width", d => {{
-          const base = linkWidth(+d.similarity || 0);
-          if (!has) return base;
-          const s = String(d.source.id || d.source);
-          const t = String(d.target.id || d.target);
-          return sel.has(s) || sel.has(t) ? base * 1.5 : base;
-        }});
-    }});
-  }})();
-
-  // =================== Mapa de Perú ==========================
-  (function initMap() {{
-    const host = document.getElementById("{map_id}");
-    const W = host.clientWidth;
-    const H = 450;
-    const svg = d3.select(host).append("svg").attr("width", W).attr("height", H);
-    const gMap = svg.append("g");
-
-    d3.json("https://cdn.jsdelivr.net/npm/world-atlas@2/countries-110m.json").then(world => {{
-      const countries = topojson.feature(world, world.objects.countries);
-      const peru =
-        countries.features.find(f => f.id === "604") ||
-        countries.features.find(f => (f.properties && f.properties.name === "Peru"));
-
-      const proj = d3.geoMercator().fitExtent([[20, 20], [W - 20, H - 20]], peru);
-      const path = d3.geoPath(proj);
+      }
+
+      if (RENDERER === "canvas") {
+        const { canvas, ctx } = makeCanvas(host, W, H);
+        let showLabels = true;
+        let sel = new Set();
+        let hover = null;
+        let tree = null;
+
+        function prepare() {
+          showLabels = simNodes.length <= CANVAS_LABEL_MAX;
+          simNodes.forEach(d => { d.__color = getNodeColor(d); });
+          tree = null;
+        }
+        prepare();
+
+        function draw() {
+          const has = sel.size > 0;
+          ctx.clearRect(0, 0, W, H);
+          for (const l of filteredLinks) {
+            const on = sel.has(String(l.source.id)) || sel.has(String(l.target.id));
+            const base = linkWidth(+l.similarity || 0);
+            ctx.globalAlpha = !has ? 0.4 : (on ? 0.6 : 0.08);
+            ctx.strokeStyle = linkColor(+l.similarity || 0);
+            ctx.lineWidth = has && on ? base * 1.5 : base;
+            ctx.beginPath();
+            ctx.moveTo(l.source.x, l.source.y);
+            ctx.lineTo(l.target.x, l.target.y);
+            ctx.stroke();
+          }
+          for (const d of simNodes) {
+            const on = sel.has(String(d.id));
+            ctx.globalAlpha = !has || on ? 1.0 : 0.25;
+            ctx.beginPath();
+            ctx.arc(d.x, d.y, 8, 0, 2 * Math.PI);
+            ctx.fillStyle = d.__color;
+            ctx.fill();
+            ctx.lineWidth = on ? 3 : 2;
+            ctx.strokeStyle = on ? "#d32f2f" : (d === hover ? "#333" : "#fff");
+            ctx.stroke();
+          }
+          ctx.globalAlpha = 1.0;
+          for (const d of simNodes) {
+            if (showLabels || d === hover || sel.has(String(d.id))) {
+              drawLabel(ctx, d.name || d.id, d.x + 12, d.y + 4, 11);
+            }
+          }
+        }
 
-      const lineGen = d3.line()
-        .x(d => proj([+d.lon, +d.lat])[0])
-        .y(d => proj([+d.lon, +d.lat])[1]);
+        const schedule = frameScheduler(draw);
+        ticked = () => { tree = null; schedule(); };
 
-      // Fondo
-      gMap.append("path")
-        .datum(peru)
-        .attr("d", path)
-        .attr("fill", "#f3f6ff")
-        .attr("stroke", "#9db2ff")
-        .attr("stroke-width", 1.0);
+        function findNode(x, y) {
+          if (!tree) tree = d3.quadtree(simNodes, d => d.x, d => d.y);
+          return tree.find(x, y, 10) || null;
+        }
 
-      // Ruta
-      const routePath = gMap.append("path")
-        .attr("fill", "none")
-        .attr("stroke", "#d32f2f")
-        .attr("stroke-width", 2.5)
-        .attr("stroke-dasharray", "5 5")
-        .style("pointer-events", "none");
+        d3.select(canvas)
+          .call(dragNodes().container(canvas).subject(event => findNode(event.x, event.y)))
+          .on("click", event => {
+            const [x, y] = d3.pointer(event, canvas);
+            const d = findNode(x, y);
+            if (d) nodeClick(event, d);
+          })
+          .on("mousemove", event => {
+            const [x, y] = d3.pointer(event, canvas);
+            const d = findNode(x, y);
+            if (d === hover) return;
+            hover = d;
+            canvas.style.cursor = d ? "pointer" : "default";
+            canvas.title = d ? (d.name || d.id) : "";
+            schedule();
+          })
+          .on("mouseleave", () => {
+            hover = null;
+            schedule();
+          });
+
+        if (sim) sim.on("tick", ticked);
+        else draw();
+
+        panels.push(() => {
+          merge();
+          hover = null;
+          prepare();
+          schedule();
+        });
+
+        bus.addEventListener("selection", e => {
+          sel = new Set(e.detail.ids);
+          schedule();
+        });
+        return;
+      }
+
+      const svg = d3.select(host).append("svg").attr("width", W).attr("height", H);
+      const g   = svg.append("g");
+      const linkLayer = g.append("g").attr("stroke-opacity", 0.4);
+      const nodeLayer = g.append("g");
+      let link = linkLayer.selectAll("line");
+      let nodeG = nodeLayer.selectAll("g");
+
+      // join por id: en una actualización solo se crean/quitan los nodos del diff
+      function render() {
+        link = link
+          .data(filteredLinks)
+          .join(enter => enter.append("line").call(l => l.append("title")))
+          .attr("stroke-width", d => linkWidth(+d.similarity || 0))
+          .attr("stroke", d => linkColor(+d.similarity || 0));
+
+        link.select("title").text(d => `Similaridad: ${(+d.similarity || 0).toFixed(2)}`);
+
+        nodeG = nodeG
+          .data(simNodes, d => String(d.id))
+          .join(enter => {
+            const ng = enter.append("g").style("cursor", "pointer");
+
+            ng.append("circle")
+              .attr("r", 8)
+              .attr("stroke", "#fff")
+              .attr("stroke-width", 2)
+              .call(dragNodes())
+              .on("click", nodeClick);
+
+            ng.append("text")
+              .attr("x", 12)
+              .attr("y", 4)
+              .attr("font-size", "11px")
+              .attr("fill", "#222")
+              .style("paint-order", "stroke")
+              .style("stroke", "white")
+              .style("stroke-width", "3px");
+            return ng;
+          });
+
+        nodeG.select("circle").attr("fill", d => getNodeColor(d));
+        nodeG.select("text").text(d => d.name || d.id);
+      }
+
+      ticked = () => {
+        link
+          .attr("x1", d => d.source.x)
+          .attr("y1", d => d.source.y)
+          .attr("x2", d => d.target.x)
+          .attr("y2", d => d.target.y);
+
+        nodeG.attr("transform", d => `translate(${d.x},${d.y})`);
+      };
+
+      render();
+      if (sim) sim.on("tick", ticked);
+      else ticked();
+
+      panels.push(() => {
+        merge();
+        render();
+        ticked();
+      });
+
+      bus.addEventListener("selection", e => {
+        const sel = new Set(e.detail.ids);
+        const has = sel.size > 0;
 
-      const pts = data.nodes.filter(
-        d => Number.isFinite(+d.lat) && Number.isFinite(+d.lon)
-      );
+        nodeG.select("circle")
+          .attr("opacity", d => !has || sel.has(String(d.id)) ? 1.0 : 0.25)
+          .attr("stroke",  d => sel.has(String(d.id)) ? "#d32f2f" : "#fff")
+          .attr("stroke-width", d => sel.has(String(d.id)) ? 3 : 2);
+
+        link
+          .attr("stroke-opacity", d => {
+            if (!has) return 0.25;
+            const s = String(d.source.id || d.source);
+            const t = String(d.target.id || d.target);
+            return sel.has(s) || sel.has(t) ? 0.6 : 0.08;
+          })
+          .attr("stroke-width", d => {
+            const base = linkWidth(+d.similarity || 0);
+            if (!has) return base;
+            const s = String(d.source.id || d.source);
+            const t = String(d.target.id || d.target);
+            return sel.has(s) || sel.has(t) ? base * 1.5 : base;
+          });
+      });
+    })();
+
+    // =================== Mapa de Perú ==========================
+    (function initMap() {
+      const host = document.getElementById(rootId + "-map");
+      const W = host.clientWidth;
+      const H = 450;
+      const canvasMode = RENDERER === "canvas";
+      let canvas = null, ctx = null;
+      if (canvasMode) {
+        // canvas para fondo + puntos; el SVG encima solo lleva el brush
+        d3.select(host).style("position", "relative");
+        ({ canvas, ctx } = makeCanvas(host, W, H));
+      }
+      const svg = d3.select(host).append("svg").attr("width", W).attr("height", H);
+      if (canvasMode) svg.style("position", "absolute").style("left", 0).style("top", 0);
+      const gMap = svg.append("g");
+
+      // la geometría llega async: un diff anterior ya está en data.nodes
+      let refresh = null;
+      panels.push(() => { if (refresh) refresh(); });
+
+      // geometría vendorizada o world-atlas descargado una sola vez por documento
+      ourlibPeruGeometry().then(peru => {
+        const proj = d3.geoMercator().fitExtent([[20, 20], [W - 20, H - 20]], peru);
+        const path = d3.geoPath(proj);
+
+        // puntos proyectados una sola vez (por versión de los datos) +
+        // índice espacial para brush/hover
+        let pts = [], mpts = [], tree = null;
+        function project() {
+          pts = data.nodes.filter(
+            d => Number.isFinite(+d.lat) && Number.isFinite(+d.lon)
+          );
+          mpts = pts.map((d, i) => {
+            const p = proj([+d.lon, +d.lat]);
+            return { d, i, x: p[0], y: p[1] };
+          });
+          tree = d3.quadtree(mpts, p => p.x, p => p.y);
+        }
+        project();
 
-      const nodeG = gMap.append("g")
-        .selectAll("g")
-        .data(pts, d => d.id)
-        .join("g")
-        .attr("transform", d => `translate(${{proj([+d.lon, +d.lat])[0]}},${{proj([+d.lon, +d.lat])[1]}})`)
-        .style("cursor", "pointer")
-        
-        .on("click", (event, d) => {{
-          if (event.metaKey || event.ctrlKey) {{
+        function pointClick(event, d) {
+          if (event.metaKey || event.ctrlKey) {
             toggleOne(d.id, "map-click");
-          }} else {{
+          } else {
             setSelection([d.id], "map-click");
-          }}
+          }
 
-          const clickData = {{
+          const clickData = {
             id: d.id,
-            name: d.name, 
+            name: d.name,
             region: d.region,
             SCORE: d.SCORE,
             lat: d.lat,
@@ -935,210 +1830,1221 @@ def show_dashboard_map_force_radar_linked(
             __ts: new Date().toISOString(),
             __src: "map",
             __chart: "map"
-          }};
+          };
 
           sendToPython(clickData);
           event.stopPropagation();
-        }});
-
-      nodeG.append("circle")
-        .attr("r", 6)
-        .attr("fill", d => getNodeColor(d))
-        .attr("stroke", "#fff")
-        .attr("stroke-width", 1.5);
-
-      nodeG.append("text")
-        .attr("x", 9)
-        .attr("y", 4)
-        .attr("font-size", "10px")
-        .attr("fill", "#222")
-        .style("paint-order", "stroke")
-        .style("stroke", "white")
-        .style("stroke-width", "3px")
-        .style("display", "none")
-        .text(d => d.name || d.id);
-
-      nodeG.append("title").text(d => d.name || d.id);
-
-      const brush = d3.brush()
-        .extent([[0, 0], [W, H]])
-        .on("brush end", event => {{
-          const sel = event.selection;
-          if (!sel) {{
+        }
+
+        // ids dentro del rectángulo, en el orden original de los nodos
+        function idsInRect(x0, y0, x1, y1) {
+          const hits = [];
+          tree.visit((node, nx0, ny0, nx1, ny1) => {
+            if (!node.length) {
+              do {
+                const p = node.data;
+                if (x0 <= p.x && p.x <= x1 && y0 <= p.y && p.y <= y1) hits.push(p);
+              } while ((node = node.next));
+            }
+            return nx0 > x1 || ny0 > y1 || nx1 < x0 || ny1 < y0;
+          });
+          hits.sort((a, b) => a.i - b.i);
+          return hits.map(p => String(p.d.id));
+        }
+
+        // durante el arrastre: como mucho una selección por frame;
+        // a Python solo se manda la selección final ("end")
+        let pendingSel = null;
+        let brushFrame = 0;
+        function brushed(event) {
+          if (event.type === "end") {
+            if (brushFrame) cancelAnimationFrame(brushFrame);
+            brushFrame = 0;
+            applyBrush(event.selection, true);
+            return;
+          }
+          pendingSel = event.selection;
+          if (!brushFrame) {
+            brushFrame = requestAnimationFrame(() => {
+              brushFrame = 0;
+              applyBrush(pendingSel, false);
+            });
+          }
+        }
+
+        function applyBrush(sel, final) {
+          if (!sel) {
             setSelection([], "map-brush");
             return;
-          }}
+          }
           const [[x0, y0], [x1, y1]] = sel;
-          const ids = pts
-            .filter(d => {{
-              const p = proj([+d.lon, +d.lat]);
-              return x0 <= p[0] && p[0] <= x1 && y0 <= p[1] && p[1] <= y1;
-            }})
-            .map(d => String(d.id));
-
-            if (event.type === "end" && ids.length > 0) {{
-                  const brushData = {{
-                    __ts: new Date().toISOString(),
-                    __src: "map", 
-                    __chart: "map",
-                    __interaction: "brush",
-                    selected_ids: ids,
-                    selected_count: ids.length
-                  }};
-                  sendToPython(brushData);
-                }}
-
+          const ids = idsInRect(x0, y0, x1, y1);
+
+          if (final && ids.length > 0) {
+            const brushData = {
+              __ts: new Date().toISOString(),
+              __src: "map",
+              __chart: "map",
+              __interaction: "brush",
+              selected_ids: ids,
+              selected_count: ids.length
+            };
+            sendToPython(brushData);
+          }
 
           setSelection(ids, "map-brush");
-        }});
+        }
+
+        const brush = d3.brush()
+          .extent([[0, 0], [W, H]])
+          .on("brush end", brushed);
+
+        if (canvasMode) {
+          const background = new Path2D(path(peru));
+          let byMapId = new Map();
+          let sel = new Set();
+          let route = [];
+          let hover = null;
+
+          function prepare() {
+            mpts.forEach(p => { p.color = getNodeColor(p.d); });
+            byMapId = new Map(mpts.map(p => [String(p.d.id), p]));
+          }
+          prepare();
+
+          function draw() {
+            const has = sel.size > 0;
+            ctx.clearRect(0, 0, W, H);
+            ctx.fillStyle = "#f3f6ff";
+            ctx.fill(background);
+            ctx.strokeStyle = "#9db2ff";
+            ctx.lineWidth = 1.0;
+            ctx.stroke(background);
+
+            if (route.length >= 2) {
+              ctx.save();
+              ctx.setLineDash([5, 5]);
+              ctx.strokeStyle = "#d32f2f";
+              ctx.lineWidth = 2.5;
+              ctx.beginPath();
+              route.forEach((p, i) => (i ? ctx.lineTo(p.x, p.y) : ctx.moveTo(p.x, p.y)));
+              ctx.stroke();
+              ctx.restore();
+            }
+
+            for (const p of mpts) {
+              const on = sel.has(String(p.d.id));
+              ctx.globalAlpha = !has || on ? 1.0 : 0.25;
+              ctx.beginPath();
+              ctx.arc(p.x, p.y, 6, 0, 2 * Math.PI);
+              ctx.fillStyle = p.color;
+              ctx.fill();
+              ctx.lineWidth = on ? 3 : 1.5;
+              ctx.strokeStyle = on ? "#d32f2f" : (p === hover ? "#333" : "#fff");
+              ctx.stroke();
+            }
+            ctx.globalAlpha = 1.0;
+            for (const p of mpts) {
+              if (p === hover || sel.has(String(p.d.id))) {
+                drawLabel(ctx, p.d.name || p.d.id, p.x + 9, p.y + 4, 10);
+              }
+            }
+          }
+
+          const schedule = frameScheduler(draw);
+
+          gMap.append("g").attr("class", "brush").call(brush);
+
+          svg
+            .on("click", event => {
+              const [x, y] = d3.pointer(event, svg.node());
+              const p = tree.find(x, y, 8);
+              if (p) pointClick(event, p.d);
+            })
+            .on("mousemove", event => {
+              const [x, y] = d3.pointer(event, svg.node());
+              const p = tree.find(x, y, 8) || null;
+              if (p === hover) return;
+              hover = p;
+              svg.style("cursor", p ? "pointer" : null);
+              host.title = p ? (p.d.name || p.d.id) : "";
+              schedule();
+            })
+            .on("mouseleave", () => {
+              hover = null;
+              schedule();
+            });
+
+          draw();
+
+          refresh = () => {
+            project();
+            prepare();
+            hover = null;
+            schedule();
+          };
+
+          bus.addEventListener("selection", e => {
+            const ids = e.detail.ids;
+            sel = new Set(ids);
+            route = ids.map(id => byMapId.get(String(id))).filter(Boolean);
+            schedule();
+          });
+          return;
+        }
+
+        const lineGen = d3.line()
+          .x(d => proj([+d.lon, +d.lat])[0])
+          .y(d => proj([+d.lon, +d.lat])[1]);
+
+        // Fondo
+        gMap.append("path")
+          .datum(peru)
+          .attr("d", path)
+          .attr("fill", "#f3f6ff")
+          .attr("stroke", "#9db2ff")
+          .attr("stroke-width", 1.0);
+
+        // Ruta
+        const routePath = gMap.append("path")
+          .attr("fill", "none")
+          .attr("stroke", "#d32f2f")
+          .attr("stroke-width", 2.5)
+          .attr("stroke-dasharray", "5 5")
+          .style("pointer-events", "none");
+
+        const pointLayer = gMap.append("g");
+        let nodeG = pointLayer.selectAll("g");
+
+        function render() {
+          nodeG = nodeG
+            .data(pts, d => String(d.id))
+            .join(enter => {
+              const ng = enter.append("g")
+                .style("cursor", "pointer")
+                .on("click", pointClick);
+
+              ng.append("circle")
+                .attr("r", 6)
+                .attr("stroke", "#fff")
+                .attr("stroke-width", 1.5);
+
+              ng.append("text")
+                .attr("x", 9)
+                .attr("y", 4)
+                .attr("font-size", "10px")
+                .attr("fill", "#222")
+                .style("paint-order", "stroke")
+                .style("stroke", "white")
+                .style("stroke-width", "3px")
+                .style("display", "none");
+
+              ng.append("title");
+              return ng;
+            })
+            .attr("transform", (d, i) => `translate(${mpts[i].x},${mpts[i].y})`);
+
+          nodeG.select("circle").attr("fill", d => getNodeColor(d));
+          nodeG.select("text").text(d => d.name || d.id);
+          nodeG.select("title").text(d => d.name || d.id);
+        }
+        render();
+
+        gMap.append("g").attr("class", "brush").call(brush);
+
+        refresh = () => {
+          project();
+          render();
+        };
+
+        bus.addEventListener("selection", e => {
+          const ids = e.detail.ids;
+          const sel = new Set(ids);
+          const has = sel.size > 0;
+
+          nodeG.attr("opacity", d => (!has || sel.has(String(d.id)) ? 1.0 : 0.25));
+
+          nodeG.select("circle")
+            .attr("stroke", d => (sel.has(String(d.id)) ? "#d32f2f" : "#fff"))
+            .attr("stroke-width", d => (sel.has(String(d.id)) ? 3 : 1.5));
+
+          nodeG.select("text")
+            .style("display", d => (sel.has(String(d.id)) ? "inline" : "none"));
+
+          const routePoints = ids
+            .map(id => byId.get(String(id)))
+            .filter(d => d && Number.isFinite(+d.lat) && Number.isFinite(+d.lon));
+
+          if (routePoints.length < 2) {
+            routePath.attr("d", null);
+          } else {
+            routePath.datum(routePoints).attr("d", lineGen);
+          }
+        });
+      });
+    })();
+
+
+    // =================== SCORE bars ============================
+    (function initScoreBars() {
+      const host = document.getElementById(rootId + "-radar");
+      const W = host.clientWidth;
+      const H = 420;
+      const margin = { top: 20, right: 20, bottom: 30, left: 160 };
+      const width  = W - margin.left - margin.right;
+      const height = H - margin.top - margin.bottom;
+
+      const x = d3.scaleLinear().range([0, width]);
+      const y = d3.scaleBand().range([0, height]).padding(0.2);
+      let items = [];
+
+      function rescale() {
+        items = data.nodes.filter(
+          d => typeof d.SCORE === "number" && !isNaN(d.SCORE)
+        );
+        items.sort((a, b) => d3.descending(a.SCORE, b.SCORE));
+        x.domain([0, d3.max(items, d => d.SCORE) || 1]).nice();
+        y.domain(items.map(d => String(d.id)));
+      }
+      rescale();
+
+      function barClick(event, d) {
+        if (event.metaKey || event.ctrlKey) {
+          toggleOne(d.id, "score");
+        } else {
+          setSelection([d.id], "score");
+        }
+        const clickData = {
+          id: d.id,
+          name: d.name,
+          SCORE: d.SCORE,
+          region: d.region,
+          __ts: new Date().toISOString(),
+          __src: "score",
+          __chart: "ranking_score"
+        };
+        sendToPython(clickData);
+        event.stopPropagation();
+      }
+
+      if (RENDERER === "canvas") {
+        const { canvas, ctx } = makeCanvas(host, W, H);
+        let bw = 0, showLabels = false, colors = [], fmt = null;
+        let sel = new Set();
+        let hover = null;
+
+        function prepare() {
+          bw = y.bandwidth();
+          showLabels = bw >= 8;
+          colors = items.map(d => getNodeColor(d));
+          fmt = x.tickFormat(4);
+        }
+        prepare();
+
+        function draw() {
+          const has = sel.size > 0;
+          ctx.clearRect(0, 0, W, H);
+          ctx.save();
+          ctx.translate(margin.left, margin.top);
+          if (!items.length) {
+            ctx.font = "16px system-ui";
+            ctx.fillStyle = "#666";
+            ctx.fillText("No SCORE data available.", 0, 20);
+            ctx.restore();
+            return;
+          }
+          items.forEach((d, i) => {
+            const on = sel.has(String(d.id));
+            const yy = y(String(d.id));
+            ctx.globalAlpha = !has || on ? 1.0 : 0.25;
+            ctx.fillStyle = colors[i];
+            ctx.fillRect(0, yy, x(d.SCORE), bw);
+            if (on || d === hover) {
+              ctx.lineWidth = 2;
+              ctx.strokeStyle = on ? "#7b1fa2" : "#333";
+              ctx.strokeRect(0, yy, x(d.SCORE), bw);
+            }
+          });
+          ctx.globalAlpha = 1.0;
+
+          ctx.font = "10px system-ui";
+          ctx.textBaseline = "middle";
+          if (showLabels) {
+            for (const d of items) {
+              const yc = y(String(d.id)) + bw / 2;
+              ctx.fillStyle = "#000";
+              ctx.textAlign = "end";
+              ctx.fillText(d.name || d.id, -6, yc);
+              ctx.fillStyle = "#444";
+              ctx.textAlign = "start";
+              ctx.fillText(d.SCORE.toFixed(2), x(d.SCORE) + 4, yc);
+            }
+          }
+
+          // eje inferior
+          ctx.strokeStyle = "#000";
+          ctx.lineWidth = 1;
+          ctx.beginPath();
+          ctx.moveTo(0, height + 0.5);
+          ctx.lineTo(width, height + 0.5);
+          ctx.stroke();
+          ctx.fillStyle = "#000";
+          ctx.textAlign = "center";
+          ctx.textBaseline = "top";
+          for (const t of x.ticks(4)) {
+            const tx = Math.round(x(t)) + 0.5;
+            ctx.beginPath();
+            ctx.moveTo(tx, height);
+            ctx.lineTo(tx, height + 6);
+            ctx.stroke();
+            ctx.fillText(fmt(t), tx, height + 9);
+          }
+          ctx.font = "11px system-ui";
+          ctx.fillStyle = "#333";
+          ctx.textBaseline = "alphabetic";
+          ctx.fillText("SCORE de recomendación", width / 2, height + 26);
+          ctx.restore();
+        }
+
+        const schedule = frameScheduler(draw);
+
+        // barras: la banda se invierte en O(1), no hace falta quadtree
+        function findBar(px, py) {
+          if (!items.length) return null;
+          const yy = py - margin.top;
+          const i = Math.floor((yy - y(y.domain()[0])) / y.step());
+          const d = items[i];
+          if (!d) return null;
+          const y0 = y(String(d.id));
+          const xx = px - margin.left;
+          return yy >= y0 && yy <= y0 + bw && xx >= 0 && xx <= Math.max(x(d.SCORE), 4) ? d : null;
+        }
 
-      gMap.append("g").attr("class", "brush").call(brush);
+        d3.select(canvas)
+          .on("click", event => {
+            const d = findBar(...d3.pointer(event, canvas));
+            if (d) barClick(event, d);
+          })
+          .on("mousemove", event => {
+            const d = findBar(...d3.pointer(event, canvas));
+            if (d === hover) return;
+            hover = d;
+            canvas.style.cursor = d ? "pointer" : "default";
+            canvas.title = d ? `${d.name || d.id}: ${d.SCORE.toFixed(2)}` : "";
+            schedule();
+          })
+          .on("mouseleave", () => {
+            hover = null;
+            schedule();
+          });
+
+        draw();
+
+        panels.push(() => {
+          rescale();
+          prepare();
+          hover = null;
+          schedule();
+        });
+
+        bus.addEventListener("selection", e => {
+          sel = new Set(e.detail.ids);
+          schedule();
+        });
+        return;
+      }
+
+      const svg = d3.select(host)
+        .append("svg")
+        .attr("width", W)
+        .attr("height", H);
+
+      const g = svg.append("g")
+        .attr("transform", `translate(${margin.left},${margin.top})`);
+
+      const empty = g.append("text")
+        .attr("x", 0)
+        .attr("y", 20)
+        .attr("fill", "#666")
+        .text("No SCORE data available.");
 
-      bus.addEventListener("selection", e => {{
-        const ids = e.detail.ids;
-        const sel = new Set(ids);
+      const axis = g.append("g")
+        .attr("transform", `translate(0,${height})`);
+
+      const axisLabel = g.append("text")
+        .attr("x", width / 2)
+        .attr("y", height + 26)
+        .attr("text-anchor", "middle")
+        .attr("font-size", "11px")
+        .attr("fill", "#333")
+        .text("SCORE de recomendación");
+
+      let bars = g.selectAll("rect.bar");
+      let labels = g.selectAll("text.label");
+      let values = g.selectAll("text.value");
+      const key = d => String(d.id);
+
+      // join por id: en una actualización las barras existentes solo se mueven
+      function render() {
+        const has = items.length > 0;
+        empty.style("display", has ? "none" : null);
+        axis.style("display", has ? null : "none");
+        axisLabel.style("display", has ? null : "none");
+
+        bars = bars
+          .data(items, key)
+          .join(enter => enter.append("rect")
+            .attr("class", "bar")
+            .attr("x", 0)
+            .style("cursor", "pointer")
+            .on("click", barClick))
+          .attr("y", d => y(String(d.id)))
+          .attr("height", y.bandwidth())
+          .attr("width", d => x(d.SCORE))
+          .attr("fill", d => getNodeColor(d));
+
+        labels = labels
+          .data(items, key)
+          .join(enter => enter.append("text")
+            .attr("class", "label")
+            .attr("x", -6)
+            .attr("dy", "0.35em")
+            .attr("text-anchor", "end")
+            .attr("font-size", "10px"))
+          .attr("y", d => y(String(d.id)) + y.bandwidth() / 2)
+          .text(d => d.name || d.id);
+
+        values = values
+          .data(items, key)
+          .join(enter => enter.append("text")
+            .attr("class", "value")
+            .attr("dy", "0.35em")
+            .attr("font-size", "10px")
+            .attr("fill", "#444"))
+          .attr("x", d => x(d.SCORE) + 4)
+          .attr("y", d => y(String(d.id)) + y.bandwidth() / 2)
+          .text(d => d.SCORE.toFixed(2));
+
+        if (has) axis.call(d3.axisBottom(x).ticks(4));
+      }
+      render();
+
+      panels.push(() => {
+        rescale();
+        render();
+      });
+
+      bus.addEventListener("selection", e => {
+        const sel = new Set(e.detail.ids);
         const has = sel.size > 0;
+        bars
+          .attr("opacity", d => (!has || sel.has(String(d.id)) ? 1.0 : 0.25))
+          .attr("stroke", d => (sel.has(String(d.id)) ? "#7b1fa2" : "none"))
+          .attr("stroke-width", d => (sel.has(String(d.id)) ? 2 : 0));
+      });
+    })();
+
+    // =================== Actualizaciones en vivo ===============
+    // live=True: Python manda diffs por Server-Sent Events (nodos nuevos o
+    // cambiados, ids eliminados, enlaces) y cada panel se actualiza en su
+    // lugar, sin volver a cargar D3, la geometría ni reiniciar el layout
+    function applyDiff(msg, diff) {
+      if (msg.reset) byId = new Map();
+      (diff.removed || []).forEach(r => byId.delete(String(r.id)));
+      (diff.nodes || []).forEach(d => {
+        const id = String(d.id);
+        const cur = byId.get(id);
+        byId.set(id, cur ? Object.assign(cur, d) : d);
+      });
+      data.nodes = Array.from(byId.values());
+      data.links = diff.links || [];
+      data.top = diff.top || [];
+      filteredLinks = data.top.map(i => Object.assign({}, data.links[i]));
+      panels.forEach(update => update());
+      setSelection(state.selected.filter(id => byId.has(id)), "update");
+    }
+
+    // =================== Re-ranking en el navegador ============
+    // rerank: pool de candidatos (sim, dist_km, misma macro-región) en
+    // arrays tipados; los sliders recalculan SCORE y el top-k en un loop
+    // sobre los arrays (como _rank_candidates) y los paneles se actualizan
+    // con applyDiff en el mismo frame, sin ir a Python. Una actualización
+    // live trae el pool del ranking nuevo (rerank.load) o, si no lo trae,
+    // desactiva los sliders (rerank.disable)
+    const rerank = RERANK ? (function initRerank() {
+      let cfg, pool, base, n, sim, dist, sameRg, fb, score, cand;
+      const params = {};
+
+      function setPool(rows, baseRow, config) {
+        cfg = config;
+        pool = rows || [];
+        base = baseRow || null;
+        n = pool.length;
+        sim = Float64Array.from(pool, d => d.sim);
+        dist = Float64Array.from(pool, d => d.dist_km);
+        sameRg = Uint8Array.from(pool, d => d.same_rg > 0 ? 1 : 0);
+        fb = Float64Array.from(pool, d => +d.fb || 0);
+        score = new Float64Array(n);
+        cand = new Int32Array(n);
+        for (const k of Object.keys(params)) delete params[k];
+        Object.assign(params, cfg.params);
+        params.geo_km = params.geo_km || 0;  // 0 = sin componente geográfico
+      }
+      setPool(data.pool, (data.base || [])[0], RERANK);
+
+      // SCORE descendente, NaN al final y empates en el orden del pool
+      function byScore(a, b) {
+        const sa = score[a], sb = score[b];
+        const na = sa !== sa, nb = sb !== sb;
+        if (na || nb) return na === nb ? a - b : (na ? 1 : -1);
+        return sa !== sb ? sb - sa : a - b;
+      }
+
+      function rank() {
+        const { alpha, geo_km, rg_weight, rg_mode } = params;
+        const fbWeight = params.fb_weight || 0;
+        const useGeo = geo_km > 0 && cfg.geo_anchor;
+        const rgFilter = cfg.rg_available && rg_mode === "filter";
+        const rgBonus = cfg.rg_available && rg_mode === "bonus" ? rg_weight : 0;
+        let m = 0;
+        for (let i = 0; i < n; i++) {
+          if (rgFilter && !sameRg[i]) continue;
+          const geo = useGeo ? Math.min(Math.max(1 - dist[i] / geo_km, 0), 1) : 0;
+          score[i] = alpha * sim[i] + (1 - alpha) * geo + rgBonus * sameRg[i] + fbWeight * fb[i];
+          cand[m++] = i;
+        }
+        const top = cand.subarray(0, m).sort(byScore).subarray(0, Math.min(cfg.topk, m));
+
+        // mismo armado que _build_nodes_and_links_for_dashboard
+        let lo = Infinity, hi = -Infinity;
+        top.forEach(i => {
+          if (Number.isFinite(score[i])) {
+            lo = Math.min(lo, score[i]);
+            hi = Math.max(hi, score[i]);
+          }
+        });
+        const norm = v => (hi < lo ? 0.5 : (hi > lo ? (v - lo) / (hi - lo) : 1.0));
+
+        const nodes = base ? [Object.assign({}, base)] : [];
+        const links = [];
+        top.forEach(i => {
+          const p = pool[i];
+          nodes.push({
+            id: p.id, name: p.name, region: p.region, url: p.url,
+            lat: p.lat, lon: p.lon,
+            want_to_go: 4 + 5 * norm(score[i]),
+            SCORE: score[i]
+          });
+          if (base) links.push({ source: base.id, target: p.id, similarity: score[i] });
+        });
+        // grafo estrella: cada enlace está en el Top-3 de su recomendación
+        applyDiff({ reset: true }, { nodes, links, top: links.map((_, i) => i) });
+        info.text(`Top ${top.length} de ${m} candidatos`);
+      }
+
+      let frame = 0;
+      function schedule() {
+        if (!frame) frame = requestAnimationFrame(() => { frame = 0; rank(); });
+      }
+
+      // a Python solo el valor final (al soltar el slider)
+      function report() {
+        sendToPython({
+          __ts: new Date().toISOString(),
+          __src: "controls",
+          __chart: "rerank",
+          __interaction: "params",
+          alpha: params.alpha,
+          geo_km: params.geo_km || null,
+          rg_mode: params.rg_mode,
+          rg_weight: params.rg_weight,
+          fb_weight: params.fb_weight ?? null
+        });
+      }
+
+      const host = d3.select(document.getElementById(rootId + "-ctrl"));
+      const sliders = {};  // key -> (parámetros) => posición/etiqueta/máximo
+
+      function slider(key, label, maxOf, step, fmt) {
+        const row = host.append("label")
+          .style("display", "flex")
+          .style("align-items", "center")
+          .style("gap", "6px");
+        row.append("span").text(label);
+        const out = row.append("span").style("min-width", "42px");
+        const input = row.insert("input", "span:last-child")
+          .attr("type", "range")
+          .attr("min", 0)
+          .attr("step", step)
+          .on("input", event => {
+            params[key] = +event.target.value;
+            out.text(fmt(params[key]));
+            schedule();
+          })
+          .on("change", report);
+        sliders[key] = () => {
+          const v = params[key] || 0;  // p.ej. fb_weight si la actualización no trae feedback
+          input.attr("max", maxOf(v)).property("value", v);
+          out.text(fmt(v));
+        };
+      }
+
+      slider("alpha", "alpha", () => 1, 0.01, v => v.toFixed(2));
+      slider("geo_km", "geo_km", v => Math.max(300, 2 * v), 5,
+             v => (v > 0 ? v + " km" : "off"));
+      slider("rg_weight", "rg_weight", v => Math.max(0.5, 2 * v), 0.01, v => v.toFixed(2));
+      if (params.fb_weight != null) {
+        slider("fb_weight", "clicks", v => Math.max(0.5, 2 * v), 0.01, v => v.toFixed(2));
+      }
+
+      const rgRow = host.append("label")
+        .style("display", "flex")
+        .style("align-items", "center")
+        .style("gap", "6px");
+      rgRow.append("span").text("macro-región");
+      const rgSelect = rgRow.append("select")
+        .on("change", event => {
+          params.rg_mode = event.target.value;
+          schedule();
+          report();
+        });
+      rgSelect.selectAll("option")
+        .data(["none", "bonus", "filter"])
+        .join("option")
+        .attr("value", d => d)
+        .text(d => d);
+
+      const info = host.append("span").style("color", "#666");
+
+      // posición de los controles y resumen para el pool cargado
+      function sync() {
+        Object.values(sliders).forEach(f => f());
+        rgSelect.property("disabled", !cfg.rg_available).property("value", params.rg_mode);
+        const m0 = cfg.rg_available && params.rg_mode === "filter" ? d3.sum(sameRg) : n;
+        info.text(`Top ${Math.min(cfg.topk, m0)} de ${m0} candidatos`);
+      }
+      sync();
+
+      return {
+        // pool, base y parámetros del ranking que acaba de llegar por live
+        load(rows, baseRow, config) {
+          if (frame) cancelAnimationFrame(frame);
+          frame = 0;
+          setPool(rows, baseRow, config);
+          host.selectAll("input, select").property("disabled", false);
+          sync();
+        },
+        disable() {
+          if (frame) cancelAnimationFrame(frame);
+          frame = 0;
+          host.selectAll("input, select").property("disabled", true);
+          info.text("Sliders desactivados: el ranking cambió desde Python");
+        }
+      };
+    })() : null;
+
+    if (LIVE) {
+      let seq = LIVE.seq;
+      let chain = Promise.resolve();
+
+      // directo a 127.0.0.1:<port> y, si nunca abre, vía /proxy/<port>
+      function subscribe(attempt) {
+        const port = window.__ourlibPort || 5000;
+        const urls = ["http://127.0.0.1:" + port + LIVE.path, "/proxy/" + port + LIVE.path];
+        const es = new EventSource(urls[attempt] + "?since=" + seq);
+        let opened = false;
+        es.onopen = () => { opened = true; };
+        es.onerror = () => {
+          if (opened) return;  // EventSource reintenta solo (con Last-Event-ID)
+          es.close();
+          if (attempt + 1 < urls.length) subscribe(attempt + 1);
+          else console.warn("ourlib: sin canal de actualizaciones (¿start_server()?)");
+        };
+        // cada stream ocupa un worker del servidor: se cierra apenas el
+        // dashboard sale de la página (el heartbeat "ping" lo comprueba)
+        const gone = () => {
+          if (document.getElementById(rootId)) return false;
+          es.close();  // la celda se volvió a ejecutar o se borró la salida
+          return true;
+        };
+        es.addEventListener("ping", gone);
+        es.addEventListener("close", () => {
+          // reemplazado por otro dashboard o demasiados streams abiertos
+          es.close();
+          console.warn("ourlib: el servidor cerró las actualizaciones de este dashboard");
+        });
+        es.addEventListener("update", ev => {
+          if (gone()) return;
+          const msg = JSON.parse(ev.data);
+          chain = chain
+            .then(() => Promise.all([
+              window.__ourlibColumnar.load(msg.payload),
+              msg.rerank ? window.__ourlibColumnar.load(msg.rerank.payload) : null
+            ]))
+            .then(([diff, pool]) => {
+              seq = msg.seq;
+              applyDiff(msg, diff);
+              // el ranking nuevo trae su pool: los sliders re-puntúan ese
+              if (rerank && "rerank" in msg) {
+                if (pool) rerank.load(pool.pool, (pool.base || [])[0], msg.rerank);
+                else rerank.disable();
+              }
+            })
+            .catch(err => console.warn("ourlib: actualización no aplicada", err));
+        });
+      }
+      subscribe(0);
+    }
+  }
+""",
+    deps=("d3", "topojson", "peru", "columnar", "bridge"),
+)
 
-        nodeG.attr("opacity", d => (!has || sel.has(String(d.id)) ? 1.0 : 0.25));
 
-        nodeG.select("circle")
-          .attr("stroke", d => (sel.has(String(d.id)) ? "#d32f2f" : "#fff"))
-          .attr("stroke-width", d => (sel.has(String(d.id)) ? 3 : 1.5));
-
-        nodeG.select("text")
-          .style("display", d => (sel.has(String(d.id)) ? "inline" : "none"));
-
-        const routePoints = ids
-          .map(id => byId.get(String(id)))
-          .filter(d => d && Number.isFinite(+d.lat) && Number.isFinite(+d.lon));
-
-        if (routePoints.length < 2) {{
-          routePath.attr("d", null);
-        }} else {{
-          routePath.datum(routePoints).attr("d", lineGen);
-        }}
-      }});
-    }});
-  }})();
-
-  // =================== SCORE bars ============================
-  (function initScoreBars() {{
-    const host = document.getElementById("{radar_id}");
+def show_dashboard_map_force_radar_linked(
+    nodes, links, width: int = 1200, height: int = 900, grid_cols: int = 2, grid_rows: int = 2,
+    encoding: str = "columnar", compress=None, layout: str = "browser",
+    renderer: str = "svg", live: bool = False, rerank: dict = None,
+):
+    """
+    Dashboard linkeado para recomendaciones de turismo:
+
+    - Graph (force) con top-3 aristas de similaridad por nodo.
+    - Map de Perú con puntos (lat, lon) y brush de selección.
+    - Panel de SCORE (barras horizontales por recomendación).
+    - Panel de Selection con la lista de recursos seleccionados.
+    - En cada click se manda un payload a Python (Colab o Flask).
+
+    Espera que cada nodo tenga al menos:
+      { "id", "name", "region", "lat", "lon", "SCORE", "want_to_go" }
+
+    Y cada enlace:
+      { "source", "target", "similarity" }.
+
+    encoding: "columnar" (diccionarios de strings + Float32/Int32 en base64,
+    ver graph_payload) o "json" (filas planas, útil para depurar).
+    compress: gzip del blob columnar (None = automático según tamaño).
+    Solo se envían los campos que usa el JS; nodos y enlaces viajan una vez
+    y el Top-3 del Graph se manda como índices sobre `links`.
+    layout: "browser" (d3.forceSimulation en el navegador) o "python"
+    (posiciones fijas calculadas con graph_layout y cacheadas por grafo;
+    recomendado con miles de nodos: ~1 s la primera vez con 10k, con
+    menos iteraciones cuanto más grande el grafo; ver graph_layout).
+    renderer: "svg" (un elemento DOM por punto/enlace) o "canvas" (un
+    <canvas> por panel, hover y click resueltos con d3.quadtree; para
+    catálogos de miles de puntos). El bus de selección es el mismo.
+    live: el dashboard se suscribe por SSE a /events/<dash_id> del servidor
+    de start_server() y push_dashboard_update(html.dash_id, nodes, links)
+    le manda solo el diff; los paneles se actualizan sin re-renderizar.
+    rerank: sliders que re-puntúan un pool de candidatos en el navegador
+    (ver turismo_dashboard_model._rerank_controls):
+      {"pool": [filas con RERANK_POOL_COLUMNS], "base": nodo | None,
+       "topk", "params": {alpha, geo_km, rg_mode, rg_weight[, fb_weight]},
+       "geo_anchor", "rg_available"}
+    SCORE = alpha·sim + (1 − alpha)·geo_bonus + rg_weight·misma_macroregión
+    (+ fb_weight·fb con feedback de clicks), igual que
+    turismo_recs._rank_candidates.
+
+    Los clicks del dashboard llevan __session = html.dash_id: ver
+    get_session_clicks / close_click_session.
+    """
+    dash_id = "dash-" + uuid.uuid4().hex
+
+    if layout not in ("browser", "python"):
+        raise ValueError("layout debe ser 'browser' o 'python'.")
+    if renderer not in ("svg", "canvas"):
+        raise ValueError("renderer debe ser 'svg' o 'canvas'.")
+    if encoding not in ("columnar", "json"):
+        raise ValueError("encoding debe ser 'columnar' o 'json'.")
+
+    # ---- Filtramos Top-3 conexiones por nodo para el Graph ----
+    top_idx = top_link_indices(nodes, links, k=3)
+
+    tables = {
+        "nodes": (nodes, DASHBOARD_NODE_COLUMNS),
+        "links": (links, DASHBOARD_LINK_COLUMNS),
+    }
+    if layout == "python":
+        pos = layout_for_links(nodes, [links[i] for i in top_idx])
+        tables["nodes"] = (
+            nodes,
+            {**DASHBOARD_NODE_COLUMNS, "px": "f32", "py": "f32"},
+            {"px": pos[:, 0].tolist(), "py": pos[:, 1].tolist()},
+        )
+    rerank_cfg = None
+    if rerank:
+        tables.update(_rerank_tables(rerank))
+        rerank_cfg = _rerank_config(rerank)
+    payload = _pack_dashboard(tables, top_idx, encoding, compress)
+    payload_json = payload_to_json(payload)
+
+    live_cfg = None
+    if live:
+        _dashboards.register(
+            dash_id,
+            _live_rows(nodes, links, layout),
+            links,
+            _live_packer(layout, encoding, compress),
+            {"layout": layout, "encoding": encoding, "compress": compress,
+             "rerank": rerank_cfg is not None},
+        )
+        live_cfg = {"path": f"/events/{dash_id}", "seq": 0}
+
+    chart_vars = {
+        "WIDTH": width,
+        "GRID_COLS": grid_cols,
+        "GRID_ROWS": grid_rows,
+        "CTRL_DISPLAY": "flex" if rerank else "none",
+        "renderer": renderer,
+        "live": live_cfg,
+        "rerank": rerank_cfg,
+        "port": int(_server_port),
+    }
+    out = HTML(_DASHBOARD_CHART.render(dash_id, payload_json, chart_vars))
+    out.dash_id = dash_id
+    return out
+
+
+def _rerank_tables(rerank: dict) -> dict:
+    base = rerank.get("base")
+    return {
+        "pool": (rerank["pool"], RERANK_POOL_COLUMNS),
+        "base": ([base] if base else [], DASHBOARD_NODE_COLUMNS),
+    }
+
+
+def _rerank_config(rerank: dict) -> dict:
+    return {k: rerank.get(k) for k in ("topk", "params", "geo_anchor", "rg_available")}
+
+
+def _pack_dashboard(tables, top_idx, encoding, compress):
+    if encoding == "columnar":
+        return pack_columnar(tables, {"top": top_idx}, compress=compress)
+    return pack_json(tables, {"top": top_idx})
+
+
+def _live_rows(nodes, links, layout):
+    """Nodos tal como los ve el navegador (con px/py si layout="python")."""
+    if layout != "python":
+        return nodes
+    top_idx = top_link_indices(nodes, links, k=3)
+    pos = layout_for_links(nodes, [links[i] for i in top_idx])
+    return [{**n, "px": float(x), "py": float(y)} for n, (x, y) in zip(nodes, pos.tolist())]
+
+
+def _live_packer(layout, encoding, compress):
+    node_columns = DASHBOARD_NODE_COLUMNS
+    if layout == "python":
+        node_columns = {**DASHBOARD_NODE_COLUMNS, "px": "f32", "py": "f32"}
+
+    def pack(changed, removed, nodes, links):
+        tables = {
+            "nodes": (changed, node_columns),
+            "links": (links, DASHBOARD_LINK_COLUMNS),
+            "removed": ([{"id": k} for k in removed], {"id": "str"}),
+        }
+        return _pack_dashboard(tables, top_link_indices(nodes, links, k=3), encoding, compress)
+
+    return pack
+
+
+def push_dashboard_update(dash_id: str, nodes, links, rerank: dict = None) -> dict:
+    """
+    Actualiza un dashboard ya montado (show_dashboard_map_force_radar_linked
+    con live=True): calcula el diff contra lo último enviado (nodos nuevos o
+    cambiados, ids eliminados, enlaces) y lo manda por SSE. Devuelve
+    {"seq", "changed", "removed", "subscribers"}.
+
+    rerank: el pool, base y parámetros nuevos de los sliders (mismo formato
+    que en show_dashboard_map_force_radar_linked); sin él, un dashboard con
+    sliders los desactiva, porque su pool ya no corresponde al ranking.
+    """
+    channel = _dashboards.get(dash_id)
+    if channel is None:
+        raise KeyError(f"No hay un dashboard live con id {dash_id!r} (¿se mostró con live=True?)")
+    opts = channel.options
+    extra = None
+    if opts.get("rerank"):
+        if rerank:
+            packed = _pack_dashboard(_rerank_tables(rerank), [], opts["encoding"], opts["compress"])
+            extra = {"rerank": {**_rerank_config(rerank), "payload": packed}}
+        else:
+            extra = {"rerank": None}
+    return channel.update(_live_rows(nodes, links, opts.get("layout")), links, extra)
+
+
+# Colores de la leyenda Costa/Sierra/Selva (los mismos del dashboard)
+ZONE_COLORS = {"Costa": "#fbc02d", "Sierra": "#8D6E63", "Selva": "#4CAF50"}
+
+
+def _finite(v) -> bool:
+    try:
+        return math.isfinite(float(v))
+    except (TypeError, ValueError):
+        return False
+
+
+_CATALOGUE_CHART = ChartModule(
+    "catalogue_map",
+    markup="""
+<div id="[CHART_ID]" style="width:[WIDTH]px; font-family:system-ui;">
+  <div style="border:3px solid #2e7d32; border-radius:12px; padding:10px;">
+    <h3 style="margin:0 0 6px;">Catálogo · Map</h3>
+    <div style="font-size:11px; margin-bottom:5px;">
+      Burbujas = cantidad de recursos (color = región geográfica dominante).
+      Zoom o click en una burbuja para separarla.
+    </div>
+    <div id="[CHART_ID]-map" style="width:100%; height:[HEIGHT]px; border:1px solid #ccc;"></div>
+    <div style="display:flex; justify-content:space-between; margin-top:8px; font-size:12px;">
+      <span id="[CHART_ID]-legend" style="display:flex; gap:15px;"></span>
+      <span id="[CHART_ID]-status" style="color:#555;"></span>
+    </div>
+    <div id="[CHART_ID]-info" style="margin-top:8px; background:#f8f9fa; padding:8px; font-size:13px;">
+      <em>Haz click en un recurso…</em>
+    </div>
+  </div>
+</div>
+""",
+    script=PERU_GEOMETRY_JS + """
+  const raw = payload;
+  const GROUP_COLORS = vars.colors;
+  const N_LEVELS = vars.levels;
+  // clicks con __session = rootId (= html.dash_id)
+  window.__ourlibPort = vars.port;
+  const _sendToPython = window.__ourlibBridge.sender(rootId);
+
+  window.__ourlibColumnar.load(raw).then(run).catch(err => {
+    console.warn("ourlib: no se pudo decodificar el payload", err);
+    const box = document.getElementById(rootId + "-info");
+    if (box) box.innerHTML = "<em>Error cargando datos del mapa: " + err + "</em>";
+  });
+
+  function run(data) {
+    const host = document.getElementById(rootId + "-map");
+    const status = document.getElementById(rootId + "-status");
+    const info = document.getElementById(rootId + "-info");
     const W = host.clientWidth;
-    const H = 420;
-    const margin = {{ top: 20, right: 20, bottom: 30, left: 160 }};
-    const width  = W - margin.left - margin.right;
-    const height = H - margin.top - margin.bottom;
+    const H = vars.HEIGHT;
+    const color = g => GROUP_COLORS[g] || "#9e9e9e";
 
-    const svg = d3.select(host)
-      .append("svg")
-      .attr("width", W)
-      .attr("height", H);
+    document.getElementById(rootId + "-legend").innerHTML = Object.entries(GROUP_COLORS)
+      .map(([g, c]) => `<span><span style="color:${c}; font-size:1.2em; -webkit-text-stroke: 1px #ccc;">●</span> ${g}</span>`)
+      .join("");
 
-    const g = svg.append("g")
-      .attr("transform", `translate(${{margin.left}},${{margin.top}})`);
+    const svg = d3.select(host).append("svg").attr("width", W).attr("height", H);
+    const gBg = svg.append("g");
+    const gItems = svg.append("g");
 
-    const items = data.nodes.filter(
-      d => typeof d.SCORE === "number" && !isNaN(d.SCORE)
-    );
+    ourlibPeruGeometry().then(peru => {
+      const proj = d3.geoMercator().fitExtent([[20, 20], [W - 20, H - 20]], peru);
 
-    if (!items.length) {{
-      g.append("text")
-        .attr("x", 0)
-        .attr("y", 20)
-        .attr("fill", "#666")
-        .text("No SCORE data available.");
-      return;
-    }}
-
-    items.sort((a, b) => d3.descending(a.SCORE, b.SCORE));
-
-    const x = d3.scaleLinear()
-      .domain([0, d3.max(items, d => d.SCORE)])
-      .nice()
-      .range([0, width]);
-
-    const y = d3.scaleBand()
-      .domain(items.map(d => String(d.id)))
-      .range([0, height])
-      .padding(0.2);
-
-    const bars = g.selectAll("rect.bar")
-      .data(items)
-      .enter()
-      .append("rect")
-      .attr("class", "bar")
-      .attr("x", 0)
-      .attr("y", d => y(String(d.id)))
-      .attr("height", y.bandwidth())
-      .attr("width", d => x(d.SCORE))
-      .attr("fill", d => getNodeColor(d))
-      .style("cursor", "pointer")
-      .on("click", (event, d) => {{
-        if (event.metaKey || event.ctrlKey) {{
-          toggleOne(d.id, "score");
-        }} else {{
-          setSelection([d.id], "score");
-        }}
-        const clickData = {{
-            id: d.id,
-            name: d.name,
-            SCORE: d.SCORE,
-            region: d.region,
-            __ts: new Date().toISOString(),
-            __src: "score", 
-            __chart: "ranking_score"
-          }};
-        sendToPython(clickData);
+      gBg.append("path")
+        .datum(peru)
+        .attr("d", d3.geoPath(proj))
+        .attr("fill", "#f3f6ff")
+        .attr("stroke", "#9db2ff")
+        .attr("vector-effect", "non-scaling-stroke");
+
+      // coordenadas proyectadas una sola vez (sin zoom)
+      function project(rows, level) {
+        rows.forEach((r, i) => {
+          const p = proj([+r.lon, +r.lat]);
+          r.x = p[0];
+          r.y = p[1];
+          r.level = level;
+          r.key = level + ":" + i;
+        });
+        return rows;
+      }
+
+      // layers[0..N_LEVELS-1] = clusters, layers[N_LEVELS] = recursos
+      const layers = [];
+      for (let l = 0; l < N_LEVELS; l++) layers.push(project(data["L" + l] || [], l));
+      const points = project(data.points || [], N_LEVELS);
+      layers.push(points);
+
+      const maxCount = d3.max(layers[0] || [], d => d.count) || 1;
+      const radius = d3.scaleSqrt().domain([1, maxCount]).range([4, 28]);
+
+      let transform = d3.zoomIdentity;
+
+      // cada duplicación del zoom baja un nivel (las celdas miden la mitad)
+      function levelFor(k) {
+        return Math.max(0, Math.min(N_LEVELS, Math.floor(Math.log2(k) + 1e-9)));
+      }
+
+      function showInfo(p) {
+        const nm = p.name || p.id;
+        const link = p.url
+          ? `<a href="${p.url}" target="_blank" rel="noopener noreferrer">${nm}</a>`
+          : nm;
+        const extra = [p.region, p.group].filter(Boolean).join(" · ");
+        info.innerHTML = `<strong>${link}</strong>${extra ? " · " + extra : ""}`;
+      }
+
+      function onClick(event, d) {
         event.stopPropagation();
-      }});
-
-    g.selectAll("text.label")
-      .data(items)
-      .enter()
-      .append("text")
-      .attr("class", "label")
-      .attr("x", -6)
-      .attr("y", d => y(String(d.id)) + y.bandwidth() / 2)
-      .attr("dy", "0.35em")
-      .attr("text-anchor", "end")
-      .attr("font-size", "10px")
-      .text(d => d.name || d.id);
-
-    g.selectAll("text.value")
-      .data(items)
-      .enter()
-      .append("text")
-      .attr("class", "value")
-      .attr("x", d => x(d.SCORE) + 4)
-      .attr("y", d => y(String(d.id)) + y.bandwidth() / 2)
-      .attr("dy", "0.35em")
-      .attr("font-size", "10px")
-      .attr("fill", "#444")
-      .text(d => d.SCORE.toFixed(2));
-
-    g.append("g")
-      .attr("transform", `translate(0,${{height}})`)
-      .call(d3.axisBottom(x).ticks(4));
-
-    g.append("text")
-      .attr("x", width / 2)
-      .attr("y", height + 26)
-      .attr("text-anchor", "middle")
-      .attr("font-size", "11px")
-      .attr("fill", "#333")
-      .text("SCORE de recomendación");
-
-    bus.addEventListener("selection", e => {{
-      const sel = new Set(e.detail.ids);
-      const has = sel.size > 0;
-      bars
-        .attr("opacity", d => (!has || sel.has(String(d.id)) ? 1.0 : 0.25))
-        .attr("stroke", d => (sel.has(String(d.id)) ? "#7b1fa2" : "none"))
-        .attr("stroke-width", d => (sel.has(String(d.id)) ? 2 : 0));
-    }});
-  }})();
-}})();
-</script>
-"""
-    return HTML(html)
\ No newline at end of file
+        if (d.count > 1) {
+          const k = Math.pow(2, d.level + 1);
+          svg.transition().duration(500).call(
+            zoom.transform,
+            d3.zoomIdentity.translate(W / 2, H / 2).scale(k).translate(-d.x, -d.y)
+          );
+          return;
+        }
+        const p = d.count === 1 ? points[d.member] : d;
+        showInfo(p);
+        _sendToPython({
+          id: p.id,
+          name: p.name,
+          region: p.region,
+          group: p.group,
+          lat: p.lat,
+          lon: p.lon,
+          __ts: new Date().toISOString(),
+          __src: "catalogue",
+          __chart: "catalogue_map"
+        });
+      }
+
+      function render() {
+        const level = levelFor(transform.k);
+        const rows = layers[level];
+        const isPoints = level === N_LEVELS;
+
+        // solo el nivel actual y solo lo que cae dentro de la vista
+        const [x0, y0] = transform.invert([0, 0]);
+        const [x1, y1] = transform.invert([W, H]);
+        const pad = 30 / transform.k;
+        const visible = rows.filter(
+          r => r.x >= x0 - pad && r.x <= x1 + pad && r.y >= y0 - pad && r.y <= y1 + pad
+        );
+
+        const item = gItems.selectAll("g.item")
+          .data(visible, d => d.key)
+          .join(enter => {
+            const g = enter.append("g")
+              .attr("class", "item")
+              .style("cursor", "pointer")
+              .on("click", onClick);
+            g.append("circle")
+              .attr("stroke", "#fff")
+              .attr("stroke-width", 1.5);
+            g.append("text")
+              .attr("text-anchor", "middle")
+              .attr("dy", "0.35em")
+              .attr("font-size", "10px")
+              .attr("fill", "#222")
+              .style("pointer-events", "none");
+            g.append("title");
+            return g;
+          })
+          .attr("transform", d => `translate(${transform.applyX(d.x)},${transform.applyY(d.y)})`);
+
+        item.select("circle")
+          .attr("r", d => (isPoints ? 5 : radius(d.count)))
+          .attr("fill", d => color(d.group))
+          .attr("fill-opacity", isPoints ? 1.0 : 0.75);
+
+        item.select("text").text(d => (!isPoints && d.count > 1 ? d.count : ""));
+
+        item.select("title").text(d => (isPoints || d.count === 1)
+          ? ((isPoints ? d : points[d.member]).name || "")
+          : `${d.count} recursos` + (d.group ? ` · mayoría ${d.group}` : ""));
+
+        status.textContent = isPoints
+          ? `Recursos individuales · ${visible.length} en vista`
+          : `Nivel ${level + 1}/${N_LEVELS} · ${visible.length} de ${rows.length} clusters en vista`;
+      }
+
+      let frame = 0;
+      const zoom = d3.zoom()
+        .scaleExtent([1, Math.pow(2, N_LEVELS + 2)])
+        .translateExtent([[0, 0], [W, H]])
+        .on("zoom", event => {
+          transform = event.transform;
+          gBg.attr("transform", transform);
+          if (!frame) frame = requestAnimationFrame(() => { frame = 0; render(); });
+        });
+
+      svg.call(zoom);
+      render();
+    }).catch(err => {
+      console.warn("ourlib: no se pudo cargar la geometría de Perú", err);
+    });
+  }
+""",
+    deps=("d3", "topojson", "peru", "columnar", "bridge"),
+)
+
+
+def show_catalogue_map(
+    points, levels: int = 5, base_deg: float = 2.0, group_colors=None,
+    width: int = 900, height: int = 650, compress=None,
+):
+    """
+    Mapa de Perú para el catálogo completo, con nivel de detalle por zoom.
+
+    points: dicts con "id", "name", "lat", "lon" y opcionalmente "region",
+    "url" y "group" (p.ej. Costa/Sierra/Selva: color y etiqueta dominante
+    de cada burbuja).
+
+    Python agrupa los puntos en `levels` rejillas anidadas (celdas de
+    base_deg / 2**l grados, ver graph_prep.grid_clusters) con su conteo y
+    grupo dominante. Con zoom k se dibuja el nivel floor(log2 k): cada
+    duplicación del zoom parte las burbujas en hasta 4; pasado el último
+    nivel se ven los recursos individuales. Solo los elementos del nivel
+    visible y dentro de la vista están en el DOM.
+
+    Devuelve el HTML con .dash_id: la sesión de sus clicks
+    (get_session_clicks).
+    """
+    root_id = "catalogue-" + uuid.uuid4().hex
+
+    pts = [p for p in points if _finite(p.get("lat")) and _finite(p.get("lon"))]
+    group_names = []
+    code_of = {}
+    codes = []
+    for p in pts:
+        g = str(p.get("group") or "")
+        if g not in code_of:
+            code_of[g] = len(group_names)
+            group_names.append(g)
+        codes.append(code_of[g])
+
+    tables = {
+        "points": (pts, {
+            "id": "str", "name": "str", "region": "str", "url": "str",
+            "group": "str", "lat": "f32", "lon": "f32",
+        }),
+    }
+    if pts:
+        clusters = grid_clusters(
+            [float(p["lat"]) for p in pts], [float(p["lon"]) for p in pts],
+            codes, base_deg=base_deg, levels=levels,
+        )
+        for level, c in enumerate(clusters):
+            tables[f"L{level}"] = (
+                range(len(c["count"])),
+                {"lat": "f32", "lon": "f32", "count": "i32", "member": "i32", "group": "str"},
+                {
+                    "lat": c["lat"].tolist(),
+                    "lon": c["lon"].tolist(),
+                    "count": c["count"].tolist(),
+                    "member": c["member"].tolist(),
+                    "group": [group_names[i] or None for i in c["label"]],
+                },
+            )
+
+    payload_json = payload_to_json(pack_columnar(tables, compress=compress))
+
+    chart_vars = {
+        "WIDTH": width,
+        "HEIGHT": height,
+        "colors": group_colors or ZONE_COLORS,
+        "levels": levels,
+        "port": int(_server_port),
+    }
+    out = HTML(_CATALOGUE_CHART.render(root_id, payload_json, chart_vars))
+    out.dash_id = root_id
+    return out
@@ -0,0 +1,366 @@
+# src/our_library/graph_assets.py
+
+"""
+Assets estáticos compartidos por todos los gráficos (D3, topojson-client,
+geometría de Perú y el decoder columnar).
+
+Los archivos vendorizados viven en `_static/` (D3 v7 y la geometría de
+Perú) y se incrustan inline en el HTML, así los gráficos funcionan sin
+conexión y sin la carrera de los <script src> asíncronos. topojson-client
+solo hace falta si no está peru.geo.json (el mapa baja world-atlas del CDN
+y lo convierte); si falta un archivo se usa el CDN como antes.
+
+Modo "auto" (por defecto): fuera de Colab el código de cada asset se
+inyecta una sola vez por sesión de kernel (todas las salidas comparten el
+documento) y esa primera copia se guarda en localStorage. Las salidas
+siguientes llevan solo un guard (`if (!window.d3) ...`) que, si el
+documento no tiene el asset (la página se recargó sin reiniciar el
+kernel), lo restaura desde localStorage. En Colab cada salida es un iframe
+aislado y se inyecta siempre.
+
+Además de los archivos vendorizados, otros módulos registran su propio JS
+con register_asset (el bridge JS → Python, los módulos de gráficos de
+graph_templates) y se inyecta con las mismas reglas.
+
+standalone_document() arma un documento aparte (export_dashboard): todo
+inline una vez por documento, sin tocar lo inyectado en la sesión, y con
+assets reemplazables (p.ej. un bridge que no llama a Python).
+
+Para (re)generar `_static/` en una máquina con red:
+
+    python -m our_library.graph_assets
+"""
+
+import hashlib
+import json
+from contextlib import contextmanager
+from pathlib import Path
+
+from .graph_payload import COLUMNAR_DECODER_JS
+
+try:
+    from google.colab import output as _colab_output  # noqa: F401
+    _IN_COLAB = True
+except Exception:  # pragma: no cover
+    _IN_COLAB = False
+
+STATIC_DIR = Path(__file__).parent / "_static"
+
+WORLD_ATLAS_URL = "https://cdn.jsdelivr.net/npm/world-atlas@2/countries-110m.json"
+PERU_ISO_NUMERIC = "604"
+
+# nombre -> (archivo vendorizado, URL de CDN)
+# (topojson-client no se vendoriza: con peru.geo.json no se usa)
+SCRIPT_ASSETS = {
+    "d3": ("d3.v7.min.js", "https://cdn.jsdelivr.net/npm/d3@7/dist/d3.min.js"),
+    "topojson": ("topojson-client.min.js", "https://cdn.jsdelivr.net/npm/topojson-client@3/dist/topojson-client.min.js"),
+}
+PERU_GEOJSON_FILE = "peru.geo.json"
+# assets registrados en runtime (módulos JS de gráficos, bridge):
+# nombre -> (código, guard)
+_REGISTERED = {}
+
+_MODES = ("auto", "inline", "cdn")
+# prefijo de las copias en localStorage (modo "auto")
+_STORAGE_PREFIX = "ourlib-asset:"
+_state = {"mode": "auto", "injected": set(), "cache": {}, "override": {}}
+
+
+def set_asset_mode(mode: str = "auto"):
+    """
+    "auto"   → inline, una vez por sesión (siempre en Colab)
+    "inline" → inline en cada salida (notebooks que se comparten/exportan)
+    "cdn"    → <script src> al CDN, como en versiones anteriores
+    """
+    if mode not in _MODES:
+        raise ValueError(f"mode debe ser uno de {_MODES}")
+    _state["mode"] = mode
+    _state["injected"].clear()
+
+
+def register_asset(name: str, code: str, guard: str = None):
+    """
+    Registra JS propio como asset inline (se inyecta como los vendorizados:
+    una vez por sesión en modo "auto"). `guard`: expresión JS que, si es
+    verdadera, indica que el asset ya está definido en el documento.
+    """
+    if name in SCRIPT_ASSETS or name in ("columnar", "peru"):
+        raise ValueError(f"Nombre de asset reservado: {name}")
+    if _REGISTERED.get(name) != (code, guard):
+        _REGISTERED[name] = (code, guard)
+        _state["injected"].discard(name)
+
+
+@contextmanager
+def standalone_document(overrides: dict = None):
+    """
+    Dentro del with, asset_tags() escribe para un documento nuevo: inline y
+    una sola vez cada asset, aunque ya se haya inyectado en la sesión.
+    overrides: {nombre: texto} que reemplaza al código de un asset
+    registrado o al contenido de un archivo vendorizado ("d3", "topojson",
+    "peru").
+    Al salir se restaura el modo y lo inyectado en la sesión.
+    """
+    saved = (_state["mode"], _state["injected"], _state["override"])
+    _state["mode"] = "document"
+    _state["injected"] = set()
+    _state["override"] = dict(overrides or {})
+    try:
+        yield
+    finally:
+        _state["mode"], _state["injected"], _state["override"] = saved
+
+
+def reset_asset_cache():
+    """Fuerza a reinyectar los assets en la próxima salida (p.ej. tras recargar la página)."""
+    _state["injected"].clear()
+    _state["cache"].clear()
+
+
+def _read_static(filename: str):
+    cache = _state["cache"]
+    if filename not in cache:
+        path = STATIC_DIR / filename
+        cache[filename] = path.read_text(encoding="utf-8") if path.exists() else None
+    return cache[filename]
+
+
+def _wrap(code: str, guard: str = None, umd: bool = False) -> str:
+    code = code.replace("</script", "<\\/script")
+    if umd:
+        # ocultamos define/module/exports (RequireJS del notebook clásico) para
+        # que el bundle UMD se registre como global window.<name>
+        code = f"(function(define, module, exports) {{\n{code}\n}}).call(window);"
+    if guard:
+        code = f"if (!({guard})) {{\n{code}\n}}"
+    return code
+
+
+# Al final de la primera copia (modo "auto"): guarda el texto del <script>
+# en localStorage y borra las versiones anteriores del mismo asset. Solo el
+# <script data-ourlib-asset> se guarda (no el restaurador que lo re-evalúa).
+_PERSIST_JS = """try {
+  var __s = document.currentScript, __k = %s;
+  if (__s && __s.dataset.ourlibAsset && window.localStorage) {
+    var __p = %s;
+    for (var __i = localStorage.length - 1; __i >= 0; __i--) {
+      var __o = localStorage.key(__i);
+      if (__o && __o.indexOf(__p) === 0 && __o !== __k) localStorage.removeItem(__o);
+    }
+    localStorage.setItem(__k, __s.textContent);
+  }
+} catch (e) {}"""
+
+# Salidas siguientes: si el documento no tiene el asset, se restaura.
+_RESTORE_JS = """<script data-ourlib-restore="%(name)s">
+if (!(%(guard)s)) {
+  try { (0, eval)(window.localStorage.getItem(%(key)s) || ""); } catch (e) { console.warn(e); }
+  if (!(%(guard)s)) console.warn("ourlib: falta el asset %(name)s en esta página; "
+    + "ejecuta our_library.reset_asset_cache() y vuelve a mostrar el gráfico");
+}
+</script>"""
+
+
+def _storage_key(name: str, code: str) -> str:
+    return f"{_STORAGE_PREFIX}{name}:{hashlib.sha1(code.encode('utf-8')).hexdigest()[:12]}"
+
+
+def _static_text(name: str, filename: str, mode: str):
+    """Contenido del archivo vendorizado (o su reemplazo); None = usar el CDN."""
+    override = _state["override"].get(name)
+    if override is not None:
+        return override
+    return _read_static(filename) if mode != "cdn" else None
+
+
+def _asset_source(name: str, mode: str):
+    """
+    ("inline", código con guard, guard), ("src", url, None) o None si el
+    asset no hace falta en este modo.
+    """
+    override = _state["override"].get(name)
+    if override is not None and name not in SCRIPT_ASSETS and name != "peru":
+        return "inline", _wrap(override), None
+    if name == "columnar":
+        return "inline", _wrap(COLUMNAR_DECODER_JS), "window.__ourlibColumnar"
+    if name in _REGISTERED:
+        code, guard = _REGISTERED[name]
+        return "inline", _wrap(code, guard=guard), guard
+    if name == "peru":
+        geo = _static_text(name, PERU_GEOJSON_FILE, mode)
+        if geo is None:
+            return None  # el mapa descarga world-atlas (una vez por documento)
+        guard = "window.__ourlibPeru"
+        return "inline", _wrap(f"window.__ourlibPeru = {geo};", guard=guard), guard
+    if name not in SCRIPT_ASSETS:
+        raise KeyError(f"Asset desconocido: {name}")
+    if name == "topojson" and _static_text("peru", PERU_GEOJSON_FILE, mode) is not None:
+        return None  # solo lo usa la descarga de world-atlas
+    filename, url = SCRIPT_ASSETS[name]
+    code = _static_text(name, filename, mode)
+    if code is None:
+        return "src", url, None
+    guard = f"window.{name}"
+    return "inline", _wrap(code, guard=guard, umd=True), guard
+
+
+def _asset_html(name: str, mode: str, persist: bool = False):
+    """Devuelve (html, es_inline)."""
+    src = _asset_source(name, mode)
+    if src is None:
+        return "", False
+    kind, code, guard = src
+    if kind == "src":
+        return f'<script src="{code}"></script>', False
+    if persist and guard:
+        code += "\n" + _PERSIST_JS % (json.dumps(_storage_key(name, code)),
+                                      json.dumps(f"{_STORAGE_PREFIX}{name}:"))
+    return f'<script data-ourlib-asset="{name}">\n{code}\n</script>', True
+
+
+def _restore_html(name: str, mode: str) -> str:
+    """Guard + restauración desde localStorage de un asset ya inyectado."""
+    src = _asset_source(name, mode)
+    if src is None or src[0] != "inline" or not src[2]:
+        return ""
+    _, code, guard = src
+    return _RESTORE_JS % {"name": name, "guard": guard,
+                          "key": json.dumps(_storage_key(name, code))}
+
+
+def asset_tags(*names: str) -> str:
+    """
+    HTML con los <script> necesarios para `names` (p.ej. "d3", "topojson",
+    "peru", "columnar"). En modo "auto" fuera de Colab los assets inline ya
+    inyectados en esta sesión van solo como guard + restauración desde
+    localStorage (por si la página se recargó); en un documento exportado
+    se omiten.
+    """
+    mode = _state["mode"]
+    session = mode == "auto" and not _IN_COLAB
+    once = session or mode == "document"
+    parts = []
+    for name in names:
+        if once and name in _state["injected"]:
+            if session:
+                parts.append(_restore_html(name, mode))
+            continue
+        html, inline = _asset_html(name, mode, persist=session)
+        if once and inline:
+            _state["injected"].add(name)
+        if html:
+            parts.append(html)
+    return "\n".join(parts)
+
+
+# JS compartido: promesa única por documento con el GeoJSON de Perú.
+PERU_GEOMETRY_JS = """
+function ourlibPeruGeometry() {
+  if (window.__ourlibPeruPromise) return window.__ourlibPeruPromise;
+  const p = window.__ourlibPeru
+    ? Promise.resolve(window.__ourlibPeru)
+    : d3.json("%s").then(world => {
+        const countries = topojson.feature(world, world.objects.countries);
+        return countries.features.find(f => f.id === "%s") ||
+               countries.features.find(f => (f.properties && f.properties.name === "Peru"));
+      });
+  window.__ourlibPeruPromise = p.catch(err => {
+    window.__ourlibPeruPromise = null;  // permitir reintento en el próximo render
+    throw err;
+  });
+  return window.__ourlibPeruPromise;
+}
+""" % (WORLD_ATLAS_URL, PERU_ISO_NUMERIC)
+
+
+# ------------------------------------------------------------------
+#  Vendorizado (requiere red; se ejecuta al preparar un release)
+# ------------------------------------------------------------------
+
+def _decode_arcs(topology: dict):
+    tr = topology.get("transform")
+    arcs = []
+    for arc in topology["arcs"]:
+        pts = []
+        x = y = 0
+        for p in arc:
+            if tr:
+                x += p[0]
+                y += p[1]
+                pts.append([x * tr["scale"][0] + tr["translate"][0],
+                            y * tr["scale"][1] + tr["translate"][1]])
+            else:
+                pts.append([p[0], p[1]])
+        arcs.append(pts)
+    return arcs
+
+
+def _ring(arcs, idxs, digits: int):
+    ring = []
+    for i in idxs:
+        pts = arcs[i] if i >= 0 else arcs[~i][::-1]
+        for k, p in enumerate(pts):
+            if ring and k == 0:
+                continue  # el primer punto de cada arco repite el último del anterior
+            q = [round(p[0], digits), round(p[1], digits)]
+            if not ring or ring[-1] != q:
+                ring.append(q)
+    if ring and ring[0] != ring[-1]:
+        ring.append(ring[0])
+    return ring
+
+
+def peru_geojson_from_world_atlas(world: dict, digits: int = 3) -> dict:
+    """
+    Extrae Perú del TopoJSON de world-atlas como Feature GeoJSON, con las
+    coordenadas redondeadas a `digits` decimales (~100 m con 3).
+    """
+    arcs = _decode_arcs(world)
+    geoms = world["objects"]["countries"]["geometries"]
+    g = next((g for g in geoms if str(g.get("id")) == PERU_ISO_NUMERIC), None)
+    if g is None:
+        g = next(g for g in geoms if (g.get("properties") or {}).get("name") == "Peru")
+    if g["type"] == "Polygon":
+        coords = [_ring(arcs, r, digits) for r in g["arcs"]]
+    elif g["type"] == "MultiPolygon":
+        coords = [[_ring(arcs, r, digits) for r in poly] for poly in g["arcs"]]
+    else:
+        raise ValueError(f"Geometría inesperada para Perú: {g['type']}")
+    return {
+        "type": "Feature",
+        "id": PERU_ISO_NUMERIC,
+        "properties": {"name": "Peru"},
+        "geometry": {"type": g["type"], "coordinates": coords},
+    }
+
+
+def vendor_static_assets(force: bool = False) -> list:
+    """Descarga D3, topojson-client y genera peru.geo.json en _static/."""
+    from urllib.request import urlopen
+
+    STATIC_DIR.mkdir(exist_ok=True)
+    written = []
+    for filename, url in SCRIPT_ASSETS.values():
+        path = STATIC_DIR / filename
+        if path.exists() and not force:
+            continue
+        with urlopen(url) as resp:
+            path.write_bytes(resp.read())
+        written.append(path.name)
+
+    path = STATIC_DIR / PERU_GEOJSON_FILE
+    if force or not path.exists():
+        with urlopen(WORLD_ATLAS_URL) as resp:
+            world = json.loads(resp.read().decode("utf-8"))
+        geo = peru_geojson_from_world_atlas(world)
+        path.write_text(json.dumps(geo, separators=(",", ":")), encoding="utf-8")
+        written.append(path.name)
+
+    reset_asset_cache()
+    return written
+
+
+if __name__ == "__main__":
+    import sys
+    out = vendor_static_assets(force="--force" in sys.argv)
+    print("Vendorizados:", ", ".join(out) if out else "(nada nuevo)")
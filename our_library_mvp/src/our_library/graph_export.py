@@ -0,0 +1,111 @@
+# src/our_library/graph_export.py
+
+"""
+Exportación de dashboards a un único HTML autocontenido.
+
+export_dashboard() renderiza el dashboard (y los gráficos extra que se le
+pasen) dentro de graph_assets.standalone_document(): D3, topojson, la
+geometría de Perú, el decoder columnar y los módulos de gráficos van
+inline una sola vez en el archivo; los datos viajan en el payload
+columnar comprimido; y el bridge JS → Python se reemplaza por uno que
+descarta los eventos (los paneles siguen enlazados entre sí, pero nada
+sale del navegador). El archivo se puede publicar en cualquier servidor
+estático, sin kernel ni Flask.
+
+Si algún asset no está vendorizado en _static/ (y no se pasa con
+assets=...), export_dashboard falla en vez de escribir un HTML que dependa
+del CDN.
+"""
+
+import html
+from pathlib import Path
+
+from .graph_assets import SCRIPT_ASSETS, standalone_document
+
+# mismo API que el bridge de graph2_1 (send / flush / sender), sin red
+NOOP_BRIDGE_JS = """
+// export estático: no hay kernel, los eventos se descartan
+if (!window.__ourlibBridge) {
+  window.__ourlibBridge = {
+    send() {},
+    flush() {},
+    sender() { return function() {}; }
+  };
+}
+"""
+
+_PAGE = """<!DOCTYPE html>
+<html lang="es">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>{title}</title>
+</head>
+<body style="margin:16px; font-family:system-ui;">
+{body}
+</body>
+</html>
+"""
+
+
+def _chart_html(chart) -> str:
+    if callable(chart):
+        chart = chart()
+    return getattr(chart, "data", chart) or ""
+
+
+def _read_assets(assets) -> dict:
+    """{nombre: ruta} -> {nombre: contenido} para standalone_document."""
+    out = {}
+    for name, file in (assets or {}).items():
+        if name not in SCRIPT_ASSETS and name != "peru":
+            raise ValueError(f"Asset no reemplazable: {name!r} (usa {sorted(SCRIPT_ASSETS)} o 'peru')")
+        file = Path(file)
+        if not file.exists():
+            raise FileNotFoundError(f"No encuentro el asset {name}: {file}")
+        out[name] = file.read_text(encoding="utf-8")
+    return out
+
+
+def export_dashboard(path, nodes=None, links=None, charts=(),
+                     title: str = "our_library · dashboard", assets: dict = None,
+                     **kwargs) -> Path:
+    """
+    Escribe en `path` un HTML autocontenido y devuelve la ruta.
+
+    nodes, links : dashboard de show_dashboard_map_force_radar_linked (los
+                   kwargs se le pasan: layout, renderer, rerank, ...); el
+                   payload va siempre columnar y, por defecto, comprimido
+    charts       : gráficos extra, en orden, como funciones sin argumentos
+                   que devuelven el HTML, p.ej.
+                   lambda: show_transport_access(...) o
+                   lambda: show_turismo_dashboard_from_model(valor="25");
+                   así se renderizan para este documento (un HTML ya
+                   mostrado en el notebook puede no traer los assets)
+    assets       : {nombre: ruta} con archivos locales para "d3", "topojson"
+                   o "peru" (GeoJSON de Perú), en lugar de los de _static/
+
+    live no aplica (no hay servidor). Si algún asset quedaría como
+    <script src> al CDN se lanza FileNotFoundError y no se escribe nada.
+    """
+    from .graph2_1 import show_dashboard_map_force_radar_linked
+
+    parts = []
+    with standalone_document({"bridge": NOOP_BRIDGE_JS, **_read_assets(assets)}):
+        if nodes is not None:
+            kwargs["encoding"] = "columnar"
+            kwargs["live"] = False
+            kwargs.setdefault("compress", True)
+            parts.append(show_dashboard_map_force_radar_linked(nodes, links or [], **kwargs).data)
+        parts.extend(_chart_html(c) for c in charts)
+
+    body = "\n".join(p for p in parts if p)
+    if "<script src=" in body:
+        raise FileNotFoundError(
+            "export_dashboard: faltan assets en _static/ y el HTML dependería del CDN; "
+            "genéralos con our_library.vendor_static_assets() o pásalos con assets={nombre: ruta}"
+        )
+
+    path = Path(path)
+    path.write_text(_PAGE.format(title=html.escape(title), body=body), encoding="utf-8")
+    return path
@@ -0,0 +1,216 @@
+# src/our_library/graph_layout.py
+
+"""
+Layout force-directed calculado en Python (NumPy) para grafos grandes.
+
+El dashboard puede recibir coordenadas fijas en vez de correr
+d3.forceSimulation en el navegador. Algoritmo: Fruchterman-Reingold
+vectorizado; para más de EXACT_MAX_NODES nodos la repulsión usa una
+aproximación tipo Barnes-Hut sobre una rejilla (exacta dentro de cada
+celda, centroide ponderado para el resto). El resultado se cachea por
+hash del grafo, así re-renderizar el mismo grafo es instantáneo.
+
+Límite: el primer render no debería trabarse. Por defecto las iteraciones
+bajan con el tamaño (auto_iterations): 150 hasta FULL_ITERATIONS_NODES
+nodos y luego ∝ n^-1.5 (lo que crece el costo por iteración), con un
+mínimo de MIN_ITERATIONS. Referencia: ~0.6 s con 3k nodos y ~1 s con
+10k. Para grafos mucho más grandes conviene layout="browser".
+"""
+
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+
+# hasta aquí la repulsión exacta O(n²) es más rápida que la rejilla
+EXACT_MAX_NODES = 200
+LAYOUT_CACHE_SIZE = 32
+MAX_ITERATIONS = 150
+FULL_ITERATIONS_NODES = 2000
+MIN_ITERATIONS = 30
+# elementos por bloque de las matrices temporales de la repulsión (~caché L2)
+_BLOCK_CELLS = 1 << 17
+
+_layout_cache = OrderedDict()
+
+
+def graph_hash(node_ids, edges, weights=None, **params) -> str:
+    """Hash estable de (ids, aristas, pesos, parámetros) para la caché de layouts."""
+    h = hashlib.sha1()
+    for nid in node_ids:
+        h.update(str(nid).encode("utf-8"))
+        h.update(b"\0")
+    e = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    h.update(e.tobytes())
+    if weights is not None:
+        h.update(np.round(np.asarray(weights, dtype=float), 6).tobytes())
+    h.update(repr(sorted(params.items())).encode("utf-8"))
+    return h.hexdigest()
+
+
+def clear_layout_cache():
+    _layout_cache.clear()
+
+
+def auto_iterations(n: int) -> int:
+    """Iteraciones por defecto para n nodos (ver el límite en el docstring del módulo)."""
+    if n <= FULL_ITERATIONS_NODES:
+        return MAX_ITERATIONS
+    return max(MIN_ITERATIONS, int(MAX_ITERATIONS * (FULL_ITERATIONS_NODES / n) ** 1.5))
+
+
+def _repulsion_exact(pos, k2):
+    dx = pos[:, 0, None] - pos[None, :, 0]
+    dy = pos[:, 1, None] - pos[None, :, 1]
+    w = dx * dx + dy * dy
+    np.fill_diagonal(w, np.inf)
+    np.divide(k2, np.maximum(w, 1e-9, out=w), out=w)
+    return np.stack([(dx * w).sum(axis=1), (dy * w).sum(axis=1)], axis=1)
+
+
+def _repulsion_grid(pos, k2):
+    n = len(pos)
+    # g² ~ √n equilibra campo lejano (n·g²) y cercano (n²/g²)
+    g = max(2, int(np.ceil(1.5 * n ** 0.25)))
+    # celdas de igual población (franjas por cuantiles de x, luego de y):
+    # el layout se concentra en el centro y una rejilla uniforme dejaría
+    # casi todos los nodos en pocas celdas
+    rank = np.empty(n, dtype=np.int64)
+    rank[np.argsort(pos[:, 0], kind="stable")] = np.arange(n)
+    strip = rank * g // n
+    order = np.lexsort((pos[:, 1], strip))
+    within = np.empty(n, dtype=np.int64)
+    counts = np.bincount(strip, minlength=g)
+    within[order] = np.arange(n) - np.repeat(np.cumsum(counts) - counts, counts)
+    own = strip * g + within * g // counts[strip]
+    real = np.bincount(own, minlength=g * g).astype(float)
+    mass = np.maximum(real, 1.0)  # celdas vacías: real = 0, no empujan
+    cx = np.bincount(own, weights=pos[:, 0], minlength=g * g) / mass
+    cy = np.bincount(own, weights=pos[:, 1], minlength=g * g) / mass
+
+    # campo lejano: cada celda como un punto de masa `real` en su centroide.
+    # Matrices (nodos x g²) en float32 y por bloques de filas que entren en
+    # caché: así la memoria que se mueve por iteración es chica
+    p32 = pos.astype(np.float32)
+    cx32, cy32, real32 = cx.astype(np.float32), cy.astype(np.float32), real.astype(np.float32)
+    far = np.empty((n, 2), dtype=np.float32)
+    step = max(1, _BLOCK_CELLS // (g * g))
+    for a in range(0, n, step):
+        b = min(a + step, n)
+        dx = p32[a:b, 0, None] - cx32
+        dy = p32[a:b, 1, None] - cy32
+        w = dx * dx
+        w += dy * dy
+        np.divide(real32, np.maximum(w, 1e-9, out=w), out=w)
+        w[np.arange(b - a), own[a:b]] = 0.0
+        far[a:b, 0] = np.einsum("ij,ij->i", dx, w)
+        far[a:b, 1] = np.einsum("ij,ij->i", dy, w)
+    force = k2 * far.astype(np.float64)
+
+    # campo cercano: exacto entre nodos de la misma celda. Las celdas tienen
+    # casi la misma población, así que van en bloques densos (celda, m, m)
+    cells = g * g
+    by_cell = np.argsort(own, kind="stable")
+    cell_n = np.bincount(own, minlength=cells)
+    slot = np.arange(n) - np.repeat(np.cumsum(cell_n) - cell_n, cell_n)
+    cell = own[by_cell]
+    m = int(cell_n.max())
+    bx = np.zeros((cells, m))
+    by = np.zeros((cells, m))
+    valid = np.zeros((cells, m), dtype=bool)
+    bx[cell, slot] = pos[by_cell, 0]
+    by[cell, slot] = pos[by_cell, 1]
+    valid[cell, slot] = True
+    other = ~np.eye(m, dtype=bool)
+    fx = np.empty((cells, m))
+    fy = np.empty((cells, m))
+    step = max(1, _BLOCK_CELLS // (m * m))
+    for a in range(0, cells, step):
+        b = min(a + step, cells)
+        dx = bx[a:b, :, None] - bx[a:b, None, :]
+        dy = by[a:b, :, None] - by[a:b, None, :]
+        f = dx * dx
+        f += dy * dy
+        np.divide(k2, np.maximum(f, 1e-9, out=f), out=f)
+        f *= valid[a:b, :, None] & valid[a:b, None, :] & other
+        fx[a:b] = np.einsum("cij,cij->ci", dx, f)
+        fy[a:b] = np.einsum("cij,cij->ci", dy, f)
+    force[by_cell, 0] += fx[cell, slot]
+    force[by_cell, 1] += fy[cell, slot]
+    return force
+
+
+def force_layout(node_ids, edges, weights=None, iterations: int = None,
+                 seed: int = 0, use_cache: bool = True) -> np.ndarray:
+    """
+    Posiciones (n, 2) normalizadas a [0, 1] para `node_ids`.
+
+    edges: pares (i, j) de índices sobre node_ids.
+    weights: peso por arista (más peso ⇒ más atracción); por defecto 1.
+    iterations: None = auto_iterations(n) (menos iteraciones en grafos grandes).
+    """
+    n = len(node_ids)
+    if iterations is None:
+        iterations = auto_iterations(n)
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    w = np.ones(len(edges)) if weights is None else np.asarray(weights, dtype=float)
+    if n == 0:
+        return np.zeros((0, 2))
+
+    key = graph_hash(node_ids, edges, w, iterations=iterations, seed=seed) if use_cache else None
+    if key is not None and key in _layout_cache:
+        _layout_cache.move_to_end(key)
+        return _layout_cache[key].copy()
+
+    rng = np.random.default_rng(seed)
+    pos = rng.random((n, 2))
+    k = np.sqrt(1.0 / n)
+    k2 = k * k
+    repulse = _repulsion_exact if n <= EXACT_MAX_NODES else _repulsion_grid
+    src, dst = edges[:, 0], edges[:, 1]
+    temp = 0.1
+
+    for it in range(iterations):
+        disp = repulse(pos, k2)
+        if len(edges):
+            delta = pos[src] - pos[dst]
+            dist = np.sqrt(np.einsum("ij,ij->i", delta, delta)) + 1e-9
+            pull = delta * (w * dist / k)[:, None]
+            for ax in (0, 1):
+                disp[:, ax] -= np.bincount(src, weights=pull[:, ax], minlength=n)
+                disp[:, ax] += np.bincount(dst, weights=pull[:, ax], minlength=n)
+        # leve gravedad al centro para que las componentes no se dispersen
+        disp -= (pos - 0.5) * (0.05 * n * k)
+
+        length = np.sqrt(np.einsum("ij,ij->i", disp, disp)) + 1e-9
+        step = temp * (1.0 - it / iterations)
+        pos += disp * (np.minimum(length, step) / length)[:, None]
+
+    lo = pos.min(axis=0)
+    span = pos.max(axis=0) - lo
+    span[span == 0] = 1.0
+    pos = (pos - lo) / span
+
+    if key is not None:
+        _layout_cache[key] = pos.copy()
+        while len(_layout_cache) > LAYOUT_CACHE_SIZE:
+            _layout_cache.popitem(last=False)
+    return pos
+
+
+def layout_for_links(nodes, links, weight: str = "similarity", **kwargs) -> np.ndarray:
+    """force_layout a partir de nodos/enlaces en el formato del dashboard."""
+    ids = [str(nd.get("id")) for nd in nodes]
+    pos_of = {nid: i for i, nid in enumerate(ids)}
+    edges, weights = [], []
+    for l in links:
+        i = pos_of.get(str(l.get("source")))
+        j = pos_of.get(str(l.get("target")))
+        if i is None or j is None or i == j:
+            continue
+        edges.append((i, j))
+        try:
+            weights.append(max(float(l.get(weight, 1.0) or 0.0), 0.0) + 0.1)
+        except (TypeError, ValueError):
+            weights.append(1.0)
+    return force_layout(ids, edges, weights, **kwargs)
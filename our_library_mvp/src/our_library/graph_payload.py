@@ -0,0 +1,283 @@
+# src/our_library/graph_payload.py
+
+"""
+Codificación columnar compacta para los datos que se embeben en el HTML
+de los dashboards.
+
+En vez de JSON orientado a filas se envía:
+  - un diccionario de valores por columna de texto + códigos Int32; los
+    valores numéricos (p.ej. ids 2, 17) y booleanos quedan como tales en el
+    diccionario, así que vuelven a Python (clicks, diffs) con el mismo tipo
+    que en el modo json (los enteros que JS no representa exactos, como
+    texto)
+  - columnas numéricas como Float32 / Int32
+  - todos los buffers concatenados en un único blob base64, opcionalmente
+    comprimido con gzip (el navegador lo descomprime con DecompressionStream)
+
+El JS correspondiente está en COLUMNAR_DECODER_JS (se registra una sola vez
+como window.__ourlibColumnar).
+"""
+
+import base64
+import gzip
+import json
+import math
+import numbers
+import sys
+from array import array
+
+FORMAT_VERSION = 1
+
+# por debajo de este tamaño gzip no compensa el coste de descomprimir
+GZIP_MIN_BYTES = 32 * 1024
+
+# campos que realmente lee el dashboard mapa+force+SCORE
+DASHBOARD_NODE_COLUMNS = {
+    "id": "str",
+    "name": "str",
+    "region": "str",
+    "url": "str",
+    "lat": "f32",
+    "lon": "f32",
+    "want_to_go": "f32",
+    "SCORE": "f32",
+}
+
+DASHBOARD_LINK_COLUMNS = {
+    "source": "str",
+    "target": "str",
+    "similarity": "f32",
+}
+
+# pool de candidatos para re-puntuar en el navegador (sliders del dashboard)
+RERANK_POOL_COLUMNS = {
+    "id": "str",
+    "name": "str",
+    "region": "str",
+    "url": "str",
+    "lat": "f32",
+    "lon": "f32",
+    "sim": "f32",
+    "dist_km": "f32",
+    "same_rg": "i32",
+    "fb": "f32",
+}
+
+
+def _to_float(v) -> float:
+    if v is None:
+        return math.nan
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+_INT32 = (-2**31, 2**31 - 1)
+# enteros que un Number de JS representa exactos (Number.MAX_SAFE_INTEGER)
+_JS_SAFE_INT = 2**53 - 1
+
+
+def _to_int(v) -> int:
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        return -1
+
+
+def _int32_column(name: str, values) -> array:
+    out = array("i")
+    for v in values:
+        v = _to_int(v)
+        if not _INT32[0] <= v <= _INT32[1]:
+            raise ValueError(f"Columna {name!r} (i32): {v} no entra en Int32; usa 'f32' o 'str'")
+        out.append(v)
+    return out
+
+
+def _dict_value(v):
+    """Valor para el diccionario de una columna "str": número, bool o string (None = nulo)."""
+    if v is None or isinstance(v, bool):
+        return v
+    if isinstance(v, numbers.Integral):
+        v = int(v)
+        return v if abs(v) <= _JS_SAFE_INT else str(v)
+    if isinstance(v, numbers.Real):
+        v = float(v)
+        return v if math.isfinite(v) else None
+    return str(v)
+
+
+def _encode_column(values, kind: str, name: str = ""):
+    """Devuelve (array tipado de 4 bytes/elemento, meta extra)."""
+    if kind == "f32":
+        return array("f", (_to_float(v) for v in values)), {}
+    if kind == "i32":
+        return _int32_column(name, values), {}
+    if kind == "str":
+        lookup = {}
+        codes = array("i")
+        for v in values:
+            v = _dict_value(v)
+            if v is None:
+                codes.append(-1)
+                continue
+            # (tipo, valor): 2, "2" y True son entradas distintas
+            key = (type(v), v)
+            code = lookup.get(key)
+            if code is None:
+                code = lookup[key] = len(lookup)
+            codes.append(code)
+        return codes, {"dict": [v for _, v in lookup]}
+    raise ValueError(f"Tipo de columna no soportado: {kind!r} (usa 'f32', 'i32' o 'str')")
+
+
+def pack_columnar(tables: dict, arrays: dict = None, compress=None) -> dict:
+    """
+    Empaqueta tablas y arrays de enteros en un payload columnar.
+
+    tables : {nombre: (records, {columna: "f32" | "i32" | "str"}[, {columna: valores}])}
+             el tercer elemento opcional aporta columnas calculadas aparte
+             (p.ej. posiciones) sin copiar los records
+    arrays : {nombre: secuencia de enteros}  (se envían como Int32Array)
+    compress : True / False / None (None = gzip solo si el blob es grande)
+    """
+    chunks = []
+    offset = 0
+    header = {"format": "columnar", "v": FORMAT_VERSION, "tables": {}, "arrays": {}}
+
+    def _add(buf):
+        nonlocal offset
+        assert buf.itemsize == 4
+        if sys.byteorder != "little":
+            buf.byteswap()
+        pos = offset
+        raw = buf.tobytes()
+        chunks.append(raw)
+        offset += len(raw)
+        return pos
+
+    for name, (records, columns, *rest) in tables.items():
+        given = rest[0] if rest else {}
+        cols = []
+        for col, kind in columns.items():
+            values = given[col] if col in given else (r.get(col) for r in records)
+            buf, extra = _encode_column(values, kind, col)
+            cols.append({"name": col, "type": kind, "offset": _add(buf), **extra})
+        header["tables"][name] = {"n": len(records), "cols": cols}
+
+    for name, values in (arrays or {}).items():
+        buf = array("i", values)
+        header["arrays"][name] = {"n": len(buf), "offset": _add(buf)}
+
+    blob = b"".join(chunks)
+    if compress is None:
+        compress = len(blob) >= GZIP_MIN_BYTES
+    if compress:
+        blob = gzip.compress(blob, compresslevel=6, mtime=0)
+    header["gzip"] = bool(compress)
+    header["data"] = base64.b64encode(blob).decode("ascii")
+    return header
+
+
+def pack_json(tables: dict, arrays: dict = None) -> dict:
+    """Mismo contrato que pack_columnar pero en JSON plano (depuración)."""
+    out = {"format": "json"}
+    for name, (records, columns, *rest) in tables.items():
+        given = rest[0] if rest else {}
+        rows = [{c: r.get(c) for c in columns if c not in given} for r in records]
+        for c, values in given.items():
+            for row, v in zip(rows, values):
+                row[c] = v
+        out[name] = rows
+    for name, values in (arrays or {}).items():
+        out[name] = list(values)
+    return out
+
+
+def payload_to_json(payload: dict) -> str:
+    """Serializa el payload para incrustarlo en un <script>."""
+    return json.dumps(payload, default=str, ensure_ascii=False).replace("</", "<\\/")
+
+
+# ------------------------------------------------------------------
+#  Decoder JS (se registra una vez por documento)
+# ------------------------------------------------------------------
+
+COLUMNAR_DECODER_JS = r"""
+(function() {
+  if (window.__ourlibColumnar) return;
+
+  function b64ToBytes(s) {
+    const bin = atob(s);
+    const out = new Uint8Array(bin.length);
+    for (let i = 0; i < bin.length; i++) out[i] = bin.charCodeAt(i);
+    return out;
+  }
+
+  async function inflate(bytes) {
+    if (typeof DecompressionStream === "undefined") {
+      throw new Error("Este navegador no soporta DecompressionStream (gzip).");
+    }
+    const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream("gzip"));
+    return await new Response(stream).arrayBuffer();
+  }
+
+  // -> { tables: {name: {n, columns: {col: Float32Array | Int32Array | {codes, dict}}}},
+  //      arrays: {name: Int32Array} }
+  async function decode(p) {
+    const bytes = b64ToBytes(p.data || "");
+    const buf = p.gzip ? await inflate(bytes) : bytes.buffer;
+    const tables = {};
+    for (const [name, t] of Object.entries(p.tables || {})) {
+      const columns = {};
+      for (const c of t.cols) {
+        if (c.type === "f32") {
+          columns[c.name] = new Float32Array(buf, c.offset, t.n);
+        } else if (c.type === "str") {
+          columns[c.name] = { codes: new Int32Array(buf, c.offset, t.n), dict: c.dict };
+        } else {
+          columns[c.name] = new Int32Array(buf, c.offset, t.n);
+        }
+      }
+      tables[name] = { n: t.n, columns };
+    }
+    const arrays = {};
+    for (const [name, a] of Object.entries(p.arrays || {})) {
+      arrays[name] = new Int32Array(buf, a.offset, a.n);
+    }
+    return { tables, arrays };
+  }
+
+  function toRows(table) {
+    const names = Object.keys(table.columns);
+    const rows = new Array(table.n);
+    for (let i = 0; i < table.n; i++) {
+      const row = {};
+      for (const k of names) {
+        const col = table.columns[k];
+        if (col.codes) {
+          const code = col.codes[i];
+          row[k] = code < 0 ? null : col.dict[code];
+        } else {
+          row[k] = col[i];
+        }
+      }
+      rows[i] = row;
+    }
+    return rows;
+  }
+
+  // Devuelve {tabla: [filas], array: [enteros]} para ambos formatos (columnar / json)
+  async function load(p) {
+    if (!p || p.format !== "columnar") return p;
+    const dec = await decode(p);
+    const out = {};
+    for (const [name, t] of Object.entries(dec.tables)) out[name] = toRows(t);
+    for (const [name, a] of Object.entries(dec.arrays)) out[name] = Array.from(a);
+    return out;
+  }
+
+  window.__ourlibColumnar = { decode, toRows, load };
+})();
+"""
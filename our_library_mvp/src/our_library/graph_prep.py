@@ -0,0 +1,133 @@
+# src/our_library/graph_prep.py
+
+"""
+Preparación de datos de grafo (lado Python) antes de serializarlos al JS
+de los dashboards.
+"""
+
+import heapq
+
+import numpy as np
+
+
+def top_link_indices(nodes, links, k: int = 3, weight: str = "similarity"):
+    """
+    Índices (en `links`) de la unión de las k aristas (entrantes o salientes)
+    de mayor `weight` de cada nodo, sin duplicados.
+
+    La adyacencia source/target se indexa una sola vez (O(L)) y cada nodo
+    elige su top-k con un heap sobre sus propias aristas, en vez de recorrer
+    la lista completa de enlaces por nodo. Los duplicados se eliminan por
+    la tupla (source, target), conservando el orden de aparición.
+
+    A igualdad de peso se respeta el orden original: primero las salientes
+    y luego las entrantes, cada grupo en el orden de `links`.
+    """
+    outgoing = {}
+    incoming = {}
+    for i, l in enumerate(links):
+        outgoing.setdefault(l.get("source"), []).append(i)
+        incoming.setdefault(l.get("target"), []).append(i)
+
+    weights = [l.get(weight, 0) for l in links]
+    selected = {}
+    for node in nodes:
+        nid = node.get("id")
+        cand = outgoing.get(nid, []) + incoming.get(nid, [])
+        for i in heapq.nlargest(k, cand, key=weights.__getitem__):
+            l = links[i]
+            selected.setdefault((l.get("source"), l.get("target")), i)
+    return list(selected.values())
+
+
+def top_links_per_node(nodes, links, k: int = 3, weight: str = "similarity"):
+    """Como top_link_indices pero devuelve los diccionarios de enlace."""
+    return [links[i] for i in top_link_indices(nodes, links, k=k, weight=weight)]
+
+
+def grid_clusters(lat, lon, labels=None, base_deg: float = 2.0, levels: int = 5):
+    """
+    Clusters jerárquicos sobre una rejilla regular de lat/lon.
+
+    El nivel l usa celdas de base_deg / 2**l grados alineadas al origen,
+    así cada celda se parte exactamente en (hasta) 4 en el nivel siguiente.
+    labels: códigos enteros por punto (>= 0) para la etiqueta dominante.
+
+    Devuelve una lista con un dict por nivel, con arrays:
+      lat, lon : centroide de los puntos de la celda
+      count    : puntos en la celda
+      label    : código más frecuente en la celda (-1 sin labels)
+      member   : índice de un punto de la celda (útil si count == 1)
+    """
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    codes = None if labels is None else np.asarray(labels, dtype=np.int64)
+    out = []
+    for level in range(levels):
+        size = base_deg / (2 ** level)
+        cy = np.floor(lat / size).astype(np.int64)
+        cx = np.floor(lon / size).astype(np.int64)
+        _, cell, count = np.unique(np.stack([cy, cx], axis=1), axis=0,
+                                   return_inverse=True, return_counts=True)
+        cell = cell.ravel()
+        m = len(count)
+        c_lat = np.bincount(cell, weights=lat, minlength=m) / count
+        c_lon = np.bincount(cell, weights=lon, minlength=m) / count
+        member = np.zeros(m, dtype=np.int64)
+        member[cell[::-1]] = np.arange(len(cell))[::-1]  # primer punto de cada celda
+
+        label = np.full(m, -1, dtype=np.int64)
+        if codes is not None and len(codes):
+            n_codes = int(codes.max()) + 1
+            pair, pair_count = np.unique(cell * n_codes + codes, return_counts=True)
+            p_cell, p_code = np.divmod(pair, n_codes)
+            # por celda, el par con más puntos (empate: código menor)
+            order = np.lexsort((p_code, -pair_count, p_cell))
+            first = np.r_[True, p_cell[order][1:] != p_cell[order][:-1]]
+            label[p_cell[order][first]] = p_code[order][first]
+
+        out.append({"lat": c_lat, "lon": c_lon, "count": count,
+                    "label": label, "member": member})
+    return out
+
+
+def lttb(x, y, n_out: int):
+    """
+    Largest-Triangle-Three-Buckets (Steinarsson, 2013) sobre una serie
+    ordenada por x.
+
+    El primer y el último punto se conservan; los demás se reparten en
+    n_out - 2 buckets consecutivos y de cada uno se elige el punto que forma
+    el triángulo de mayor área con el punto elegido en el bucket anterior y
+    el promedio del bucket siguiente (un paso vectorizado por bucket).
+
+    Devuelve (idx, bounds): los n_out índices elegidos y los límites, tal que
+    el punto idx[i] representa a los puntos [bounds[i], bounds[i + 1]).
+    Si n_out >= len(x) se devuelven todos los puntos.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if n_out >= n or n < 3:
+        return np.arange(n), np.arange(n + 1)
+    n_out = max(int(n_out), 3)
+
+    # bordes de los buckets intermedios sobre [1, n - 1)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    bounds = np.concatenate([[0], edges, [n]])
+    idx = np.empty(n_out, dtype=np.int64)
+    idx[0], idx[-1] = 0, n - 1
+
+    # promedio de cada bucket (el último "bucket siguiente" es el punto final)
+    counts = np.diff(bounds)
+    cx = np.add.reduceat(x, bounds[:-1]) / counts
+    cy = np.add.reduceat(y, bounds[:-1]) / counts
+
+    a = 0
+    for b in range(1, n_out - 1):
+        lo, hi = bounds[b], bounds[b + 1]
+        ax, ay = x[a], y[a]
+        area = np.abs((ax - cx[b + 1]) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (cy[b + 1] - ay))
+        a = lo + int(np.argmax(area))
+        idx[b] = a
+    return idx, bounds
@@ -0,0 +1,100 @@
+# src/our_library/graph_templates.py
+
+"""
+Capa de render de los show_*: un módulo JS estático por tipo de gráfico.
+
+Cada ChartModule junta el markup del gráfico (plantilla con marcas
+[CHART_ID], [WIDTH], ...) y el cuerpo de su función de montaje. El código
+se arma una sola vez al importar y se registra como asset (graph_assets),
+así que en modo "auto" se inyecta una vez por sesión como D3. Cada salida
+es solo:
+
+    <div id="chart-..."></div>
+    <script>__ourlibMount("transport-1a2b…", "chart-...", {datos}, {vars})</script>
+
+En el navegador __ourlibMount compila la plantilla del módulo la primera
+vez (split por marcas, cacheado en el módulo), reemplaza el <div> por el
+markup y llama a mount(rootId, payload, vars).
+
+La clave del módulo lleva un hash del código: si el código cambia (nueva
+versión de la librería en el mismo documento) se registra aparte.
+"""
+
+import hashlib
+import json
+
+from .graph_assets import asset_tags, register_asset
+
+RUNTIME_JS = """
+window.__ourlibCharts = window.__ourlibCharts || {};
+window.__ourlibMount = function(key, rootId, payload, vars) {
+  const mod = window.__ourlibCharts[key];
+  const host = document.getElementById(rootId);
+  if (!mod || !host) {
+    console.warn("ourlib: no se pudo montar", key, rootId);
+    return;
+  }
+  vars = vars || {};
+  // plantilla compilada una vez por documento: [literal, marca, literal, ...]
+  if (!mod.parts) mod.parts = mod.markup.split(/\\[([A-Z_]+)\\]/);
+  host.outerHTML = mod.parts.map((s, i) => {
+    if (i % 2 === 0) return s;
+    if (s === "CHART_ID") return rootId;
+    return s in vars ? String(vars[s]) : "[" + s + "]";
+  }).join("");
+  mod.mount(rootId, payload, vars);
+};
+"""
+register_asset("charts", RUNTIME_JS, guard="window.__ourlibMount")
+
+# nombre -> ChartModule (para listar/exportar lo registrado)
+CHART_MODULES = {}
+
+
+def _script_json(value) -> str:
+    """JSON apto para ir dentro de un <script> (sin '</')."""
+    if not isinstance(value, str):
+        value = json.dumps(value, default=str, ensure_ascii=False)
+    return value.replace("</", "<\\/")
+
+
+class ChartModule:
+    """
+    Tipo de gráfico: markup + función de montaje, compilados una vez.
+
+    name   : nombre legible (la clave del asset agrega un hash del código)
+    markup : HTML con [CHART_ID] y marcas [MAYÚSCULAS] que se llenan con
+             `vars` en cada montaje
+    script : cuerpo JS de mount(rootId, payload, vars)
+    deps   : assets que el script necesita antes (p.ej. "d3", "columnar")
+    """
+
+    def __init__(self, name: str, markup: str, script: str, deps=("d3",)):
+        digest = hashlib.sha1((markup + "\0" + script).encode("utf-8")).hexdigest()[:10]
+        self.name = name
+        self.key = f"{name}-{digest}"
+        self.deps = tuple(deps)
+        self.asset = f"chart:{self.key}"
+        self.code = (
+            f"window.__ourlibCharts[{json.dumps(self.key)}] = {{\n"
+            f"  markup: {_script_json(json.dumps(markup.strip(), ensure_ascii=False))},\n"
+            f"  mount: function(rootId, payload, vars) {{\n{script}\n  }}\n"
+            "};"
+        )
+        register_asset(self.asset, self.code, guard=f"window.__ourlibCharts[{json.dumps(self.key)}]")
+        CHART_MODULES[name] = self
+
+    def render(self, chart_id: str, payload, vars: dict = None) -> str:
+        """
+        HTML de una salida: assets que falten + marcador + llamada de montaje.
+        payload: objeto serializable o JSON ya armado (str).
+        """
+        return (
+            asset_tags(*self.deps, "charts", self.asset)
+            + f'\n<div id="{chart_id}"></div>\n<script>\n__ourlibMount('
+            f"{json.dumps(self.key)}, {json.dumps(chart_id)}, "
+            f"{_script_json(payload)}, {_script_json(vars or {})});\n</script>\n"
+        )
+
+    def __repr__(self):
+        return f"ChartModule({self.key!r}, deps={self.deps})"
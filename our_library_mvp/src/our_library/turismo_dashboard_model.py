@@ -1,5 +1,6 @@
 # src/our_library/turismo_dashboard_model.py
 
+import os
 from typing import Optional, List, Tuple
 import numpy as np
 import pandas as pd
@@ -12,7 +13,11 @@ from .turismo_recs import (
     _find_base_idx_by_code,
     _find_base_idx_by_name,
 )
-from .graph2_1 import show_dashboard_map_force_radar_linked
+from .graph2_1 import (
+    push_dashboard_update,
+    show_catalogue_map,
+    show_dashboard_map_force_radar_linked,
+)
 
 # Mismas columnas que el radar de la demo
 RADAR_COLS = [
@@ -45,12 +50,19 @@ def _recommend_core_for_dashboard(
     filter_tipo: Optional[str] = None,
     filter_sub: Optional[str] = None,
     geo_anchor_code: Optional[str] = None,
+    with_pool: bool = False,
+    feedback=None,
+    fb_weight: float = 0.1,
 ) -> Tuple[pd.DataFrame, Optional[int], pd.DataFrame]:
     """
     Misma idea que turismo_recs.recommend(), pero:
       - no imprime
       - no guarda CSV
       - devuelve (df_completo, base_idx, recs_df)
+
+    with_pool=True agrega un cuarto elemento: todos los candidatos (ya
+    filtrados) con SIM_TEXT, DIST_KM y RG_BONUS = misma macro-región, para
+    re-puntuarlos en el navegador (y FB_BONUS si hay feedback).
     """
     tfidf, knn, df = _load_models(model_dir)
 
@@ -79,7 +91,8 @@ def _recommend_core_for_dashboard(
     # rg_mode
     rgm = None if (rg_mode is None or rg_mode == "none") else rg_mode
 
-    # ranking
+    # ranking (sin filtros basta con seleccionar los topk)
+    has_filters = bool(filter_cat or filter_tipo or filter_sub)
     recs = _rank_candidates(
         df,
         base_idx,
@@ -89,6 +102,9 @@ def _recommend_core_for_dashboard(
         geo_km=geo_km,
         rg_mode=rgm,
         rg_weight=rg_weight,
+        topk=None if has_filters else topk,
+        feedback=feedback,
+        fb_weight=fb_weight,
     )
 
     # filtros opcionales
@@ -96,7 +112,15 @@ def _recommend_core_for_dashboard(
 
     # limitar topk
     recs = recs.head(topk).reset_index(drop=False)  # guardamos el índice original en "index"
-    return df, base_idx, recs
+    if not with_pool:
+        return df, base_idx, recs
+
+    # pool: sin recorte ni filtro de macro-región; geo_km=inf solo para que
+    # se calcule DIST_KM, el SCORE de este ranking no se usa
+    pool = _rank_candidates(df, base_idx, idxs, dists, alpha=1.0, geo_km=np.inf,
+                            rg_mode="bonus", rg_weight=0.0, feedback=feedback, fb_weight=0.0)
+    pool = _apply_filters(pool, filter_cat, filter_tipo, filter_sub)
+    return df, base_idx, recs, pool
 
 
 def _row_to_node(row: pd.Series, score_norm: float) -> dict:
@@ -197,6 +221,45 @@ def _build_nodes_and_links_for_dashboard(
     return nodes, links
 
 
+def _rerank_controls(df, base_idx, pool, nodes, topk, alpha, geo_km, rg_mode, rg_weight,
+                     fb_weight=None) -> dict:
+    """
+    Pool de candidatos + parámetros para los sliders del dashboard.
+    fb_weight (solo con feedback): slider extra sobre FB_BONUS del pool.
+    """
+    rows = []
+    for idx, cand in pool.iterrows():
+        node = _row_to_node(df.loc[idx], score_norm=0.5)
+        node["sim"] = float(cand["SIM_TEXT"])
+        node["dist_km"] = float(cand["DIST_KM"])
+        node["same_rg"] = int(cand["RG_BONUS"] > 0)
+        if "FB_BONUS" in cand:
+            node["fb"] = float(cand["FB_BONUS"])
+        rows.append(node)
+
+    params = {
+        "alpha": float(alpha),
+        "geo_km": None if geo_km is None else float(geo_km),
+        "rg_mode": rg_mode or "none",
+        "rg_weight": float(rg_weight),
+    }
+    if fb_weight is not None:
+        params["fb_weight"] = float(fb_weight)
+
+    geo_anchor = False
+    if base_idx is not None and "LATITUD" in df.columns and "LONGITUD" in df.columns:
+        geo_anchor = bool(pd.notna(df.at[base_idx, "LATITUD"]) and pd.notna(df.at[base_idx, "LONGITUD"]))
+
+    return {
+        "pool": rows,
+        "base": nodes[0] if base_idx is not None else None,
+        "topk": int(topk),
+        "params": params,
+        "geo_anchor": geo_anchor,
+        "rg_available": "REGION_GEOGRAFICA" in df.columns and base_idx is not None,
+    }
+
+
 def show_turismo_dashboard_from_model(
     model_dir: str = "models",
     modo: str = "code",
@@ -210,6 +273,10 @@ def show_turismo_dashboard_from_model(
     filter_tipo: Optional[str] = None,
     filter_sub: Optional[str] = None,
     geo_anchor_code: Optional[str] = None,
+    live: bool = False,
+    controls: bool = True,
+    feedback=None,
+    fb_weight: float = 0.1,
 ):
     """
     High-level:
@@ -227,8 +294,20 @@ def show_turismo_dashboard_from_model(
       - Obtener base + recomendaciones (df, base_idx, recs)
       - Convertir a nodos y enlaces
       - Mostrar dashboard mapa+force+radar enlazado
+
+    live=True deja el dashboard suscrito a actualizaciones (requiere
+    start_server()); el HTML devuelto trae .dash_id para
+    update_turismo_dashboard.
+
+    controls=True agrega sliders de alpha / geo_km / rg_weight / rg_mode:
+    el navegador recibe el pool de candidatos de la KNN y re-puntúa el
+    top-k sin volver a Python (los filtros de categoría quedan fijos).
+
+    feedback: ClickFeedback (turismo_feedback) que suma fb_weight·FB_BONUS
+    al SCORE. Los clicks de este dashboard cuentan como afinidad con el
+    recurso base (feedback.attach() para escucharlos).
     """
-    df, base_idx, recs = _recommend_core_for_dashboard(
+    df, base_idx, recs, pool = _recommend_core_for_dashboard(
         model_dir=model_dir,
         modo=modo,
         valor=valor,
@@ -241,7 +320,118 @@ def show_turismo_dashboard_from_model(
         filter_tipo=filter_tipo,
         filter_sub=filter_sub,
         geo_anchor_code=geo_anchor_code,
+        with_pool=True,
+        feedback=feedback,
+        fb_weight=fb_weight,
     )
 
     nodes, links = _build_nodes_and_links_for_dashboard(df, base_idx, recs)
-    return show_dashboard_map_force_radar_linked(nodes, links)
\ No newline at end of file
+    rerank = None
+    if controls:
+        rgm = None if (rg_mode is None or rg_mode == "none") else rg_mode
+        rerank = _rerank_controls(df, base_idx, pool, nodes, topk, alpha, geo_km, rgm, rg_weight,
+                                  fb_weight=fb_weight if feedback is not None else None)
+    out = show_dashboard_map_force_radar_linked(nodes, links, live=live, rerank=rerank)
+    if feedback is not None and base_idx is not None:
+        feedback.set_anchor(out.dash_id, nodes[0]["id"])
+    return out
+
+
+def update_turismo_dashboard(
+    dash_id: str,
+    model_dir: str = "models",
+    modo: str = "code",
+    valor: str = "",
+    topk: int = 20,
+    alpha: float = 1.0,
+    geo_km: Optional[float] = None,
+    rg_mode: Optional[str] = None,
+    rg_weight: float = 0.05,
+    filter_cat: Optional[str] = None,
+    filter_tipo: Optional[str] = None,
+    filter_sub: Optional[str] = None,
+    geo_anchor_code: Optional[str] = None,
+    feedback=None,
+    fb_weight: float = 0.1,
+) -> dict:
+    """
+    Recalcula las recomendaciones con otros parámetros (alpha, geo_km, ...)
+    y manda solo el diff a un dashboard ya montado con live=True:
+
+      html = show_turismo_dashboard_from_model(valor="25", live=True)
+      display(html)
+      update_turismo_dashboard(html.dash_id, valor="25", alpha=0.5, geo_km=40)
+
+    Si el dashboard tiene sliders, se manda además el pool de candidatos
+    del nuevo ranking, así que los sliders re-puntúan el ancla nueva.
+    """
+    df, base_idx, recs, pool = _recommend_core_for_dashboard(
+        model_dir=model_dir,
+        modo=modo,
+        valor=valor,
+        topk=topk,
+        alpha=alpha,
+        geo_km=geo_km,
+        rg_mode=rg_mode,
+        rg_weight=rg_weight,
+        filter_cat=filter_cat,
+        filter_tipo=filter_tipo,
+        filter_sub=filter_sub,
+        geo_anchor_code=geo_anchor_code,
+        with_pool=True,
+        feedback=feedback,
+        fb_weight=fb_weight,
+    )
+
+    nodes, links = _build_nodes_and_links_for_dashboard(df, base_idx, recs)
+    rgm = None if (rg_mode is None or rg_mode == "none") else rg_mode
+    rerank = _rerank_controls(df, base_idx, pool, nodes, topk, alpha, geo_km, rgm, rg_weight,
+                              fb_weight=fb_weight if feedback is not None else None)
+    if feedback is not None and base_idx is not None:
+        feedback.set_anchor(dash_id, nodes[0]["id"])
+    return push_dashboard_update(dash_id, nodes, links, rerank=rerank)
+
+
+# REGION_GEOGRAFICA viene codificada en el parquet
+RG_NAMES = {0: "Costa", 1: "Sierra", 2: "Selva"}
+
+# caja de Perú (descarta coordenadas corruptas del CSV)
+_PERU_LAT = (-18.5, 0.1)
+_PERU_LON = (-81.5, -68.5)
+
+
+def _catalogue_points(df: pd.DataFrame) -> List[dict]:
+    """Puntos {id, name, region, url, group, lat, lon} para show_catalogue_map."""
+    # ⚠️ MINCETUR: LATITUD/LONGITUD invertidas (ver _row_to_node)
+    lat = pd.to_numeric(df["LONGITUD"], errors="coerce")
+    lon = pd.to_numeric(df["LATITUD"], errors="coerce")
+    ok = lat.between(*_PERU_LAT) & lon.between(*_PERU_LON)
+    sub = df.loc[ok]
+
+    if "REGION_GEOGRAFICA" in sub.columns:
+        rg = sub["REGION_GEOGRAFICA"]
+        group = rg.map(RG_NAMES).fillna(rg.astype(str))
+    else:
+        group = pd.Series("", index=sub.index)
+
+    def _col(name, default=""):
+        return sub[name].astype(str).tolist() if name in sub.columns else [default] * len(sub)
+
+    ids = _col("CODE") if "CODE" in sub.columns else [str(i) for i in sub.index]
+    return [
+        {"id": i, "name": n, "region": r, "url": u, "group": g, "lat": la, "lon": lo}
+        for i, n, r, u, g, la, lo in zip(
+            ids, _col("NOMBRE DEL RECURSO"), _col("REGION"), _col("URL"),
+            group.tolist(), lat[ok].tolist(), lon[ok].tolist(),
+        )
+    ]
+
+
+def show_catalogue_map_from_model(model_dir: str = "models", **kwargs):
+    """
+    Mapa del catálogo completo (recursos.parquet del modelo) con clusters
+    por nivel de zoom. kwargs se pasan a show_catalogue_map
+    (levels, base_deg, width, height, ...).
+    """
+    df = pd.read_parquet(os.path.join(model_dir, "recursos.parquet"))
+    return show_catalogue_map(_catalogue_points(df), **kwargs)
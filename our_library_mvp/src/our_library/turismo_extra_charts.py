@@ -3,15 +3,19 @@
 from __future__ import annotations
 
 import re
+import html
 import json
+import threading
 import unicodedata
 import uuid
+from collections import OrderedDict
 from pathlib import Path
 from typing import Optional
 
 import pandas as pd
 from IPython.display import HTML
 
+from .graph_templates import ChartModule
 
 # ----------------- Helpers comunes ----------------- #
 
@@ -34,67 +38,83 @@ def _ensure_path(path: str | Path) -> Path:
     return p
 
 
-# =========================================================
-#  1) Acceso a la capital regional · Modos de transporte
-# =========================================================
+# Frames ya leídos y tipados, por (ruta, mtime, tamaño, opciones): un render
+# repetido (p.ej. la carita del clima para cada región) no vuelve a leer ni
+# a parsear el archivo; si el archivo cambia, cambia la clave. Acotado por
+# memoria (bytes de los DataFrames); se descartan los menos usados.
+DATASET_CACHE_BYTES = 256 * 2**20
 
-def show_transport_access(
-    csv_path: str | Path,
-    highlight_region: Optional[str] = None,
-) -> HTML:
-    """
-    Visualización D3:
+_dataset_cache = OrderedDict()  # clave -> (DataFrame, bytes)
+_dataset_lock = threading.Lock()
+_dataset_bytes = 0
 
-      - Matriz Departamento × Modo (Avión/Bus/Tren/Barco).
-      - Cada celda es un círculo ⇒ "Sí" (color por modo) o "No" (gris).
-      - Clic en departamento muestra detalle en un panel lateral.
 
-    Parámetros
-    ----------
-    csv_path : ruta al CSV `acceso_capital_departamento_transportes_SI_NO.csv`
-    highlight_region : nombre de departamento/región a resaltar (opcional),
-                       se compara sin tildes y sin distinguir mayúsculas.
-    """
-    csv_path = _ensure_path(csv_path)
-    df = pd.read_csv(csv_path)
+def clear_dataset_cache():
+    global _dataset_bytes
+    with _dataset_lock:
+        _dataset_cache.clear()
+        _dataset_bytes = 0
 
-    # Esperamos columnas como:
-    # Departamento, Avión, Bus, Tren, Barco
-    if "Departamento" not in df.columns:
-        raise ValueError("Se esperaba una columna 'Departamento' en el CSV.")
 
-    mode_cols = [c for c in df.columns if c != "Departamento"]
-    if not mode_cols:
-        raise ValueError("No encontré columnas de modos de transporte (Avión/Bus/Tren/Barco).")
+def _copy_on_write() -> bool:
+    if int(pd.__version__.split(".")[0]) >= 3:
+        return True  # siempre activo desde pandas 3
+    return pd.options.mode.copy_on_write is True
 
-    df["norm"] = df["Departamento"].map(_normalize_region)
-    highlight_norm = _normalize_region(highlight_region) if highlight_region else None
 
-    rows = []
-    for _, r in df.iterrows():
-        modes = []
-        for m in mode_cols:
-            val = str(r[m]).strip().lower()
-            has_mode = val in ("si", "sí", "yes", "true", "1")
-            modes.append({"mode": m, "has": bool(has_mode)})
-        rows.append(
-            {
-                "dept": str(r["Departamento"]),
-                "norm": str(r["norm"]),
-                "modes": modes,
-            }
-        )
+def _dataset_copy(df: pd.DataFrame) -> pd.DataFrame:
+    # con Copy-on-Write la copia superficial ya protege al frame cacheado;
+    # sin él, editar valores en el lugar (df.loc[...] = ...) lo alteraría
+    return df.copy(deep=not _copy_on_write())
 
-    payload = {
-        "rows": rows,
-        "modes": mode_cols,
-        "highlight": highlight_norm,
-    }
 
-    data_json = json.dumps(payload, ensure_ascii=False)
-    chart_id = f"transport-{uuid.uuid4().hex}"
+def _load_dataset(path: Path, date_col: Optional[str] = None) -> pd.DataFrame:
+    """
+    CSV o Excel (según extensión) como DataFrame, con date_col ya en
+    datetime y sin filas de fecha inválida. Devuelve una copia del frame
+    cacheado: modificarla no altera las lecturas siguientes.
+    """
+    global _dataset_bytes
+    p = Path(path).resolve()
+    st = p.stat()
+    key = (str(p), st.st_mtime_ns, st.st_size, date_col)
+    with _dataset_lock:
+        hit = _dataset_cache.get(key)
+        if hit is not None:
+            _dataset_cache.move_to_end(key)
+            return _dataset_copy(hit[0])
+
+    if p.suffix.lower() in (".xlsx", ".xls"):
+        df = pd.read_excel(p)
+    else:
+        df = pd.read_csv(p)
+    if date_col is not None and date_col in df.columns:
+        df[date_col] = pd.to_datetime(df[date_col], errors="coerce")
+        df = df.dropna(subset=[date_col]).reset_index(drop=True)
+
+    size = int(df.memory_usage(deep=True).sum())
+    if size <= DATASET_CACHE_BYTES:
+        with _dataset_lock:
+            # versiones anteriores (mtime/tamaño) del mismo archivo ya no sirven
+            for k in [k for k in _dataset_cache if k[0] == key[0] and k[1:3] != key[1:3]]:
+                _dataset_bytes -= _dataset_cache.pop(k)[1]
+            old = _dataset_cache.pop(key, None)
+            if old is not None:
+                _dataset_bytes -= old[1]
+            _dataset_cache[key] = (df, size)
+            _dataset_bytes += size
+            while _dataset_bytes > DATASET_CACHE_BYTES:
+                _dataset_bytes -= _dataset_cache.popitem(last=False)[1][1]
+    return _dataset_copy(df)
 
-    template = """
+
+# =========================================================
+#  1) Acceso a la capital regional · Modos de transporte
+# =========================================================
+
+_TRANSPORT_CHART = ChartModule(
+    "transport_access",
+    markup="""
 <div id="[CHART_ID]" style="width:100%; max-width:900px; margin:10px auto; font-family:system-ui;">
   <h3 style="margin:0 0 8px;">Acceso a la capital regional · Modos de transporte</h3>
   <p style="margin:0 0 10px; font-size:12px; color:#555;">
@@ -110,15 +130,12 @@ def show_transport_access(
     </div>
   </div>
 </div>
-<script src="https://cdn.jsdelivr.net/npm/d3@7"></script>
-<script>
-(function() {
-  const payload = [DATA];
+""",
+    script="""
   const rows = payload.rows || [];
   const modes = payload.modes || [];
   const highlightNorm = payload.highlight || null;
 
-  const rootId = "[CHART_ID]";
   const svgHost = document.getElementById(rootId + "-svg");
   const panelBody = document.getElementById(rootId + "-panel-body");
   if (!svgHost || !panelBody) return;
@@ -254,87 +271,76 @@ def show_transport_access(
     const row = rows.find(r => r.norm === highlightNorm);
     if (row) renderPanel(row);
   }
-})();
-</script>
-"""
-
-    html = template.replace("[CHART_ID]", chart_id).replace("[DATA]", data_json)
-    return HTML(html)
+""",
+)
 
 
-# =========================================================
-#  2) Denuncias 2024 por mes · Dashboard interactivo
-# =========================================================
-
-def show_crime_monthly_dashboard(
+def show_transport_access(
     csv_path: str | Path,
-    region: Optional[str] = None,
+    highlight_region: Optional[str] = None,
 ) -> HTML:
     """
-    Dashboard D3 para `denuncias_2024_por_mes_wide.csv`:
+    Visualización D3:
 
-      - Selector de región.
-      - Gráfico principal de línea + "barras de calor" por mes para la región
-        seleccionada.
-      - Panel lateral con resumen (total anual, mes pico, etc.).
+      - Matriz Departamento × Modo (Avión/Bus/Tren/Barco).
+      - Cada celda es un círculo ⇒ "Sí" (color por modo) o "No" (gris).
+      - Clic en departamento muestra detalle en un panel lateral.
 
-    El CSV se espera en formato ancho:
-      MES, AMAZONAS, ANCASH, APURIMAC, ..., UCAYALI
+    Parámetros
+    ----------
+    csv_path : ruta al CSV `acceso_capital_departamento_transportes_SI_NO.csv`
+    highlight_region : nombre de departamento/región a resaltar (opcional),
+                       se compara sin tildes y sin distinguir mayúsculas.
     """
     csv_path = _ensure_path(csv_path)
-    df = pd.read_csv(csv_path)
-
-    if "MES" not in df.columns:
-        raise ValueError("Se esperaba una columna 'MES' con el número de mes (1-12).")
+    df = _load_dataset(csv_path)
 
-    month_col = "MES"
-    region_cols = [c for c in df.columns if c != month_col]
+    # Esperamos columnas como:
+    # Departamento, Avión, Bus, Tren, Barco
+    if "Departamento" not in df.columns:
+        raise ValueError("Se esperaba una columna 'Departamento' en el CSV.")
 
-    regions_meta = [{"name": c, "norm": _normalize_region(c)} for c in region_cols]
+    mode_cols = [c for c in df.columns if c != "Departamento"]
+    if not mode_cols:
+        raise ValueError("No encontré columnas de modos de transporte (Avión/Bus/Tren/Barco).")
 
-    series = []
-    global_min = None
-    global_max = None
+    df["norm"] = df["Departamento"].map(_normalize_region)
+    highlight_norm = _normalize_region(highlight_region) if highlight_region else None
 
-    for col, meta in zip(region_cols, regions_meta):
-        vals = []
-        for _, row in df.iterrows():
-            m = int(row[month_col])
-            v = float(row[col])
-            vals.append({"month": m, "value": v})
-            if global_min is None or v < global_min:
-                global_min = v
-            if global_max is None or v > global_max:
-                global_max = v
-        series.append(
+    rows = []
+    for _, r in df.iterrows():
+        modes = []
+        for m in mode_cols:
+            val = str(r[m]).strip().lower()
+            has_mode = val in ("si", "sí", "yes", "true", "1")
+            modes.append({"mode": m, "has": bool(has_mode)})
+        rows.append(
             {
-                "region": meta["name"],
-                "norm": meta["norm"],
-                "values": vals,
+                "dept": str(r["Departamento"]),
+                "norm": str(r["norm"]),
+                "modes": modes,
             }
         )
 
-    if global_min is None:
-        global_min = 0.0
-    if global_max is None:
-        global_max = 1.0
-
-    target_norm = _normalize_region(region) if region else None
-    if target_norm and not any(s["norm"] == target_norm for s in series):
-        target_norm = None
-
     payload = {
-        "series": series,
-        "regions": regions_meta,
-        "globalMin": global_min,
-        "globalMax": global_max,
-        "defaultRegionNorm": target_norm,
+        "rows": rows,
+        "modes": mode_cols,
+        "highlight": highlight_norm,
     }
 
     data_json = json.dumps(payload, ensure_ascii=False)
-    chart_id = f"crime-{uuid.uuid4().hex}"
+    chart_id = f"transport-{uuid.uuid4().hex}"
+
+    return HTML(_TRANSPORT_CHART.render(chart_id, data_json))
+
+
+# =========================================================
+#  2) Denuncias 2024 por mes · Dashboard interactivo
+# =========================================================
 
-    template = """
+_CRIME_CHART = ChartModule(
+    "crime_monthly",
+    markup="""
 <div id="[CHART_ID]" style="width:100%; max-width:1000px; margin:10px auto; font-family:system-ui;">
   <div style="display:flex; justify-content:space-between; align-items:center; gap:12px; margin-bottom:8px;">
     <h3 style="margin:0;">Denuncias 2024 · Serie mensual por región</h3>
@@ -356,17 +362,14 @@ def show_crime_monthly_dashboard(
     </div>
   </div>
 </div>
-<script src="https://cdn.jsdelivr.net/npm/d3@7"></script>
-<script>
-(function() {
-  const payload = [DATA];
+""",
+    script="""
   const series = payload.series || [];
   const regions = payload.regions || [];
   const globalMin = payload.globalMin ?? 0;
   const globalMax = payload.globalMax ?? 1;
   const defaultNorm = payload.defaultRegionNorm || (regions[0] && regions[0].norm);
 
-  const rootId = "[CHART_ID]";
   const svgHost = document.getElementById(rootId + "-svg");
   const sidebar = document.getElementById(rootId + "-sidebar-body");
   const select = document.getElementById(rootId + "-select");
@@ -545,132 +548,109 @@ def show_crime_monthly_dashboard(
   } else {
     update(regions[0].norm);
   }
-})();
-</script>
-"""
+""",
+)
 
-    html = template.replace("[CHART_ID]", chart_id).replace("[DATA]", data_json)
-    return HTML(html)
 
+def show_crime_monthly_dashboard(
+    csv_path: str | Path,
+    region: Optional[str] = None,
+) -> HTML:
+    """
+    Dashboard D3 para `denuncias_2024_por_mes_wide.csv`:
 
-# =========================================================
-#  3) Girasol de temperatura mensual por región (clima)
-# =========================================================
-
-# dentro de src/our_library/turismo_extra_charts.py
-import json
-import uuid
-from pathlib import Path
-import pandas as pd
-from IPython.display import HTML
-
+      - Selector de región.
+      - Gráfico principal de línea + "barras de calor" por mes para la región
+        seleccionada.
+      - Panel lateral con resumen (total anual, mes pico, etc.).
 
-def show_temperature_sunflower(
-    csv_path: str,
-    region: str | None = None,
-    date_col: str = "time",
-    region_col: str = "REGION",
-    tmax_col: str = "temperature_2m_max (°C)",
-    tmin_col: str = "temperature_2m_min (°C)",
-):
-    """
-    Girasol térmico:
-      - Vista inicial: 1 pétalo por MES (longitud = Tmax media del mes, color = intensidad de calor).
-      - Al hacer click en un pétalo de mes: se abre la vista de DÍAS de ese mes (1 pétalo por día).
-      - Click en el centro de la flor: vuelve a vista de meses.
+    El CSV se espera en formato ancho:
+      MES, AMAZONAS, ANCASH, APURIMAC, ..., UCAYALI
     """
-    csv_path = Path(csv_path)
-    if not csv_path.exists():
-        raise FileNotFoundError(f"No encuentro el CSV de clima: {csv_path}")
+    csv_path = _ensure_path(csv_path)
+    df = _load_dataset(csv_path)
 
-    df = pd.read_csv(csv_path)
+    if "MES" not in df.columns:
+        raise ValueError("Se esperaba una columna 'MES' con el número de mes (1-12).")
 
-    # Validar columnas
-    missing = [c for c in (date_col, region_col, tmax_col, tmin_col) if c not in df.columns]
-    if missing:
-        raise ValueError(f"Faltan columnas requeridas en el CSV de clima: {missing}")
+    month_col = "MES"
+    region_cols = [c for c in df.columns if c != month_col]
 
-    # Parsear fecha
-    df[date_col] = pd.to_datetime(df[date_col], errors="coerce")
-    df = df.dropna(subset=[date_col])
+    regions_meta = [{"name": c, "norm": _normalize_region(c)} for c in region_cols]
 
-    # Filtro por región (case-insensitive)
-    if region is not None:
-        mask = df[region_col].astype(str).str.upper() == str(region).upper()
-        df_reg = df[mask].copy()
-        if df_reg.empty:
-            raise ValueError(
-                f"No hallé registros para la región '{region}' "
-                f"usando la columna {region_col}."
-            )
-    else:
-        df_reg = df.copy()
+    series = []
+    global_min = None
+    global_max = None
 
-    # Normalizar nombres de columnas para enviar al JS
-    df_reg["month"] = df_reg[date_col].dt.month
-    df_reg["day"] = df_reg[date_col].dt.day
-    df_reg["date_str"] = df_reg[date_col].dt.strftime("%Y-%m-%d")
+    for col, meta in zip(region_cols, regions_meta):
+        vals = []
+        for _, row in df.iterrows():
+            m = int(row[month_col])
+            v = float(row[col])
+            vals.append({"month": m, "value": v})
+            if global_min is None or v < global_min:
+                global_min = v
+            if global_max is None or v > global_max:
+                global_max = v
+        series.append(
+            {
+                "region": meta["name"],
+                "norm": meta["norm"],
+                "values": vals,
+            }
+        )
 
-    df_reg["tmax"] = pd.to_numeric(df_reg[tmax_col], errors="coerce")
-    df_reg["tmin"] = pd.to_numeric(df_reg[tmin_col], errors="coerce")
-    df_reg = df_reg.dropna(subset=["tmax", "tmin"])
+    if global_min is None:
+        global_min = 0.0
+    if global_max is None:
+        global_max = 1.0
 
-    if df_reg.empty:
-        raise ValueError("Después de limpiar tmax/tmin no quedó data para dibujar el girasol.")
+    target_norm = _normalize_region(region) if region else None
+    if target_norm and not any(s["norm"] == target_norm for s in series):
+        target_norm = None
 
-    # --- Agregados mensuales (para vista 'mes') ---
-    month_names = {
-        1: "Enero", 2: "Febrero", 3: "Marzo", 4: "Abril",
-        5: "Mayo", 6: "Junio", 7: "Julio", 8: "Agosto",
-        9: "Septiembre", 10: "Octubre", 11: "Noviembre", 12: "Diciembre",
+    payload = {
+        "series": series,
+        "regions": regions_meta,
+        "globalMin": global_min,
+        "globalMax": global_max,
+        "defaultRegionNorm": target_norm,
     }
 
-    monthly = (
-        df_reg.groupby("month")
-        .agg(
-            tmax_mean=("tmax", "mean"),
-            tmin_mean=("tmin", "mean"),
-            tmax_max=("tmax", "max"),
-            tmin_min=("tmin", "min"),
-            n_days=("tmax", "size"),
-        )
-        .reset_index()
-    )
-    monthly["month_name"] = monthly["month"].map(month_names)
+    data_json = json.dumps(payload, ensure_ascii=False)
+    chart_id = f"crime-{uuid.uuid4().hex}"
 
-    monthly_data = monthly.to_dict(orient="records")
-    daily_data = df_reg[["month", "day", "date_str", "tmax", "tmin"]].to_dict(orient="records")
+    return HTML(_CRIME_CHART.render(chart_id, data_json))
 
-    region_label = str(region or df_reg[region_col].astype(str).iloc[0])
 
-    payload = {
-        "region": region_label,
-        "monthly": monthly_data,
-        "daily": daily_data,
-    }
-    data_json = json.dumps(payload, ensure_ascii=False, default=float)
+# =========================================================
+#  3) Girasol de temperatura mensual por región (clima)
+# =========================================================
 
-    sun_id = f"sun-{uuid.uuid4().hex}"
+# dentro de src/our_library/turismo_extra_charts.py
+import json
+import uuid
+from pathlib import Path
+import pandas as pd
+from IPython.display import HTML
 
-    html = f"""
-<div style="border:3px solid #ffb300; border-radius:16px; padding:10px; max-width:900px;">
-  <h3 style="margin:4px 0 6px;">Clima · Girasol térmico — {region_label}</h3>
+
+_SUNFLOWER_CHART = ChartModule(
+    "temperature_sunflower",
+    markup="""
+<div id="[CHART_ID]" style="border:3px solid #ffb300; border-radius:16px; padding:10px; max-width:900px;">
+  <h3 style="margin:4px 0 6px;">Clima · Girasol térmico — [REGION]</h3>
   <p style="margin:0 0 8px; font-size:12px;">
     Vista inicial: cada pétalo es un <strong>mes</strong> (longitud = temperatura máxima media,
     color = intensidad de calor).<br>
     Haz clic en un pétalo para ver los <strong>días</strong> de ese mes como pétalos individuales.
     Haz clic en el <strong>centro</strong> para volver a la vista por meses.
   </p>
-  <div id="{sun_id}" style="width:100%; height:600px;"></div>
+  <div id="[CHART_ID]-svg" style="width:100%; height:600px;"></div>
 </div>
-
-<script src="https://cdn.jsdelivr.net/npm/d3@7"></script>
-<script src="https://cdn.jsdelivr.net/npm/d3-scale-chromatic@3"></script>
-
-<script>
-(function(){{
-  const hostId = "{sun_id}";
-  const payload = {data_json};
+""",
+    script="""
+  const hostId = rootId + "-svg";
 
   const container = document.getElementById(hostId);
   const W = container.clientWidth || 800;
@@ -767,7 +747,7 @@ def show_temperature_sunflower(
   let currentMonth = null;
 
   // --------- Helper: path de un pétalo (curvado) ----------
-  function petalPath(angle, innerR, outerR){{
+  function petalPath(angle, innerR, outerR){
     const spread = Math.PI / 36; // apertura del pétalo
     const a1 = angle - spread;
     const a2 = angle + spread;
@@ -781,8 +761,8 @@ def show_temperature_sunflower(
     const x2 = cx + innerR * Math.cos(a2);
     const y2 = cy + innerR * Math.sin(a2);
 
-    return `M ${{x0}} ${{y0}} Q ${{cx}} ${{cy}} ${{x1}} ${{y1}} Q ${{cx}} ${{cy}} ${{x2}} ${{y2}} Z`;
-  }}
+    return `M ${x0} ${y0} Q ${cx} ${cy} ${x1} ${y1} Q ${cx} ${cy} ${x2} ${y2} Z`;
+  }
 
   // --------- Tooltip flotante ----------
   const tooltip = d3.select("body")
@@ -797,7 +777,7 @@ def show_temperature_sunflower(
     .style("opacity", 0);
 
   // --------- Render vista mensual ----------
-  function renderMonthView(){{
+  function renderMonthView(){
     mode = "month";
     currentMonth = null;
 
@@ -814,43 +794,43 @@ def show_temperature_sunflower(
       .attr("stroke", "#fdd835")
       .attr("stroke-width", 1.2)
       .attr("opacity", 0.95)
-      .attr("d", (d, i) => {{
+      .attr("d", (d, i) => {
         const angle = 2 * Math.PI * i / total - Math.PI / 2;
         const outR = lenScaleMonth(d.tmax_mean);
         return petalPath(angle, innerR, outR);
-      }})
-      .on("mouseover", function(event, d){{
+      })
+      .on("mouseover", function(event, d){
         d3.select(this).attr("stroke-width", 2.2);
         tooltip
           .style("opacity", 1)
-          .html(`<strong>${{d.month_name}}</strong><br/>
-                 Tmax media: ${{d.tmax_mean.toFixed(1)}}°C<br/>
-                 Días: ${{d.n_days}}`)
+          .html(`<strong>${d.month_name}</strong><br/>
+                 Tmax media: ${d.tmax_mean.toFixed(1)}°C<br/>
+                 Días: ${d.n_days}`)
           .style("left", (event.pageX + 12) + "px")
           .style("top", (event.pageY - 28) + "px");
-      }})
-      .on("mousemove", function(event){{
+      })
+      .on("mousemove", function(event){
         tooltip
           .style("left", (event.pageX + 12) + "px")
           .style("top", (event.pageY - 28) + "px");
-      }})
-      .on("mouseout", function(){{
+      })
+      .on("mouseout", function(){
         d3.select(this).attr("stroke-width", 1.2);
         tooltip.style("opacity", 0);
-      }})
-      .on("click", (event, d) => {{
+      })
+      .on("click", (event, d) => {
         renderDayView(d.month);
         event.stopPropagation();
-      }});
+      });
 
     petals.transition().duration(600)
       .attr("fill", d => colorScaleMonth(d.tmax_mean))
       .attr("stroke", "#fdd835")
-      .attr("d", (d, i) => {{
+      .attr("d", (d, i) => {
         const angle = 2 * Math.PI * i / total - Math.PI / 2;
         const outR = lenScaleMonth(d.tmax_mean);
         return petalPath(angle, innerR, outR);
-      }});
+      });
 
     petals.exit().remove();
 
@@ -866,25 +846,25 @@ def show_temperature_sunflower(
       .attr("fill", "#424242")
       .merge(labels)
       .transition().duration(600)
-      .attr("x", (d, i) => {{
+      .attr("x", (d, i) => {
         const angle = 2 * Math.PI * i / total - Math.PI / 2;
         const r = lenScaleMonth(d.tmax_mean) + 16;
         return cx + r * Math.cos(angle);
-      }})
-      .attr("y", (d, i) => {{
+      })
+      .attr("y", (d, i) => {
         const angle = 2 * Math.PI * i / total - Math.PI / 2;
         const r = lenScaleMonth(d.tmax_mean) + 16;
         return cy + r * Math.sin(angle);
-      }})
+      })
       .text(d => d.month_name.substring(0, 3));
 
     labels.exit().remove();
 
     legendMonth();
-  }}
+  }
 
   // --------- Render vista diaria de un mes ----------
-  function renderDayView(month){{
+  function renderDayView(month){
     mode = "day";
     currentMonth = month;
 
@@ -905,39 +885,39 @@ def show_temperature_sunflower(
       .attr("stroke", "#ffeb3b")
       .attr("stroke-width", 0.9)
       .attr("opacity", 0.96)
-      .attr("d", (d, i) => {{
+      .attr("d", (d, i) => {
         const angle = 2 * Math.PI * i / n - Math.PI / 2;
         const outR = lenScaleDay(d.tmax);
         return petalPath(angle, innerR, outR);
-      }})
-      .on("mouseover", function(event, d){{
+      })
+      .on("mouseover", function(event, d){
         d3.select(this).attr("stroke-width", 1.8);
         tooltip
           .style("opacity", 1)
-          .html(`Día ${{d.day}} · ${{d.date_str}}<br/>
-                 Tmax: ${{d.tmax.toFixed(1)}}°C<br/>
-                 Tmin: ${{d.tmin.toFixed(1)}}°C`)
+          .html(`Día ${d.day} · ${d.date_str}<br/>
+                 Tmax: ${d.tmax.toFixed(1)}°C<br/>
+                 Tmin: ${d.tmin.toFixed(1)}°C`)
           .style("left", (event.pageX + 12) + "px")
           .style("top", (event.pageY - 28) + "px");
-      }})
-      .on("mousemove", function(event){{
+      })
+      .on("mousemove", function(event){
         tooltip
           .style("left", (event.pageX + 12) + "px")
           .style("top", (event.pageY - 28) + "px");
-      }})
-      .on("mouseout", function(){{
+      })
+      .on("mouseout", function(){
         d3.select(this).attr("stroke-width", 0.9);
         tooltip.style("opacity", 0);
-      }});
+      });
 
     petals.transition().duration(600)
       .attr("fill", d => colorScaleDay(d.tmax))
       .attr("stroke", "#ffeb3b")
-      .attr("d", (d, i) => {{
+      .attr("d", (d, i) => {
         const angle = 2 * Math.PI * i / n - Math.PI / 2;
         const outR = lenScaleDay(d.tmax);
         return petalPath(angle, innerR, outR);
-      }});
+      });
 
     petals.exit().remove();
 
@@ -953,25 +933,25 @@ def show_temperature_sunflower(
       .attr("fill", "#455a64")
       .merge(labels)
       .transition().duration(600)
-      .attr("x", (d, i) => {{
+      .attr("x", (d, i) => {
         const angle = 2 * Math.PI * i / n - Math.PI / 2;
         const r = lenScaleDay(d.tmax) + 10;
         return cx + r * Math.cos(angle);
-      }})
-      .attr("y", (d, i) => {{
+      })
+      .attr("y", (d, i) => {
         const angle = 2 * Math.PI * i / n - Math.PI / 2;
         const r = lenScaleDay(d.tmax) + 10;
         return cy + r * Math.sin(angle);
-      }})
+      })
       .text(d => d.day);
 
     labels.exit().remove();
 
     legendDay(month);
-  }}
+  }
 
   // --------- Leyendas ----------
-  function legendMonth(){{
+  function legendMonth(){
     svg.selectAll("g.legend").remove();
     const g = svg.append("g").attr("class", "legend");
     const x0 = 40;
@@ -1005,14 +985,14 @@ def show_temperature_sunflower(
       .attr("y", y0)
       .attr("width", 120)
       .attr("height", 10)
-      .attr("fill", `url(#${{gradId}})`);
+      .attr("fill", `url(#${gradId})`);
 
     g.append("text")
       .attr("x", x0)
       .attr("y", y0 + 22)
       .attr("font-size", 10)
       .attr("fill", "#616161")
-      .text(`${{tMinMonth.toFixed(1)}}°C`);
+      .text(`${tMinMonth.toFixed(1)}°C`);
 
     g.append("text")
       .attr("x", x0 + 120)
@@ -1020,10 +1000,10 @@ def show_temperature_sunflower(
       .attr("text-anchor", "end")
       .attr("font-size", 10)
       .attr("fill", "#616161")
-      .text(`${{tMaxMonth.toFixed(1)}}°C`);
-  }}
+      .text(`${tMaxMonth.toFixed(1)}°C`);
+  }
 
-  function legendDay(month){{
+  function legendDay(month){
     svg.selectAll("g.legend").remove();
     const g = svg.append("g").attr("class", "legend");
     const x0 = 40;
@@ -1045,7 +1025,7 @@ def show_temperature_sunflower(
       .attr("offset", "100%")
       .attr("stop-color", colorScaleDay(tMaxDay));
 
-    const monthObj = payload.monthly.find(m => m.month === month) || {{}};
+    const monthObj = payload.monthly.find(m => m.month === month) || {};
     const monthName = monthObj.month_name || ("Mes " + month);
 
     g.append("text")
@@ -1060,14 +1040,14 @@ def show_temperature_sunflower(
       .attr("y", y0)
       .attr("width", 120)
       .attr("height", 10)
-      .attr("fill", `url(#${{gradId}})`);
+      .attr("fill", `url(#${gradId})`);
 
     g.append("text")
       .attr("x", x0)
       .attr("y", y0 + 22)
       .attr("font-size", 10)
       .attr("fill", "#616161")
-      .text(`${{tMinDay.toFixed(1)}}°C`);
+      .text(`${tMinDay.toFixed(1)}°C`);
 
     g.append("text")
       .attr("x", x0 + 120)
@@ -1075,107 +1055,127 @@ def show_temperature_sunflower(
       .attr("text-anchor", "end")
       .attr("font-size", 10)
       .attr("fill", "#616161")
-      .text(`${{tMaxDay.toFixed(1)}}°C`);
-  }}
+      .text(`${tMaxDay.toFixed(1)}°C`);
+  }
 
   // --------- Click en el centro -> vuelve a meses ----------
-  svg.on("click", function(event){{
+  svg.on("click", function(event){
     const [x, y] = d3.pointer(event, this);
     const dx = x - cx;
     const dy = y - cy;
-    if (Math.sqrt(dx*dx + dy*dy) <= coreRadius + 6){{
+    if (Math.sqrt(dx*dx + dy*dy) <= coreRadius + 6){
       renderMonthView();
-    }}
-  }});
+    }
+  });
 
   // Primera renderización
   renderMonthView();
-}})();
-</script>
-"""
-    return HTML(html)
-
+""",
+)
 
 
-
-
-
-def show_region_weather_face(
-    csv_path: str | Path,
-    region: str,
-    target_date: str | None = None,
+def show_temperature_sunflower(
+    csv_path: str,
+    region: str | None = None,
     date_col: str = "time",
     region_col: str = "REGION",
     tmax_col: str = "temperature_2m_max (°C)",
-) -> HTML:
+    tmin_col: str = "temperature_2m_min (°C)",
+):
     """
-    Muestra un ícono grande de clima para una región:
-
-      - temp >= 25  → sol con cara feliz (fondo amarillo/cálido)
-      - 15 <= temp < 25 → nube con sol (fondo gris claro)
-      - temp < 15   → nube (fondo azul frío)
-
-    Si target_date es None, usa la última fecha disponible en el CSV
-    para esa región.
+    Girasol térmico:
+      - Vista inicial: 1 pétalo por MES (longitud = Tmax media del mes, color = intensidad de calor).
+      - Al hacer click en un pétalo de mes: se abre la vista de DÍAS de ese mes (1 pétalo por día).
+      - Click en el centro de la flor: vuelve a vista de meses.
     """
     csv_path = Path(csv_path)
     if not csv_path.exists():
         raise FileNotFoundError(f"No encuentro el CSV de clima: {csv_path}")
 
-    df = pd.read_csv(csv_path)
+    # fecha ya parseada (y filas sin fecha descartadas) en la caché
+    df = _load_dataset(csv_path, date_col=date_col)
 
     # Validar columnas
-    for col in (date_col, region_col, tmax_col):
-        if col not in df.columns:
-            raise ValueError(f"Falta la columna '{col}' en el CSV de clima.")
+    missing = [c for c in (date_col, region_col, tmax_col, tmin_col) if c not in df.columns]
+    if missing:
+        raise ValueError(f"Faltan columnas requeridas en el CSV de clima: {missing}")
+
+    # Filtro por región (case-insensitive)
+    if region is not None:
+        mask = df[region_col].astype(str).str.upper() == str(region).upper()
+        df_reg = df[mask].copy()
+        if df_reg.empty:
+            raise ValueError(
+                f"No hallé registros para la región '{region}' "
+                f"usando la columna {region_col}."
+            )
+    else:
+        df_reg = df.copy()
 
-    # Parsear fecha y limpiar
-    df[date_col] = pd.to_datetime(df[date_col], errors="coerce")
-    df = df.dropna(subset=[date_col])
+    # Normalizar nombres de columnas para enviar al JS
+    df_reg["month"] = df_reg[date_col].dt.month
+    df_reg["day"] = df_reg[date_col].dt.day
+    df_reg["date_str"] = df_reg[date_col].dt.strftime("%Y-%m-%d")
+
+    df_reg["tmax"] = pd.to_numeric(df_reg[tmax_col], errors="coerce")
+    df_reg["tmin"] = pd.to_numeric(df_reg[tmin_col], errors="coerce")
+    df_reg = df_reg.dropna(subset=["tmax", "tmin"])
 
-    # Filtro por región (case-insensitive)
-    mask = df[region_col].astype(str).str.upper() == str(region).upper()
-    df_reg = df[mask].copy()
     if df_reg.empty:
-        raise ValueError(f"No hay registros para la región '{region}'.")
+        raise ValueError("Después de limpiar tmax/tmin no quedó data para dibujar el girasol.")
 
-    # Definir la fecha objetivo
-    if target_date is None:
-        target = df_reg[date_col].max().normalize()
-    else:
-        target = pd.to_datetime(target_date).normalize()
+    # --- Agregados mensuales (para vista 'mes') ---
+    month_names = {
+        1: "Enero", 2: "Febrero", 3: "Marzo", 4: "Abril",
+        5: "Mayo", 6: "Junio", 7: "Julio", 8: "Agosto",
+        9: "Septiembre", 10: "Octubre", 11: "Noviembre", 12: "Diciembre",
+    }
 
-    df_day = df_reg[df_reg[date_col].dt.normalize() == target].copy()
-    if df_day.empty:
-        raise ValueError(
-            f"No hay registros para la región '{region}' en la fecha {str(target.date())}."
+    monthly = (
+        df_reg.groupby("month")
+        .agg(
+            tmax_mean=("tmax", "mean"),
+            tmin_mean=("tmin", "mean"),
+            tmax_max=("tmax", "max"),
+            tmin_min=("tmin", "min"),
+            n_days=("tmax", "size"),
         )
+        .reset_index()
+    )
+    monthly["month_name"] = monthly["month"].map(month_names)
 
-    # Temperatura máxima promedio del día
-    temp = float(df_day[tmax_col].mean())
+    monthly_data = monthly.to_dict(orient="records")
+    daily_data = df_reg[["month", "day", "date_str", "tmax", "tmin"]].to_dict(orient="records")
+
+    region_label = str(region or df_reg[region_col].astype(str).iloc[0])
 
     payload = {
-        "region": str(region),
-        "date": str(target.date()),
-        "temp": temp,
+        "region": region_label,
+        "monthly": monthly_data,
+        "daily": daily_data,
     }
-
     data_json = json.dumps(payload, ensure_ascii=False, default=float)
-    chart_id = f"weather-{uuid.uuid4().hex}"
 
-    template = """
+    sun_id = f"sun-{uuid.uuid4().hex}"
+
+    return HTML(_SUNFLOWER_CHART.render(sun_id, data_json, {"REGION": html.escape(region_label)}))
+
+
+
+
+
+
+_WEATHER_FACE_CHART = ChartModule(
+    "region_weather_face",
+    markup="""
 <div id="[CHART_ID]" style="width:100%; max-width:360px; margin:10px 0; font-family:system-ui;">
   <div id="[CHART_ID]-card"
        style="border:3px solid #ffca28; border-radius:16px; padding:10px; background:#fffde7; transition:background-color 0.3s ease;">
     <div id="[CHART_ID]-svg" style="width:100%; height:240px;"></div>
   </div>
 </div>
-
-<script src="https://cdn.jsdelivr.net/npm/d3@7"></script>
-<script>
-(function() {
-  const payload = [DATA];
-  const rootId = "[CHART_ID]";
+""",
+    script="""
   const host = document.getElementById(rootId + "-svg");
   const card = document.getElementById(rootId + "-card");
   if (!host) return;
@@ -1356,113 +1356,79 @@ def show_region_weather_face(
     .attr("font-size", 12)
     .attr("fill", "#424242")
     .text(temp.toFixed(1) + " °C");
-})();
-</script>
-"""
-    html = template.replace("[CHART_ID]", chart_id).replace("[DATA]", data_json)
-    return HTML(html)
-
+""",
+)
 
 
-
-
-def show_region_footprint(
+def show_region_weather_face(
     csv_path: str | Path,
     region: str,
-    region_col: str = "Región",
-    emission_level_col: str = "Nivel de Emisión",
-    source_col: str = "Fuente Principal de CO2",
-    context_col: str = "Dato Clave / Contexto Útil",
+    target_date: str | None = None,
+    date_col: str = "time",
+    region_col: str = "REGION",
+    tmax_col: str = "temperature_2m_max (°C)",
 ) -> HTML:
     """
-    Visualización de huella de carbono por región (footprint):
+    Muestra un ícono grande de clima para una región:
 
-      - El tamaño del *footprint* es proporcional al nivel de emisión (1–5).
-      - El color cambia según el nivel:
-            5 → rojo (Muy Alto)
-            4 → naranja (Alto)
-            3 → amarillo (Medio)
-            2 → verde (Bajo)
-            1 → azul (Muy Bajo)
-      - Debajo se muestran:
-            · Fuente principal de CO₂
-            · Dato clave / contexto
+      - temp >= 25  → sol con cara feliz (fondo amarillo/cálido)
+      - 15 <= temp < 25 → nube con sol (fondo gris claro)
+      - temp < 15   → nube (fondo azul frío)
 
-    Soporta tanto .csv como .xlsx (Excel).
+    Si target_date es None, usa la última fecha disponible en el CSV
+    para esa región.
     """
     csv_path = Path(csv_path)
     if not csv_path.exists():
-        raise FileNotFoundError(f"No encuentro el archivo de footprint: {csv_path}")
+        raise FileNotFoundError(f"No encuentro el CSV de clima: {csv_path}")
 
-    # --- Cargar según extensión (.csv o .xlsx) ---
-    suffix = csv_path.suffix.lower()
-    if suffix in [".xlsx", ".xls"]:
-        df = pd.read_excel(csv_path)
-    else:
-        df = pd.read_csv(csv_path)
+    # fecha ya parseada (y filas sin fecha descartadas) en la caché
+    df = _load_dataset(csv_path, date_col=date_col)
 
-    # Verificamos columnas básicas
-    for col in (region_col, emission_level_col, source_col, context_col):
+    # Validar columnas
+    for col in (date_col, region_col, tmax_col):
         if col not in df.columns:
-            raise ValueError(
-                f"Falta la columna '{col}' en el archivo. "
-                f"Columnas disponibles: {list(df.columns)}"
-            )
+            raise ValueError(f"Falta la columna '{col}' en el CSV de clima.")
 
-    # Normalizar región para comparar (reusa _normalize_region si existe)
-    try:
-        norm_func = _normalize_region  # definida más arriba en este módulo
-    except NameError:
-        def norm_func(x):
-            return str(x).strip().upper()
+    # Filtro por región (case-insensitive)
+    mask = df[region_col].astype(str).str.upper() == str(region).upper()
+    df_reg = df[mask].copy()
+    if df_reg.empty:
+        raise ValueError(f"No hay registros para la región '{region}'.")
 
-    df["_norm_region"] = df[region_col].map(norm_func)
-    target_norm = norm_func(region)
+    # Definir la fecha objetivo
+    if target_date is None:
+        target = df_reg[date_col].max().normalize()
+    else:
+        target = pd.to_datetime(target_date).normalize()
 
-    sub = df[df["_norm_region"] == target_norm].copy()
-    if sub.empty:
+    df_day = df_reg[df_reg[date_col].dt.normalize() == target].copy()
+    if df_day.empty:
         raise ValueError(
-            f"No encontré filas para la región '{region}'. "
-            f"Asegúrate de que el nombre coincide con la columna '{region_col}'."
+            f"No hay registros para la región '{region}' en la fecha {str(target.date())}."
         )
 
-    row = sub.iloc[0]
+    # Temperatura máxima promedio del día
+    temp = float(df_day[tmax_col].mean())
 
-    raw_level = str(row[emission_level_col])
+    payload = {
+        "region": str(region),
+        "date": str(target.date()),
+        "temp": temp,
+    }
 
-    # Extraer nivel numérico (1–5) desde textos tipo "🔴 5 - Muy Alto"
-    m = re.search(r"([1-5])", raw_level)
-    if m:
-        level = int(m.group(1))
-    else:
-        level = 3  # fallback neutro
+    data_json = json.dumps(payload, ensure_ascii=False, default=float)
+    chart_id = f"weather-{uuid.uuid4().hex}"
+
+    return HTML(_WEATHER_FACE_CHART.render(chart_id, data_json))
 
-    level_labels = {
-        1: "Muy Bajo",
-        2: "Bajo",
-        3: "Medio",
-        4: "Alto",
-        5: "Muy Alto",
-    }
-    level_label = level_labels.get(level, "Medio")
 
-    fuente = str(row[source_col])
-    contexto = str(row[context_col])
-    region_label = str(row[region_col])
 
-    payload = {
-        "region": region_label,
-        "level": level,
-        "level_label": level_label,
-        "raw_level": raw_level,
-        "source": fuente,
-        "context": contexto,
-    }
 
-    data_json = json.dumps(payload, ensure_ascii=False)
-    chart_id = f"footprint-{uuid.uuid4().hex}"
 
-    template = """
+_FOOTPRINT_CHART = ChartModule(
+    "region_footprint",
+    markup="""
 <div id="[CHART_ID]" style="width:100%; max-width:480px; margin:10px 0; font-family:system-ui;">
   <div id="[CHART_ID]-card"
        style="border:2px solid #cfd8dc; border-radius:18px; padding:12px 14px; background:#fafafa;
@@ -1489,13 +1455,8 @@ def show_region_footprint(
        style="margin-top:10px; font-size:11px; color:#455a64; padding:6px 8px; background:#f5f5f5; border-radius:10px;">
   </div>
 </div>
-
-<script src="https://cdn.jsdelivr.net/npm/d3@7"></script>
-<script>
-(function() {
-  const payload = [DATA];
-  const rootId = "[CHART_ID]";
-
+""",
+    script="""
   const host = document.getElementById(rootId + "-svg");
   const card = document.getElementById(rootId + "-card");
   const legendHost = document.getElementById(rootId + "-legend");
@@ -1711,8 +1672,100 @@ def show_region_footprint(
         .text(`${lv} ${labels[lv]}`);
     });
   }
-})();
-</script>
-"""
-    html = template.replace("[CHART_ID]", chart_id).replace("[DATA]", data_json)
-    return HTML(html)
\ No newline at end of file
+""",
+)
+
+
+def show_region_footprint(
+    csv_path: str | Path,
+    region: str,
+    region_col: str = "Región",
+    emission_level_col: str = "Nivel de Emisión",
+    source_col: str = "Fuente Principal de CO2",
+    context_col: str = "Dato Clave / Contexto Útil",
+) -> HTML:
+    """
+    Visualización de huella de carbono por región (footprint):
+
+      - El tamaño del *footprint* es proporcional al nivel de emisión (1–5).
+      - El color cambia según el nivel:
+            5 → rojo (Muy Alto)
+            4 → naranja (Alto)
+            3 → amarillo (Medio)
+            2 → verde (Bajo)
+            1 → azul (Muy Bajo)
+      - Debajo se muestran:
+            · Fuente principal de CO₂
+            · Dato clave / contexto
+
+    Soporta tanto .csv como .xlsx (Excel).
+    """
+    csv_path = Path(csv_path)
+    if not csv_path.exists():
+        raise FileNotFoundError(f"No encuentro el archivo de footprint: {csv_path}")
+
+    # --- Cargar según extensión (.csv o .xlsx), vía la caché ---
+    df = _load_dataset(csv_path)
+
+    # Verificamos columnas básicas
+    for col in (region_col, emission_level_col, source_col, context_col):
+        if col not in df.columns:
+            raise ValueError(
+                f"Falta la columna '{col}' en el archivo. "
+                f"Columnas disponibles: {list(df.columns)}"
+            )
+
+    # Normalizar región para comparar (reusa _normalize_region si existe)
+    try:
+        norm_func = _normalize_region  # definida más arriba en este módulo
+    except NameError:
+        def norm_func(x):
+            return str(x).strip().upper()
+
+    df["_norm_region"] = df[region_col].map(norm_func)
+    target_norm = norm_func(region)
+
+    sub = df[df["_norm_region"] == target_norm].copy()
+    if sub.empty:
+        raise ValueError(
+            f"No encontré filas para la región '{region}'. "
+            f"Asegúrate de que el nombre coincide con la columna '{region_col}'."
+        )
+
+    row = sub.iloc[0]
+
+    raw_level = str(row[emission_level_col])
+
+    # Extraer nivel numérico (1–5) desde textos tipo "🔴 5 - Muy Alto"
+    m = re.search(r"([1-5])", raw_level)
+    if m:
+        level = int(m.group(1))
+    else:
+        level = 3  # fallback neutro
+
+    level_labels = {
+        1: "Muy Bajo",
+        2: "Bajo",
+        3: "Medio",
+        4: "Alto",
+        5: "Muy Alto",
+    }
+    level_label = level_labels.get(level, "Medio")
+
+    fuente = str(row[source_col])
+    contexto = str(row[context_col])
+    region_label = str(row[region_col])
+
+    payload = {
+        "region": region_label,
+        "level": level,
+        "level_label": level_label,
+        "raw_level": raw_level,
+        "source": fuente,
+        "context": contexto,
+    }
+
+    data_json = json.dumps(payload, ensure_ascii=False)
+    chart_id = f"footprint-{uuid.uuid4().hex}"
+
+    return HTML(_FOOTPRINT_CHART.render(chart_id, data_json))
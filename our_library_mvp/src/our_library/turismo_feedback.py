@@ -0,0 +1,211 @@
+# src/our_library/turismo_feedback.py
+
+"""
+Feedback implícito de los clicks para el ranking de turismo_recs.
+
+ClickFeedback lleva contadores por posición del recurso en el catálogo
+(la misma posición que usan la KNN y _rank_candidates):
+  - popularidad : clicks por recurso (array float64 de largo N)
+  - afinidad    : clicks en un recurso dentro de un dashboard anclado en
+                  otro; los pares (ancla, recurso) vistos tienen un slot
+                  en un array float64 que crece por duplicación
+
+Los dos decaen exponencialmente (half_life_s). Para que cada evento cueste
+O(1) no se decae todo el array: un click en t suma exp(λ·(t − t0)) y al
+leer se multiplica por exp(−λ·(ahora − t0)); cuando el exponente crece
+demasiado se re-escala una sola vez (t0 = t).
+
+Uso:
+    fb = ClickFeedback.from_model("models")
+    fb.attach()      # escucha los clicks que llegan por el bridge
+    show_turismo_dashboard_from_model(valor="25", feedback=fb, fb_weight=0.1)
+
+y _rank_candidates suma fb_weight · FB_BONUS, con FB_BONUS en [0, 1].
+"""
+
+import math
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from .click_log import _NAT, _ts_to_ns
+
+# peso de un click según el panel (__src); lo que no está no cuenta
+SOURCE_WEIGHTS = {"map": 1.0, "force": 1.0, "score": 1.0, "catalogue": 1.0}
+# un brush selecciona muchos recursos a la vez: cada uno suma menos
+BRUSH_WEIGHT = 0.2
+DEFAULT_HALF_LIFE_S = 3 * 24 * 3600.0
+# exponente a partir del cual se re-escalan los acumulados
+_MAX_EXP = 50.0
+_INITIAL_PAIRS = 1024
+
+
+class ClickFeedback:
+    """
+    Popularidad y afinidad (ancla, recurso) decaídas, actualizadas por evento.
+
+    codes          : ids de los recursos en el orden del catálogo (CODE, el
+                     mismo "id" que mandan los clicks del dashboard)
+    half_life_s    : vida media de un click
+    pop_k / aff_k  : clicks (decaídos) a los que cada término vale 0.5
+                     (saturación x / (x + k))
+    affinity_share : peso de la afinidad frente a la popularidad en
+                     FB_BONUS cuando hay ancla
+    """
+
+    def __init__(self, codes, half_life_s: float = DEFAULT_HALF_LIFE_S,
+                 pop_k: float = 5.0, aff_k: float = 1.0, affinity_share: float = 0.5,
+                 source_weights: dict = None, brush_weight: float = BRUSH_WEIGHT):
+        codes = [str(c) for c in codes]
+        self.n = len(codes)
+        self._pos = {c: i for i, c in enumerate(codes)}
+        self.half_life_s = float(half_life_s)
+        self.pop_k = float(pop_k)
+        self.aff_k = float(aff_k)
+        self.affinity_share = float(affinity_share)
+        self.source_weights = dict(SOURCE_WEIGHTS if source_weights is None else source_weights)
+        self.brush_weight = float(brush_weight)
+        self._lam = math.log(2.0) / self.half_life_s
+        self._lock = threading.Lock()
+        self._anchors = {}  # sesión (dash_id) -> posición del recurso ancla
+        self.reset()
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, **kwargs) -> "ClickFeedback":
+        """Catálogo ya cargado (el df de _load_models)."""
+        codes = df["CODE"] if "CODE" in df.columns else df.index
+        return cls(codes, **kwargs)
+
+    @classmethod
+    def from_model(cls, model_dir: str = "models", **kwargs) -> "ClickFeedback":
+        """Lee solo la columna CODE del parquet entrenado."""
+        path = os.path.join(model_dir, "recursos.parquet")
+        try:
+            df = pd.read_parquet(path, columns=["CODE"])
+        except (KeyError, ValueError):
+            df = pd.read_parquet(path)
+        return cls.from_frame(df, **kwargs)
+
+    def reset(self):
+        """Olvida todos los clicks (las anclas de los dashboards se mantienen)."""
+        with self._lock:
+            self._t0 = time.time()
+            self._pop = np.zeros(self.n)
+            self._pair_slot = {}  # ancla * n + recurso -> slot en _pair_w
+            self._pair_w = np.zeros(_INITIAL_PAIRS)
+            self.events = 0
+
+    def __len__(self):
+        return self.events
+
+    # ---- escritura ----
+    def set_anchor(self, session: str, code):
+        """Los clicks del dashboard `session` cuentan como afinidad con `code`."""
+        pos = self._pos.get(str(code))
+        with self._lock:
+            if pos is None:
+                self._anchors.pop(session, None)
+            else:
+                self._anchors[session] = pos
+
+    def _scale_at(self, t: float) -> float:
+        """Peso de un click en t respecto de t0 (re-escala si hace falta)."""
+        x = self._lam * (t - self._t0)
+        if x > _MAX_EXP:
+            k = math.exp(-x)
+            self._pop *= k
+            self._pair_w *= k
+            self._t0 = t
+            x = 0.0
+        return math.exp(x)
+
+    def _add_pair(self, key: int, w: float):
+        slot = self._pair_slot.get(key)
+        if slot is None:
+            slot = self._pair_slot[key] = len(self._pair_slot)
+            if slot == len(self._pair_w):
+                self._pair_w = np.concatenate([self._pair_w, np.zeros(len(self._pair_w))])
+        self._pair_w[slot] += w
+
+    def observe(self, event: dict) -> bool:
+        """Suma un evento del bridge (dict con __src, id, __ts, __session)."""
+        if event.get("__interaction") == "brush":
+            ids = event.get("selected_ids") or []
+            w = self.brush_weight
+        else:
+            ids = [event.get("id")]
+            w = self.source_weights.get(event.get("__src"), 0.0)
+        if w <= 0:
+            return False
+        ts = _ts_to_ns(event.get("__ts")) if event.get("__ts") is not None else _NAT
+        t = time.time() if ts == _NAT else ts / 1e9
+        with self._lock:
+            anchor = self._anchors.get(event.get("__session"))
+            w *= self._scale_at(t)
+            hit = False
+            for code in ids:
+                i = self._pos.get(str(code))
+                if i is None:
+                    continue
+                hit = True
+                self._pop[i] += w
+                if anchor is not None and anchor != i:
+                    self._add_pair(anchor * self.n + i, w)
+            if hit:
+                self.events += 1
+        return hit
+
+    def observe_many(self, events):
+        for e in events:
+            if isinstance(e, dict):
+                self.observe(e)
+
+    def attach(self):
+        """Empieza a recibir los clicks del bridge (graph2_1)."""
+        from .graph2_1 import add_click_listener
+
+        add_click_listener(self.observe_many)
+        return self
+
+    def detach(self):
+        from .graph2_1 import remove_click_listener
+
+        remove_click_listener(self.observe_many)
+
+    # ---- lectura ----
+    def popularity(self, now: float = None) -> np.ndarray:
+        """Clicks decaídos por recurso (copia, en el orden del catálogo)."""
+        with self._lock:
+            return self._pop * self._decay(now)
+
+    def _decay(self, now):
+        return math.exp(-self._lam * ((time.time() if now is None else now) - self._t0))
+
+    def bonus(self, anchor_pos, idxs, now: float = None) -> np.ndarray:
+        """
+        FB_BONUS en [0, 1] para las posiciones idxs: popularidad saturada
+        y, si hay ancla, mezclada con la afinidad (ancla, recurso).
+        """
+        idxs = np.asarray(idxs, dtype=np.int64)
+        with self._lock:
+            decay = self._decay(now)
+            pop = self._pop[idxs] * decay
+            aff = None
+            if anchor_pos is not None:
+                base = int(anchor_pos) * self.n
+                get = self._pair_slot.get
+                slots = np.fromiter((get(base + i, -1) for i in idxs.tolist()),
+                                    dtype=np.int64, count=len(idxs))
+                aff = np.where(slots >= 0, self._pair_w[slots] * decay, 0.0)
+        out = pop / (pop + self.pop_k)
+        if aff is not None:
+            share = self.affinity_share
+            out = (1.0 - share) * out + share * aff / (aff + self.aff_k)
+        return out
+
+    def __repr__(self):
+        return (f"ClickFeedback(n={self.n}, events={self.events}, "
+                f"pairs={len(self._pair_slot)}, half_life_s={self.half_life_s:g})")
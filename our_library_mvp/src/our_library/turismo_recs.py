@@ -11,16 +11,26 @@
 #      python turismo_recs.py recommend --modo nombre --valor "catarata" --model_dir models --topk 10 --alpha 1.0 --output recs_nombre.csv
 #      # por TEXTO LIBRE (tema) + ancla geográfica (opcional)
 #      python turismo_recs.py recommend --modo texto --valor "montañas nevado trekking" --geo_anchor_code 25 --geo_km 50 --alpha 0.85 --rg_mode bonus --output recs_texto.csv
+#   3) Evaluar offline (recall@k) un barrido de parámetros:
+#      python turismo_recs.py evaluate --model_dir models --alpha 1 0.8 0.6 --geo_km 0 20 40 --rg_mode none bonus --rg_weight 0.05 0.1 --output metricas.csv
 
 import os
+import json
+import time
+import hashlib
+import numbers
 import argparse
 import joblib
 import numpy as np
 import pandas as pd
 from math import radians, sin, cos, asin, sqrt
+from itertools import product
 from typing import Optional
+from concurrent.futures import ProcessPoolExecutor
+import scipy.sparse as sp
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.neighbors import NearestNeighbors
+from sklearn.preprocessing import normalize
 
 # ------------------ utilidades ------------------
 
@@ -56,30 +66,242 @@ def _haversine_km(lat1, lon1, lat2, lon2):
     a = sin(dlat/2)**2 + cos(radians(lat1))*cos(radians(lat2))*sin(dlon/2)**2
     return 2 * R * asin(sqrt(a))
 
+def _haversine_km_vec(lat1, lon1, lat2, lon2):
+    """Versión vectorizada (broadcasting NumPy); NaN si falta alguna coordenada."""
+    R = 6371.0
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2)**2
+    return 2 * R * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+# ------------------ manifiesto / caché de entrenamiento ------------------
+#
+# train_and_save escribe models/manifest.json con el hash del CSV de entrada,
+# los hiperparámetros y las versiones de librerías. Se usa por etapas:
+#   - "text":    tfidf.joblib + knn.joblib (depende solo de la columna TEXT)
+#   - "dataset": recursos.parquet          (depende del CSV completo)
+# Si nada cambió se reusan los artefactos; si solo cambian columnas que no
+# entran en TEXT (p.ej. coordenadas) se reescribe únicamente el parquet.
+
+MANIFEST_NAME = "manifest.json"
+_MANIFEST_VERSION = 1
+_STAGE_FILES = {
+    "text": ["tfidf.joblib", "knn.joblib"],
+    "dataset": ["recursos.parquet"],
+}
+
+def _sha256_file(path: str, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def _sha256_text(texts: pd.Series) -> str:
+    h = hashlib.sha256()
+    for t in texts.astype(str):
+        h.update(t.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+def _lib_versions() -> dict:
+    import sklearn
+    return {
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "scikit-learn": sklearn.__version__,
+        "joblib": joblib.__version__,
+    }
+
+def _read_manifest(model_dir: str) -> dict:
+    path = os.path.join(model_dir, MANIFEST_NAME)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            man = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if man.get("manifest_version") != _MANIFEST_VERSION:
+        return {}
+    return man
+
+def _write_manifest(model_dir: str, man: dict):
+    # escritura atómica: un manifiesto a medias invalidaría la caché
+    path = os.path.join(model_dir, MANIFEST_NAME)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(man, f, indent=2, ensure_ascii=False, sort_keys=True)
+    os.replace(tmp, path)
+
+def _artifacts_exist(model_dir: str, stage: str) -> bool:
+    return all(os.path.exists(os.path.join(model_dir, f)) for f in _STAGE_FILES[stage])
+
+def _stage_is_fresh(man: dict, stage: str, key: dict, model_dir: str) -> bool:
+    return man.get("stages", {}).get(stage) == key and _artifacts_exist(model_dir, stage)
+
+# ------------------ TF-IDF paralelo ------------------
+#
+# Equivale a TfidfVectorizer(min_df, max_features, ngram_range).fit(...) seguido
+# de .transform(...) sobre los mismos textos, pero tokenizando una sola vez:
+#   1) cada worker tokeniza su bloque de documentos -> vocabulario local + CSR de conteos
+#   2) se fusionan df/tf por término y se elige el vocabulario global (min_df, max_features)
+#   3) cada worker remapea sus columnas, aplica idf y normaliza L2 sus filas
+# El vectorizador devuelto transforma consultas igual que uno ajustado con .fit().
+
+_TFIDF_MIN_DOCS_PER_JOB = 2000
+
+def _tfidf_count_chunk(args):
+    texts, ngram_max = args
+    analyze = TfidfVectorizer(ngram_range=(1, ngram_max)).build_analyzer()
+    vocab = {}
+    indices, data, indptr = [], [], [0]
+    for doc in texts:
+        counts = {}
+        for tok in analyze(doc):
+            j = vocab.setdefault(tok, len(vocab))
+            counts[j] = counts.get(j, 0) + 1
+        indices.extend(counts.keys())
+        data.extend(counts.values())
+        indptr.append(len(indices))
+    return (list(vocab),
+            np.asarray(indices, dtype=np.int64),
+            np.asarray(data, dtype=np.float64),
+            np.asarray(indptr, dtype=np.int64))
+
+def _tfidf_build_chunk(args):
+    indices, data, indptr, col_map, idf = args
+    n_rows = len(indptr) - 1
+    cols = col_map[indices]
+    keep = cols >= 0
+    rows = np.repeat(np.arange(n_rows), np.diff(indptr))[keep]
+    cols = cols[keep]
+    X = sp.csr_matrix((data[keep] * idf[cols], (rows, cols)), shape=(n_rows, len(idf)))
+    X.sort_indices()
+    return normalize(X, norm="l2", copy=False)
+
+def _map_chunks(fn, tasks, n_jobs: int):
+    if n_jobs <= 1 or len(tasks) <= 1:
+        return [fn(t) for t in tasks]
+    with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+        return list(pool.map(fn, tasks))
+
+def _fit_transform_tfidf(texts, min_df=2, max_features=20000, ngram_max=2, n_jobs=None):
+    """
+    TF-IDF de una pasada, repartido en un pool de procesos.
+    Devuelve (tfidf, X) con X en CSR normalizado por filas.
+    """
+    texts = [str(t) for t in texts]
+    n_docs = len(texts)
+    if n_jobs is None or n_jobs < 1:
+        n_jobs = os.cpu_count() or 1
+    n_jobs = max(1, min(n_jobs, n_docs // _TFIDF_MIN_DOCS_PER_JOB))
+    t0 = time.perf_counter()
+
+    # 1) tokenizar (una sola vez) por bloques
+    n_chunks = n_jobs * 4 if n_jobs > 1 else 1
+    step = -(-n_docs // n_chunks) or 1
+    bounds = [(i, min(i + step, n_docs)) for i in range(0, n_docs, step)]
+    parts = _map_chunks(_tfidf_count_chunk, [(texts[a:b], ngram_max) for a, b in bounds], n_jobs)
+
+    # 2) vocabulario global ordenado alfabéticamente (como sklearn)
+    all_terms = sorted(set().union(*(p[0] for p in parts)))
+    gid = {t: i for i, t in enumerate(all_terms)}
+    local_maps = [np.fromiter((gid[t] for t in p[0]), dtype=np.int64, count=len(p[0])) for p in parts]
+    dfreq = np.zeros(len(all_terms), dtype=np.int64)
+    tfreq = np.zeros(len(all_terms), dtype=np.float64)
+    for (_, indices, data, _), lmap in zip(parts, local_maps):
+        cols = lmap[indices]
+        dfreq += np.bincount(cols, minlength=len(all_terms))
+        tfreq += np.bincount(cols, weights=data, minlength=len(all_terms))
+
+    min_count = min_df if isinstance(min_df, numbers.Integral) else min_df * n_docs
+    kept = np.flatnonzero(dfreq >= min_count)
+    if max_features is not None and len(kept) > max_features:
+        # mismo argsort (no estable) que CountVectorizer._limit_features sobre el
+        # vocabulario alfabético: los empates en frecuencia se resuelven igual
+        top = (-tfreq[kept]).argsort()[:max_features]
+        kept = np.sort(kept[top])
+    if len(kept) == 0:
+        raise ValueError("Tras podar con min_df/max_features no queda ningún término.")
+
+    final_map = np.full(len(all_terms), -1, dtype=np.int64)
+    final_map[kept] = np.arange(len(kept))
+    idf = np.log((1.0 + n_docs) / (1.0 + dfreq[kept])) + 1.0
+
+    # 3) CSR final por bloques: remapeo + idf + L2
+    tasks = [(indices, data, indptr, final_map[lmap], idf)
+             for (_, indices, data, indptr), lmap in zip(parts, local_maps)]
+    X = sp.vstack(_map_chunks(_tfidf_build_chunk, tasks, n_jobs), format="csr")
+
+    tfidf = TfidfVectorizer(min_df=min_df, max_features=max_features, ngram_range=(1, ngram_max))
+    tfidf.vocabulary_ = {all_terms[i]: j for j, i in enumerate(kept)}
+    tfidf.fixed_vocabulary_ = False
+    tfidf.idf_ = idf
+
+    dt = time.perf_counter() - t0
+    print(f"- TF-IDF: {n_docs:,} docs en {dt:.2f}s ({n_docs / max(dt, 1e-9):,.0f} docs/s, n_jobs={n_jobs})")
+    return tfidf, X
+
 # ------------------ entrenamiento ------------------
 
-def train_and_save(input_csv: str, model_dir: str, min_df=2, max_features=20000, ngram_max=2):
+def train_and_save(input_csv: str, model_dir: str, min_df=2, max_features=20000, ngram_max=2,
+                   force: bool = False, n_jobs: Optional[int] = None):
+    """
+    Entrena TF-IDF + KNN y guarda los artefactos en model_dir.
+
+    Con force=False consulta models/manifest.json y reconstruye solo las
+    etapas cuyas entradas cambiaron. Devuelve la lista de etapas reconstruidas.
+    n_jobs: procesos para el TF-IDF (None = todos los núcleos).
+    """
     _ensure_dir(model_dir)
+    params = {"min_df": min_df, "max_features": max_features, "ngram_max": ngram_max}
+    versions = _lib_versions()
+    input_hash = _sha256_file(input_csv)
+    man = {} if force else _read_manifest(model_dir)
+
+    dataset_key = {"input_sha256": input_hash, "versions": versions}
+    text_prev = man.get("stages", {}).get("text", {})
+    # mismo CSV => mismo TEXT: basta comparar parámetros/versiones de la etapa "text"
+    if (_stage_is_fresh(man, "dataset", dataset_key, model_dir)
+            and text_prev.get("params") == params
+            and text_prev.get("versions") == versions
+            and _artifacts_exist(model_dir, "text")):
+        print("=== ENTRENAMIENTO OMITIDO (sin cambios) ===")
+        print(f"- Artefactos: {model_dir} | input sha256: {input_hash[:12]}…")
+        return []
+
     df = pd.read_csv(input_csv)
     _validate_cols(df)
     df = _build_text(df).reset_index(drop=True)
 
-    tfidf = TfidfVectorizer(
-        min_df=min_df,
-        max_features=max_features,
-        ngram_range=(1, ngram_max)
-    ).fit(df["TEXT"])
+    text_key = {"text_sha256": _sha256_text(df["TEXT"]), "params": params, "versions": versions}
+    rebuilt = []
 
-    X = tfidf.transform(df["TEXT"])
-    knn = NearestNeighbors(metric="cosine", algorithm="brute").fit(X)
+    if _stage_is_fresh(man, "text", text_key, model_dir):
+        tfidf = None
+    else:
+        tfidf, X = _fit_transform_tfidf(df["TEXT"], min_df, max_features, ngram_max, n_jobs=n_jobs)
+        knn = NearestNeighbors(metric="cosine", algorithm="brute").fit(X)
+
+        joblib.dump(tfidf, os.path.join(model_dir, "tfidf.joblib"))
+        joblib.dump(knn,   os.path.join(model_dir, "knn.joblib"))
+        rebuilt.append("text")
 
-    joblib.dump(tfidf, os.path.join(model_dir, "tfidf.joblib"))
-    joblib.dump(knn,   os.path.join(model_dir, "knn.joblib"))
     df.to_parquet(os.path.join(model_dir, "recursos.parquet"))
+    rebuilt.append("dataset")
+
+    _write_manifest(model_dir, {
+        "manifest_version": _MANIFEST_VERSION,
+        "input_csv": os.path.abspath(input_csv),
+        "n_records": int(len(df)),
+        "stages": {"text": text_key, "dataset": dataset_key},
+    })
 
     print("=== ENTRENAMIENTO OK ===")
-    print(f"- Artefactos: {model_dir}")
-    print(f"- Registros: {len(df):,} | Vocabulario TF-IDF: {len(tfidf.vocabulary_):,}")
+    print(f"- Artefactos: {model_dir} | etapas reconstruidas: {', '.join(rebuilt)}")
+    if tfidf is not None:
+        print(f"- Registros: {len(df):,} | Vocabulario TF-IDF: {len(tfidf.vocabulary_):,}")
+    else:
+        print(f"- Registros: {len(df):,} | TF-IDF/KNN reutilizados (TEXT sin cambios)")
+    return rebuilt
 
 # ------------------ carga e inferencia ------------------
 
@@ -94,51 +316,84 @@ def _neighbors_by_vector(knn, q_vec, n: int, universe_size: int):
     distances, indices = knn.kneighbors(q_vec, n_neighbors=n)
     return indices[0].tolist(), distances[0].tolist()
 
+_RANK_OUT_COLS = ["CODE","REGION","PROVINCIA","DISTRITO","NOMBRE DEL RECURSO","CATEGORIA",
+                  "TIPO_DE_CATEGORIA","SUB_TIPO_CATEGORIA","URL","LATITUD","LONGITUD",
+                  "REGION_GEOGRAFICA","SIM_TEXT","GEO_BONUS","RG_BONUS","FB_BONUS","DIST_KM","SCORE"]
+
 def _rank_candidates(df: pd.DataFrame,
                      base_idx: Optional[int],
                      idxs, dists,
                      alpha=1.0, geo_km=None,
-                     rg_mode=None, rg_weight=0.05):
-    # similitud de texto
-    sim = pd.Series(1.0 - np.array(dists), index=idxs)
-    cand = df.iloc[idxs].copy()
-    if base_idx is not None and base_idx in cand.index:
-        cand = cand.drop(index=base_idx)
-    cand["SIM_TEXT"] = cand.index.map(sim).astype(float)
+                     rg_mode=None, rg_weight=0.05,
+                     topk: Optional[int] = None,
+                     feedback=None, fb_weight=0.0):
+    """
+    Puntúa los vecinos (idxs, dists) del recurso base y los ordena por SCORE.
+
+    feedback: ClickFeedback (turismo_feedback) opcional; agrega FB_BONUS
+    (popularidad/afinidad decaída de los clicks, en [0, 1]) y suma
+    fb_weight·FB_BONUS al SCORE, sin reentrenar.
+
+    Todo el cálculo se hace sobre arrays NumPy de posiciones; el DataFrame
+    de salida (índice = índice original en df) solo se construye con las
+    filas finales. Con topk se seleccionan los k mejores vía argpartition
+    en lugar de ordenar todo el pool (no usar si luego se aplican filtros).
+    """
+    idxs = np.asarray(idxs, dtype=np.int64)
+    sim = 1.0 - np.asarray(dists, dtype=float)       # similitud de texto
+    base_pos = df.index.get_loc(base_idx) if base_idx is not None else None
+    if base_pos is not None:
+        keep = idxs != base_pos
+        idxs, sim = idxs[keep], sim[keep]
 
     # macro-región (requiere columna y base_idx)
-    if "REGION_GEOGRAFICA" in df.columns and base_idx is not None:
-        base_rg = df.loc[base_idx, "REGION_GEOGRAFICA"]
+    rg_bonus = np.zeros(len(idxs))
+    if "REGION_GEOGRAFICA" in df.columns and base_pos is not None and rg_mode in ("filter", "bonus"):
+        rg_col = df["REGION_GEOGRAFICA"]
+        same_rg = np.asarray(rg_col.take(idxs).to_numpy() == rg_col.iat[base_pos], dtype=bool)
         if rg_mode == "filter":
-            cand = cand[cand["REGION_GEOGRAFICA"] == base_rg].copy()
-            cand["RG_BONUS"] = 0.0
-        elif rg_mode == "bonus":
-            cand["RG_BONUS"] = (cand["REGION_GEOGRAFICA"] == base_rg).astype(float)
+            idxs, sim, rg_bonus = idxs[same_rg], sim[same_rg], rg_bonus[same_rg]
         else:
-            cand["RG_BONUS"] = 0.0
-    else:
-        cand["RG_BONUS"] = 0.0
+            rg_bonus = same_rg.astype(float)
 
     # geografía (si hay ancla con lat/lon y radio definido)
-    if geo_km is not None and base_idx is not None and "LATITUD" in df.columns and "LONGITUD" in df.columns:
-        lat0, lon0 = df.loc[base_idx, "LATITUD"], df.loc[base_idx, "LONGITUD"]
-        if pd.notna(lat0) and pd.notna(lon0):
-            cand["DIST_KM"] = cand.apply(lambda r: _haversine_km(lat0, lon0, r.get("LATITUD", np.nan), r.get("LONGITUD", np.nan)), axis=1)
-            cand["GEO_BONUS"] = (1.0 - cand["DIST_KM"]/float(geo_km)).clip(lower=0, upper=1)
-        else:
-            cand["DIST_KM"] = np.nan
-            cand["GEO_BONUS"] = 0.0
+    dist_km = np.full(len(idxs), np.nan)
+    geo_bonus = np.zeros(len(idxs))
+    if geo_km is not None and base_pos is not None and "LATITUD" in df.columns and "LONGITUD" in df.columns:
+        lat = df["LATITUD"].to_numpy(dtype=float)
+        lon = df["LONGITUD"].to_numpy(dtype=float)
+        if np.isfinite(lat[base_pos]) and np.isfinite(lon[base_pos]):
+            dist_km = _haversine_km_vec(lat[base_pos], lon[base_pos], lat[idxs], lon[idxs])
+            geo_bonus = np.clip(1.0 - dist_km / float(geo_km), 0.0, 1.0)
+
+    score = alpha*sim + (1.0 - alpha)*geo_bonus + rg_weight*rg_bonus
+
+    # feedback implícito de los clicks (contadores ya decaídos, sin leer historial)
+    fb_bonus = None
+    if feedback is not None:
+        if feedback.n != len(df):
+            raise ValueError(f"feedback es de un catálogo de {feedback.n} recursos, df tiene {len(df)}")
+        fb_bonus = feedback.bonus(base_pos, idxs)
+        score = score + fb_weight*fb_bonus
+
+    # orden descendente estable (NaN al final, como sort_values)
+    if topk is not None and 0 < topk < len(score):
+        part = np.sort(np.argpartition(-score, topk - 1)[:topk])
+        order = part[np.argsort(-score[part], kind="stable")]
     else:
-        cand["DIST_KM"] = np.nan
-        cand["GEO_BONUS"] = 0.0
-
-    cand["SCORE"] = alpha*cand["SIM_TEXT"] + (1.0 - alpha)*cand["GEO_BONUS"] + rg_weight*cand["RG_BONUS"]
-
-    cols = ["CODE","REGION","PROVINCIA","DISTRITO","NOMBRE DEL RECURSO","CATEGORIA",
-            "TIPO_DE_CATEGORIA","SUB_TIPO_CATEGORIA","URL","LATITUD","LONGITUD",
-            "REGION_GEOGRAFICA","SIM_TEXT","GEO_BONUS","RG_BONUS","DIST_KM","SCORE"]
-    cols = [c for c in cols if c in cand.columns]
-    return cand.sort_values("SCORE", ascending=False)[cols]
+        order = np.argsort(-score, kind="stable")
+
+    # única materialización pandas: las filas finales de las columnas de salida
+    computed = {"SIM_TEXT": sim, "GEO_BONUS": geo_bonus, "RG_BONUS": rg_bonus,
+                "DIST_KM": dist_km, "SCORE": score}
+    if fb_bonus is not None:
+        computed["FB_BONUS"] = fb_bonus
+    data_cols = [c for c in _RANK_OUT_COLS if c in df.columns and c not in computed]
+    out = df.take(idxs[order])[data_cols]
+    scores = pd.DataFrame(np.column_stack([v[order] for v in computed.values()]),
+                          index=out.index, columns=list(computed))
+    out = pd.concat([out, scores], axis=1)
+    return out[[c for c in _RANK_OUT_COLS if c in out.columns]]
 
 def _apply_filters(recs: pd.DataFrame, filter_cat=None, filter_tipo=None, filter_sub=None):
     if filter_cat:
@@ -175,11 +430,14 @@ def recommend(model_dir: str,
               filter_tipo: Optional[str]=None,
               filter_sub: Optional[str]=None,
               geo_anchor_code: Optional[str]=None,
-              output: Optional[str]=None):
+              output: Optional[str]=None,
+              feedback=None,
+              fb_weight: float=0.1):
     """
     modo: 'code' | 'nombre' | 'texto'
       - code/nombre: usa el recurso base como ancla (puede aplicar geo y macro-región)
       - texto: consulta libre; si pasas geo_anchor_code, lo usa como ancla para DIST_KM/GEO_BONUS
+    feedback: ClickFeedback opcional (suma fb_weight·FB_BONUS al SCORE)
     """
     tfidf, knn, df = _load_models(model_dir)
 
@@ -208,8 +466,11 @@ def recommend(model_dir: str,
     # rg_mode
     rgm = None if (rg_mode is None or rg_mode == "none") else rg_mode
 
-    # ranking
-    recs = _rank_candidates(df, base_idx, idxs, dists, alpha=alpha, geo_km=geo_km, rg_mode=rgm, rg_weight=rg_weight)
+    # ranking (sin filtros basta con seleccionar los topk)
+    has_filters = bool(filter_cat or filter_tipo or filter_sub)
+    recs = _rank_candidates(df, base_idx, idxs, dists, alpha=alpha, geo_km=geo_km, rg_mode=rgm,
+                            rg_weight=rg_weight, topk=None if has_filters else topk,
+                            feedback=feedback, fb_weight=fb_weight)
 
     # filtros opcionales
     recs = _apply_filters(recs, filter_cat, filter_tipo, filter_sub)
@@ -233,6 +494,166 @@ def recommend(model_dir: str,
 
     return recs
 
+# ------------------ evaluación offline (barrido de parámetros) ------------------
+#
+# Cada recurso del catálogo actúa como consulta (modo=code). Los candidatos se
+# calculan una sola vez en lote (X @ X.T por bloques + argpartition), igual que
+# recommend(): mismos max(topk+1, 200) vecinos menos el propio recurso. Luego
+# cada combinación (alpha, geo_km, rg_mode, rg_weight) solo re-puntúa arrays.
+# Relevante = misma `relevance_col` (por defecto SUB_TIPO_CATEGORIA) a <= rel_km.
+
+_EVAL_STATE = {}
+
+def _eval_candidates(tfidf, df: pd.DataFrame, n_total: int, relevance_col: str,
+                     rel_km: Optional[float], batch_size: int = 512):
+    X = tfidf.transform(df["TEXT"].astype(str))
+    N = X.shape[0]
+    n_total = min(n_total, N)
+    C = max(n_total - 1, 1)
+
+    lat = pd.to_numeric(df.get("LATITUD"), errors="coerce").to_numpy(float) if "LATITUD" in df else np.full(N, np.nan)
+    lon = pd.to_numeric(df.get("LONGITUD"), errors="coerce").to_numpy(float) if "LONGITUD" in df else np.full(N, np.nan)
+    rel_codes = pd.factorize(df[relevance_col])[0]
+    rg_codes = pd.factorize(df["REGION_GEOGRAFICA"])[0] if "REGION_GEOGRAFICA" in df else np.full(N, -1)
+
+    cand = np.empty((N, C), dtype=np.int64)
+    sims = np.empty((N, C), dtype=np.float64)
+    dist = np.empty((N, C), dtype=np.float64)
+    n_rel = np.empty(N, dtype=np.int64)
+    XT = X.T.tocsc()
+    for a in range(0, N, batch_size):
+        b = min(a + batch_size, N)
+        rows = np.arange(a, b)
+        S = (X[a:b] @ XT).toarray()
+        S[rows - a, rows] = -np.inf                       # excluir el propio recurso
+        top = np.argpartition(-S, C - 1, axis=1)[:, :C]
+        cand[a:b] = top
+        sims[a:b] = np.take_along_axis(S, top, axis=1)
+
+        D = _haversine_km_vec(lat[a:b, None], lon[a:b, None], lat[None, :], lon[None, :])
+        dist[a:b] = np.take_along_axis(D, top, axis=1)
+        R = (rel_codes[a:b, None] == rel_codes[None, :]) & (rel_codes[a:b, None] >= 0)
+        if rel_km is not None:
+            R &= D <= rel_km
+        R[rows - a, rows] = False
+        n_rel[a:b] = R.sum(axis=1)
+
+    rel = (rel_codes[cand] == rel_codes[:, None]) & (rel_codes[:, None] >= 0)
+    if rel_km is not None:
+        rel &= dist <= rel_km
+    same_rg = (rg_codes[cand] == rg_codes[:, None]) & (rg_codes[:, None] >= 0)
+    has_geo = np.isfinite(lat) & np.isfinite(lon)
+    return {"sims": sims, "dist": dist, "rel": rel, "same_rg": same_rg,
+            "n_rel": n_rel, "has_geo": has_geo, "has_rg": "REGION_GEOGRAFICA" in df}
+
+def _eval_init(state):
+    _EVAL_STATE.clear()
+    _EVAL_STATE.update(state)
+
+def _eval_one(params):
+    st = _EVAL_STATE
+    alpha, geo_km, mode, rg_weight, topk = params
+    sims, dist, same_rg = st["sims"], st["dist"], st["same_rg"]
+
+    # misma fórmula que _rank_candidates (sin la columna de macro-región
+    # rg_mode no hace nada, tampoco "filter")
+    rg_mode = mode if st["has_rg"] else None
+    if geo_km is not None:
+        geo = np.clip(1.0 - dist / float(geo_km), 0.0, 1.0)
+        geo = np.where(st["has_geo"][:, None], geo, 0.0)
+    else:
+        geo = np.zeros_like(sims)
+    rg = same_rg.astype(float) if rg_mode == "bonus" else 0.0
+    score = alpha * sims + (1.0 - alpha) * geo + rg_weight * rg
+    score = np.where(np.isnan(score), -1e9, score)       # NaN van al final (como sort_values)
+    if rg_mode == "filter":
+        score = np.where(same_rg, score, -np.inf)
+
+    k = min(topk, score.shape[1])
+    top = np.argpartition(-score, k - 1, axis=1)[:, :k]
+    top_score = np.take_along_axis(score, top, axis=1)
+    order = np.argsort(-top_score, axis=1, kind="stable")
+    top = np.take_along_axis(top, order, axis=1)
+    valid = np.take_along_axis(top_score, order, axis=1) > -np.inf
+    hits = np.take_along_axis(st["rel"], top, axis=1) & valid
+
+    n_rel = st["n_rel"]
+    q = n_rel > 0
+    n_hits = hits.sum(axis=1)
+    discounts = 1.0 / np.log2(np.arange(2, k + 2))
+    dcg = (hits * discounts).sum(axis=1)
+    idcg = np.cumsum(discounts)[np.minimum(n_rel, k) - 1]
+    rec_dist = np.where(valid, np.take_along_axis(dist, top, axis=1), np.nan)
+
+    return {
+        "alpha": alpha,
+        "geo_km": geo_km,
+        "rg_mode": mode or "none",
+        "rg_weight": rg_weight,
+        f"precision@{k}": float((n_hits[q] / k).mean()) if q.any() else np.nan,
+        f"recall@{k}": float((n_hits[q] / n_rel[q]).mean()) if q.any() else np.nan,
+        f"hit_rate@{k}": float((n_hits[q] > 0).mean()) if q.any() else np.nan,
+        f"ndcg@{k}": float((dcg[q] / idcg[q]).mean()) if q.any() else np.nan,
+        "mean_dist_km": float(np.nanmean(rec_dist)) if np.isfinite(rec_dist).any() else np.nan,
+        "queries": int(q.sum()),
+    }
+
+def evaluate_grid(model_dir: str,
+                  alphas=(1.0, 0.9, 0.8, 0.6),
+                  geo_kms=(None, 20.0, 40.0, 80.0),
+                  rg_weights=(0.05,),
+                  rg_modes=(None, "bonus"),
+                  topk: int = 10,
+                  relevance_col: str = "SUB_TIPO_CATEGORIA",
+                  rel_km: Optional[float] = 50.0,
+                  n_jobs: Optional[int] = None,
+                  output: Optional[str] = None) -> pd.DataFrame:
+    """
+    Evalúa recall@k / precision@k / hit_rate@k / ndcg@k para todas las
+    combinaciones de parámetros, usando cada recurso del catálogo como consulta.
+    Devuelve (e imprime) la tabla de métricas ordenada por recall.
+
+    geo_kms: un radio None o <= 0 desactiva el componente geográfico;
+    rel_km None o <= 0 = relevancia sin radio.
+    """
+    tfidf, _, df = _load_models(model_dir)
+    if relevance_col not in df.columns:
+        raise ValueError(f"No existe la columna de relevancia: {relevance_col}")
+    if rel_km is not None and rel_km <= 0:
+        rel_km = None
+
+    t0 = time.perf_counter()
+    state = _eval_candidates(tfidf, df, max(topk + 1, 200), relevance_col, rel_km)
+    t_cand = time.perf_counter() - t0
+
+    rg_modes = [None if m in (None, "none") else m for m in rg_modes]
+    geo_kms = [None if g is None or g <= 0 else float(g) for g in geo_kms]
+    grid = [(float(a), g, m, float(w), int(topk))
+            for a, g, m, w in product(alphas, geo_kms, rg_modes, rg_weights)
+            if m == "bonus" or w == rg_weights[0]]   # rg_weight solo influye con rg_mode=bonus
+
+    if n_jobs is None or n_jobs < 1:
+        n_jobs = os.cpu_count() or 1
+    if n_jobs <= 1 or len(grid) <= 1:
+        _eval_init(state)
+        rows = [_eval_one(p) for p in grid]
+    else:
+        with ProcessPoolExecutor(max_workers=min(n_jobs, len(grid)),
+                                 initializer=_eval_init, initargs=(state,)) as pool:
+            rows = list(pool.map(_eval_one, grid))
+
+    res = pd.DataFrame(rows).sort_values(f"recall@{topk}", ascending=False).reset_index(drop=True)
+    dt = time.perf_counter() - t0
+    print(f"=== EVALUACIÓN OFFLINE: {len(df):,} consultas × {len(grid)} combinaciones ===")
+    print(f"- Candidatos: {t_cand:.1f}s | Total: {dt:.1f}s | relevante = mismo {relevance_col}"
+          + (f" a <= {rel_km:g} km" if rel_km is not None else ""))
+    if output:
+        res.to_csv(output, index=False)
+        print(f"Guardado en: {output}")
+    with pd.option_context("display.max_rows", None, "display.width", None):
+        print(res)
+    return res
+
 # ------------------ CLI ------------------
 
 def _parse_args():
@@ -246,6 +667,8 @@ def _parse_args():
     p_train.add_argument("--min_df", type=int, default=2)
     p_train.add_argument("--max_features", type=int, default=20000)
     p_train.add_argument("--ngram_max", type=int, default=2)
+    p_train.add_argument("--force", action="store_true", help="Ignora manifest.json y reentrena todo")
+    p_train.add_argument("--n_jobs", type=int, default=None, help="Procesos para TF-IDF (por defecto: todos)")
 
     # recommend
     p_rec = sub.add_parser("recommend", help="Carga modelos y recomienda (sin reentrenar)")
@@ -262,12 +685,26 @@ def _parse_args():
     p_rec.add_argument("--filter_sub",  default=None, help="Filtrar SUB_TIPO_CATEGORIA (contiene)")
     p_rec.add_argument("--geo_anchor_code", default=None, help="(Solo modo=texto) CODE para anclar geografía")
     p_rec.add_argument("--output", default=None, help="CSV de salida")
+
+    # evaluate
+    p_ev = sub.add_parser("evaluate", help="Barrido de alpha/geo_km/rg_weight con métricas recall@k offline")
+    p_ev.add_argument("--model_dir", default="models", help="Carpeta de artefactos")
+    p_ev.add_argument("--alpha", type=float, nargs="+", default=[1.0, 0.9, 0.8, 0.6])
+    p_ev.add_argument("--geo_km", type=float, nargs="+", default=[0, 20, 40, 80], help="Radios a probar (0 = sin geo)")
+    p_ev.add_argument("--rg_mode", choices=["none","filter","bonus"], nargs="+", default=["none", "bonus"])
+    p_ev.add_argument("--rg_weight", type=float, nargs="+", default=[0.05])
+    p_ev.add_argument("--topk", type=int, default=10)
+    p_ev.add_argument("--relevance_col", default="SUB_TIPO_CATEGORIA", help="Columna que define relevancia")
+    p_ev.add_argument("--rel_km", type=float, default=50.0, help="Radio de relevancia en km (0 = sin radio)")
+    p_ev.add_argument("--n_jobs", type=int, default=None, help="Procesos para el barrido (por defecto: todos)")
+    p_ev.add_argument("--output", default=None, help="CSV con la tabla de métricas")
     return p.parse_args()
 
 def main():
     args = _parse_args()
     if args.cmd == "train":
-        train_and_save(args.input, args.model_dir, args.min_df, args.max_features, args.ngram_max)
+        train_and_save(args.input, args.model_dir, args.min_df, args.max_features, args.ngram_max,
+                       force=args.force, n_jobs=args.n_jobs)
     elif args.cmd == "recommend":
         recommend(
             model_dir=args.model_dir,
@@ -284,6 +721,19 @@ def main():
             geo_anchor_code=args.geo_anchor_code,
             output=args.output
         )
+    elif args.cmd == "evaluate":
+        evaluate_grid(
+            model_dir=args.model_dir,
+            alphas=args.alpha,
+            geo_kms=args.geo_km,
+            rg_weights=args.rg_weight,
+            rg_modes=args.rg_mode,
+            topk=args.topk,
+            relevance_col=args.relevance_col,
+            rel_km=args.rel_km,
+            n_jobs=args.n_jobs,
+            output=args.output
+        )
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
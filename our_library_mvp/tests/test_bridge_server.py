@@ -0,0 +1,86 @@
+import http.client
+import json
+import threading
+import urllib.request
+
+import pytest
+
+pytest.importorskip("flask")
+graph2_1 = pytest.importorskip("our_library.graph2_1")
+
+
+def _post(port, body):
+    req = urllib.request.Request(f"http://127.0.0.1:{port}/update_node",
+                                 data=json.dumps(body).encode(),
+                                 headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=5) as resp:
+        return resp.status
+
+
+@pytest.mark.parametrize("backend", ["waitress", "werkzeug"])
+def test_stop_server_releases_port(backend):
+    if backend == "waitress":
+        pytest.importorskip("waitress")
+    port = graph2_1.start_server(port=0, backend=backend).server_port
+    try:
+        for i in range(3):
+            assert _post(port, {"id": i, "__src": "test"}) == 200
+            graph2_1.stop_server()
+            assert not any(t.name == "ourlib-bridge" for t in threading.enumerate())
+            # mismo puerto otra vez: sin OSError 98 (Address already in use)
+            graph2_1.start_server(port=port, backend=backend)
+    finally:
+        graph2_1.stop_server()
+        graph2_1.clear_click_history()
+
+
+def _open_stream(port, dash_id):
+    """Abre /events/<dash_id> y devuelve (conexión, respuesta) con los headers ya leídos."""
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    conn.request("GET", f"/events/{dash_id}?since=0")
+    resp = conn.getresponse()
+    assert resp.status == 200
+    assert resp.readline() == b"retry: 2000\n"
+    return conn, resp
+
+
+@pytest.mark.parametrize("backend", ["waitress", "werkzeug"])
+def test_update_nodes_while_streams_are_open(backend):
+    if backend == "waitress":
+        pytest.importorskip("waitress")
+    pack = lambda changed, removed, nodes, links: {"format": "json", "nodes": changed}  # noqa: E731
+    for dash_id in ("dash-a", "dash-b", "dash-c"):
+        graph2_1._dashboards.register(dash_id, [{"id": 1}], [], pack)
+    port = graph2_1.start_server(port=0, workers=2, backend=backend).server_port
+    conns = []
+    try:
+        # más streams que workers: cada uno nuevo cierra al más viejo
+        for dash_id in ("dash-a", "dash-b", "dash-c"):
+            conns.append(_open_stream(port, dash_id))
+        assert graph2_1._dashboards.open_streams() == 1
+
+        body = json.dumps({"nodes": [{"id": 1, "__src": "test"}]}).encode()
+        req = urllib.request.Request(f"http://127.0.0.1:{port}/update_nodes", data=body,
+                                     headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(req, timeout=5) as resp:
+            assert json.load(resp)["received"] == 1
+
+        # los streams cerrados reciben "close" (el JS no se reconecta)
+        _, first = conns[0]
+        lines = []
+        while not lines or lines[-1] not in (b"", b"event: close\n"):
+            lines.append(first.readline())
+        assert lines[-1] == b"event: close\n"
+
+        # volver a registrar el mismo dash_id cierra los streams del anterior
+        graph2_1._dashboards.register("dash-c", [{"id": 2}], [], pack)
+        _, last = conns[-1]
+        lines = []
+        while not lines or lines[-1] not in (b"", b"event: close\n"):
+            lines.append(last.readline())
+        assert b"event: close\n" in lines
+    finally:
+        for conn, _ in conns:
+            conn.close()
+        graph2_1.stop_server()
+        graph2_1.clear_click_history()
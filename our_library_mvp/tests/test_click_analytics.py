@@ -0,0 +1,194 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from our_library import click_analytics as ca
+from our_library.click_log import ClickLog
+
+T0 = pd.Timestamp("2026-03-01T10:00:00", tz="UTC")
+
+
+def _ev(session, t, src, id=None, interaction=None, selected=None):
+    e = {"__ts": "no es fecha" if t is None else (T0 + pd.Timedelta(seconds=t)).isoformat(),
+         "__src": src, "__chart": src}
+    if session is not None:
+        e["__session"] = session
+    if id is not None:
+        e["id"] = id
+    if interaction is not None:
+        e["__interaction"] = interaction
+    if selected is not None:
+        e["selected_count"] = selected
+    return e
+
+
+# varias sesiones, llegadas desordenadas, un NaT, una pausa larga, un
+# evento sin sesión y un nodo ("z") que nunca forma par
+EVENTS = [
+    _ev("d0", 0, "map", interaction="brush", selected=5),
+    _ev("d1", 5, "force", "b"),
+    _ev("d0", 10, "force", "a"),
+    _ev("d2", None, "force", "a"),
+    _ev("d3", 7, "force", "z"),
+    _ev("d2", 12, "map", interaction="brush", selected=9),
+    _ev("d1", 20, "map", interaction="brush", selected=2),
+    _ev(None, 8, "force", "b"),
+    _ev("d0", 25, "force", "b"),
+    _ev("d2", 15, "score", "d"),
+    _ev("d1", 30, "force", "c"),
+    _ev("d0", 40, "score", "a"),
+    _ev("d0", 50, "force", "a"),
+    _ev("d1", 3000, "score", "c"),
+    _ev(None, 9, "score", "c"),
+    _ev("d0", 45, "force", "c"),  # llega después de uno más nuevo
+]
+
+
+@pytest.fixture
+def df():
+    log = ClickLog()
+    log.extend(EVENTS)
+    return log.to_dataframe()
+
+
+def _ordered(df):
+    """Referencia: orden por sesión (sin sesión = grupo propio) y tiempo, NaT primero."""
+    out = df.assign(_sess=df["session"].astype(object).fillna("~"))
+    return out.sort_values(["_sess", "timestamp"], na_position="first", kind="stable")
+
+
+def _ref_pairs(df, by):
+    seq = _ordered(df[df[by].notna()])
+    nxt = seq.groupby("_sess")[by].shift(-1)
+    pairs = pd.DataFrame({"from": seq[by].astype(object), "to": nxt.astype(object)}).dropna()
+    return pairs.groupby(["from", "to"]).size()
+
+
+def _ref_dwell(df, max_gap_s=ca.DEFAULT_MAX_GAP_S):
+    seq = _ordered(df)
+    gap = (seq.groupby("_sess")["timestamp"].shift(-1) - seq["timestamp"]).dt.total_seconds()
+    if max_gap_s is not None:
+        gap = gap.where(gap <= max_gap_s)
+    return gap.reindex(df.index)
+
+
+# ---- transiciones ----
+@pytest.mark.parametrize("by", ["id", "source"])
+def test_transitions_match_groupby(df, by):
+    ref = _ref_pairs(df, by)
+    got = ca.transitions(df, by=by)
+    assert got["count"].is_monotonic_decreasing
+    got = got.set_index(["from", "to"]).sort_index()
+    pd.testing.assert_series_equal(got["count"], ref.rename("count"), check_dtype=False)
+    share = ref / ref.groupby(level="from").transform("sum")
+    np.testing.assert_allclose(got["share"], share)
+
+
+def test_transition_matrix_drops_unpaired_categories(df):
+    ref = _ref_pairs(df, "id").unstack(fill_value=0)
+    m = ca.transition_matrix(df, by="id")
+    # "z" está solo en su sesión: el remapeo de _pairs lo deja afuera
+    assert "z" in df["id"].cat.categories and "z" not in m.index
+    # el resto conserva el orden de las categorías (orden de llegada)
+    assert list(m.index) == list(m.columns) == ["b", "a", "d", "c"]
+    ref = ref.reindex(index=m.index, columns=m.columns, fill_value=0)
+    np.testing.assert_array_equal(m.to_numpy(), ref.to_numpy())
+
+    p = ca.transition_matrix(df, by="id", normalize=True)
+    np.testing.assert_allclose(p.to_numpy(), (ref.T / ref.sum(axis=1)).T.fillna(0))
+
+
+# ---- tiempos ----
+def test_dwell_times_match_groupby(df):
+    got = ca.dwell_times(df)
+    pd.testing.assert_series_equal(got, _ref_dwell(df), check_names=False)
+    # el NaT y la pausa de 2970 s no cuentan
+    assert got[df["timestamp"].isna()].isna().all()
+    assert got.dropna().max() < 60
+
+
+def test_dwell_summary_quantiles_match_groupby(df):
+    dwell = _ref_dwell(df, max_gap_s=None)
+    ref = dwell.groupby(df["source"], observed=True).agg(
+        count="count", median_s="median", mean_s="mean",
+        p90_s=lambda s: s.quantile(0.9))
+    ref = ref[ref["count"] > 0]
+
+    got = ca.dwell_summary(df, by="source", max_gap_s=None)
+    assert got["count"].is_monotonic_decreasing
+    got = got.sort_index()
+    ref = ref.set_axis(ref.index.astype(object)).sort_index()
+    assert list(got.index) == list(ref.index)
+    np.testing.assert_array_equal(got["count"], ref["count"])
+    for col in ("median_s", "mean_s", "p90_s"):
+        np.testing.assert_allclose(got[col], ref[col], err_msg=col)
+
+
+# ---- embudo ----
+def _ref_funnel(df, steps):
+    rows = []
+    prev = None
+    for label, source, interaction in steps:
+        ok = (df["source"] == source) & df["timestamp"].notna() & df["session"].notna()
+        if interaction is not None:
+            ok &= df["interaction"] == interaction
+        first = {}
+        for sess, ts in df[ok].groupby("session", observed=True)["timestamp"]:
+            if prev is not None:
+                if sess not in prev:
+                    continue
+                ts = ts[ts > prev[sess]]
+            if len(ts):
+                first[sess] = ts.min()
+        waits = [(t - prev[s]).total_seconds() for s, t in first.items()] if prev else []
+        rows.append((label, len(first), float(np.median(waits)) if waits else np.nan))
+        prev = first
+    return rows
+
+
+def test_source_funnel_matches_groupby(df):
+    steps = ca.DEFAULT_FUNNEL
+    got = ca.source_funnel(df, steps)
+    ref = _ref_funnel(df, steps)
+    assert list(got.index) == [label for label, _, _ in steps]
+    assert got["sessions"].tolist() == [n for _, n, _ in ref]
+    np.testing.assert_allclose(got["median_s"], [w for _, _, w in ref])
+    n = got["sessions"].to_numpy()
+    np.testing.assert_allclose(got["rate"], n / n[0])
+    np.testing.assert_allclose(got["step_rate"], n / np.r_[n[0], n[:-1]])
+    # d1 hace click en el grafo antes del brush: cuenta el click posterior (t=30)
+    assert got.loc["graph", "sessions"] == 2
+
+
+# ---- brush ----
+def test_brush_sizes(df):
+    got = ca.brush_sizes(df)
+    ref = df.loc[df["interaction"] == "brush", "selected_count"]
+    np.testing.assert_array_equal(got.to_numpy(), ref.to_numpy())
+    assert list(got.index) == list(df.loc[ref.index, "timestamp"])
+
+
+# ---- bordes ----
+def test_empty_frame():
+    df = ClickLog().to_dataframe()
+    assert ca.transitions(df).empty
+    assert ca.transition_matrix(df).empty
+    assert ca.dwell_times(df).empty
+    assert ca.dwell_summary(df).empty
+    funnel = ca.source_funnel(df)
+    assert funnel["sessions"].tolist() == [0, 0, 0]
+    assert funnel["rate"].isna().all()
+    assert ca.brush_sizes(df).empty
+    assert ca.click_report(df) == {}
+
+
+def test_nat_only_session():
+    log = ClickLog()
+    log.extend([_ev("d0", None, "map", interaction="brush", selected=1),
+                _ev("d0", None, "force", "a"), _ev("d0", None, "force", "b")])
+    df = log.to_dataframe()
+    assert ca.dwell_times(df).isna().all()
+    assert ca.dwell_summary(df).empty
+    assert ca.source_funnel(df)["sessions"].tolist() == [0, 0, 0]
+    # sin tiempos el orden de llegada sigue dando la transición
+    assert ca.transitions(df)[["from", "to"]].values.tolist() == [["a", "b"]]
@@ -0,0 +1,69 @@
+import pandas as pd
+import pytest
+
+from our_library.click_db import ClickDB, load_click_dataframe
+
+
+def _events(n, session="d1"):
+    return [{"__ts": f"2026-03-01T10:{i // 60:02d}:{i % 60:02d}+00:00",
+             "__src": "map" if i % 2 else "graph", "__session": session,
+             "id": i, "name": f"N{i}"} for i in range(n)]
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = ClickDB(str(tmp_path / "clicks.sqlite"), batch_size=7, flush_interval=0.01)
+    yield db
+    db.close()
+
+
+def test_put_flush_query_roundtrip(db):
+    events = _events(50)
+    db.put(events[:20])
+    db.put(events[20:])
+    db.flush()
+    assert db.written == 50
+
+    # los eventos vuelven tal cual y en orden de llegada
+    assert db.query() == events
+    assert [e["id"] for e in db.query(source="map")] == list(range(1, 50, 2))
+    assert db.query(node_id=7) == [events[7]]
+    assert db.query(session="otro") == []
+    got = db.query(start="2026-03-01T10:00:10+00:00", end="2026-03-01T10:00:15+00:00")
+    assert [e["id"] for e in got] == [10, 11, 12, 13, 14]
+    assert [e["id"] for e in db.query(source="graph", limit=3)] == [0, 2, 4]
+    assert db.count_by_source() == {"graph": 25, "map": 25}
+
+
+def test_query_waits_for_pending_batches(db):
+    db.put(_events(30))
+    # sin flush explícito: query espera a que el escritor vacíe la cola
+    assert len(db.query()) == 30
+
+
+def test_close_writes_pending_and_rejects_put(tmp_path):
+    path = str(tmp_path / "clicks.sqlite")
+    db = ClickDB(path, batch_size=4, flush_interval=0.01)
+    db.put(_events(10))
+    db.close()
+    assert db.written == 10
+    with pytest.raises(ValueError):
+        db.put(_events(1))
+    db.close()  # cerrar dos veces no falla
+
+    # los eventos siguen en la base: otra instancia (otro kernel) los lee
+    again = ClickDB(path)
+    try:
+        assert [e["id"] for e in again.query()] == list(range(10))
+    finally:
+        again.close()
+
+
+def test_load_click_dataframe(db):
+    db.put(_events(5) + _events(3, session="d2"))
+    db.flush()
+    df = load_click_dataframe(db.path, session="d2")
+    assert df["id"].tolist() == ["0", "1", "2"]
+    assert df["timestamp"].dtype == pd.DatetimeTZDtype("ns", "UTC")
+    assert isinstance(df["source"].dtype, pd.CategoricalDtype)
+    assert df["selected_count"].isna().all()
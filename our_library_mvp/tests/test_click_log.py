@@ -0,0 +1,116 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from our_library.click_log import COLUMNS, ClickLog
+from our_library.click_store import ClickStore
+
+
+def _event(i, src="graph", session="d0", **extra):
+    return {"__ts": f"2026-03-01T10:00:{i % 60:02d}+00:00", "__src": src,
+            "__chart": "force", "__session": session, "id": i, "name": f"N{i % 3}",
+            "SCORE": i / 10, **extra}
+
+
+# ---- compactación ----
+def test_compacts_oldest_half_at_max_rows():
+    log = ClickLog(max_rows=10)
+    log.extend(_event(i, src="map" if i < 5 else "graph") for i in range(10))
+    assert len(log) == 10 and log.start_seq == 0
+
+    log.append(_event(10))  # supera max_rows: se van las 5 filas más antiguas
+    assert len(log) == 6
+    assert log.start_seq == 5
+    df = log.to_dataframe()
+    assert df["id"].astype(int).tolist() == list(range(5, 11))
+    # los conteos incrementales descuentan las filas descartadas
+    assert log.counts("source") == {"graph": 6}
+    assert log.counts("session") == {"d0": 6}
+    # since sigue contando en números de secuencia globales
+    assert log.to_dataframe(since=8)["id"].astype(int).tolist() == [8, 9, 10]
+
+
+def test_views_survive_compaction():
+    log = ClickLog(max_rows=4)
+    log.extend(_event(i) for i in range(4))
+    before = log.to_dataframe()
+    log.extend(_event(i) for i in range(4, 6))
+    assert before["id"].astype(int).tolist() == [0, 1, 2, 3]
+    assert log.to_dataframe()["id"].astype(int).tolist() == [2, 3, 4, 5]
+
+
+# ---- columnas de texto ----
+def test_text_columns_are_dictionary_encoded():
+    log = ClickLog()
+    log.extend([
+        _event(1, src="map"),
+        _event(2, src="graph"),
+        _event(3, src="map", region="CUSCO"),
+        {"__ts": "2026-03-01T10:00:00+00:00", "id": 4},  # sin source/chart/interaction
+    ])
+    assert log._dicts["source"].values == ["map", "graph", "unknown"]
+    assert log._text["source"][:4].tolist() == [0, 1, 0, 2]
+    # ausentes sin valor por defecto -> código -1 (nulo)
+    assert log._text["region"][:4].tolist() == [-1, -1, 0, -1]
+    assert log.counts("source") == {"map": 2, "graph": 1, "unknown": 1}
+
+    df = log.to_dataframe()
+    assert df["source"].tolist() == ["map", "graph", "map", "unknown"]
+    assert df["chart"].tolist() == ["force", "force", "force", "unknown"]
+    assert df["interaction"].tolist() == ["click"] * 4
+    assert df["region"].isna().tolist() == [True, True, False, True]
+    # los ids se guardan como texto (2 y "2" son el mismo valor)
+    assert df["id"].tolist() == ["1", "2", "3", "4"]
+
+
+# ---- to_dataframe ----
+def test_to_dataframe_dtypes():
+    log = ClickLog()
+    log.extend([_event(1, lat=-13.5, lon=-71.9), _event(2, __ts="no es fecha")])
+    df = log.to_dataframe()
+
+    assert list(df.columns) == COLUMNS
+    assert df["timestamp"].dtype == pd.DatetimeTZDtype("ns", "UTC")
+    assert df["timestamp"].iloc[0] == pd.Timestamp("2026-03-01T10:00:01", tz="UTC")
+    assert pd.isna(df["timestamp"].iloc[1])
+    for col in ("source", "chart", "id", "name", "region", "interaction", "session"):
+        assert isinstance(df[col].dtype, pd.CategoricalDtype), col
+    for col in ("SCORE", "lat", "lon", "selected_count"):
+        assert df[col].dtype == np.float64, col
+    np.testing.assert_allclose(df["SCORE"], [0.1, 0.2])
+    assert df["lat"].iloc[0] == -13.5 and np.isnan(df["lat"].iloc[1])
+    assert df["selected_count"].isna().all()
+
+
+def test_empty_log_dataframe():
+    df = ClickLog().to_dataframe()
+    assert df.empty
+    assert list(df.columns) == COLUMNS
+
+
+# ---- sync con el ClickStore ----
+def test_sync_follows_store_window():
+    store = ClickStore(capacity=1024)
+    log = ClickLog(max_rows=store.capacity)
+    store.extend(_event(i) for i in range(1000))
+    snap = log.sync(store)
+    assert len(log) == len(snap) == 1000
+
+    store.extend(_event(i) for i in range(1000, 2100))  # el store suelta bloques
+    snap = log.sync(store)
+    assert log.start_seq == snap.start_seq
+    assert len(log) == len(snap) <= log.max_rows
+    assert log.to_dataframe()["id"].astype(int).tolist() == [e["id"] for e in snap]
+    assert sum(log.counts("source").values()) == len(snap)
+
+
+def test_timestamps_keep_the_instant():
+    # JS manda ISO con Z; el kernel (datetime.now) sin zona = hora local
+    local = datetime(2026, 3, 1, 10, 0, 0)
+    log = ClickLog()
+    log.extend([{"__ts": "2026-03-01T15:00:00.000Z"}, {"__ts": local.isoformat()}])
+    ts = log.to_dataframe()["timestamp"]
+    assert ts.iloc[0] == pd.Timestamp("2026-03-01T15:00:00", tz="UTC")
+    assert ts.iloc[1] == pd.Timestamp(local.astimezone())
+    assert log.to_arrow().schema.field("timestamp").type.tz == "UTC"
@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+pytest.importorskip("flask")
+graph2_1 = pytest.importorskip("our_library.graph2_1")
+
+_NODES = [{"id": i, "name": f"R{i}", "region": "CUSCO", "lat": -13.5, "lon": -71.9,
+           "SCORE": 1.0 - i / 10, "want_to_go": 5} for i in range(6)]
+_LINKS = [{"source": 0, "target": i, "similarity": 0.5} for i in range(1, 6)]
+
+
+def _rerank(anchor, ids):
+    return {
+        "pool": [{"id": i, "name": f"R{i}", "sim": 0.5, "dist_km": 10.0, "same_rg": 1} for i in ids],
+        "base": {"id": anchor, "name": f"R{anchor}"},
+        "topk": 3,
+        "params": {"alpha": 0.7, "geo_km": 50.0, "rg_mode": "bonus", "rg_weight": 0.1},
+        "geo_anchor": True,
+        "rg_available": True,
+    }
+
+
+def _messages(q):
+    out = []
+    while not q.empty():
+        out.append(json.loads(q.get_nowait()[1]))
+    return out
+
+
+@pytest.mark.parametrize("encoding", ["columnar", "json"])
+def test_live_update_carries_rerank_pool(encoding):
+    html = graph2_1.show_dashboard_map_force_radar_linked(
+        _NODES, _LINKS, live=True, encoding=encoding, rerank=_rerank(0, range(1, 6)))
+    channel = graph2_1._dashboards.get(html.dash_id)
+    q = channel.subscribe(since=0)
+
+    graph2_1.push_dashboard_update(html.dash_id, _NODES[:3], _LINKS[:2], rerank=_rerank(2, [7, 8]))
+    (msg,) = _messages(q)
+    assert msg["rerank"]["topk"] == 3 and msg["rerank"]["params"]["alpha"] == 0.7
+    pool = msg["rerank"]["payload"]
+    assert pool["format"] == encoding
+    if encoding == "json":
+        assert [r["id"] for r in pool["pool"]] == [7, 8]
+        assert pool["base"][0]["id"] == 2
+
+    # sin pool nuevo los sliders quedan desactivados (rerank = null)
+    graph2_1.push_dashboard_update(html.dash_id, _NODES[:2], _LINKS[:1])
+    (msg,) = _messages(q)
+    assert msg["rerank"] is None
+
+    # un navegador que se conecta después recibe el último estado completo
+    late = channel.subscribe(since=0)
+    (msg,) = _messages(late)
+    assert msg["reset"] and msg["rerank"] is None
+
+
+def test_live_update_without_controls_sends_no_rerank():
+    html = graph2_1.show_dashboard_map_force_radar_linked(_NODES, _LINKS, live=True, encoding="json")
+    q = graph2_1._dashboards.get(html.dash_id).subscribe(since=0)
+    graph2_1.push_dashboard_update(html.dash_id, _NODES[:3], _LINKS[:2], rerank=_rerank(2, [7]))
+    (msg,) = _messages(q)
+    assert "rerank" not in msg
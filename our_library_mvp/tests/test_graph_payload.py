@@ -0,0 +1,71 @@
+import base64
+import gzip
+import json
+
+import numpy as np
+import pytest
+
+from our_library.graph_payload import pack_columnar, pack_json, payload_to_json
+
+
+def _decode(payload):
+    """Decodificador en Python equivalente a window.__ourlibColumnar.load."""
+    blob = base64.b64decode(payload["data"])
+    if payload["gzip"]:
+        blob = gzip.decompress(blob)
+    out = {}
+    for name, t in payload["tables"].items():
+        rows = [{} for _ in range(t["n"])]
+        for c in t["cols"]:
+            dtype = "<f4" if c["type"] == "f32" else "<i4"
+            values = np.frombuffer(blob, dtype=dtype, count=t["n"], offset=c["offset"])
+            for row, v in zip(rows, values.tolist()):
+                if c["type"] == "str":
+                    v = None if v < 0 else c["dict"][v]
+                row[c["name"]] = v
+        out[name] = rows
+    return out
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_columnar_roundtrip_keeps_id_types(compress):
+    nodes = [
+        {"id": 2, "name": "Machu Picchu", "lat": -13.16},
+        {"id": np.int64(17), "name": None, "lat": None},
+        {"id": "2", "name": "Machu Picchu", "lat": -12.0},
+        {"id": 3.5, "name": "Kuélap", "lat": -6.42},
+    ]
+    links = [{"source": 2, "target": np.int64(17)}, {"source": "2", "target": 3.5}]
+    payload = pack_columnar({
+        "nodes": (nodes, {"id": "str", "name": "str", "lat": "f32"}),
+        "links": (links, {"source": "str", "target": "str"}),
+    }, compress=compress)
+
+    # lo que ve el navegador: el payload pasado por JSON
+    dec = _decode(json.loads(payload_to_json(payload)))
+    ids = [r["id"] for r in dec["nodes"]]
+    assert ids == [2, 17, "2", 3.5]
+    assert [type(i) for i in ids] == [int, int, str, float]
+    assert [r["name"] for r in dec["nodes"]] == ["Machu Picchu", None, "Machu Picchu", "Kuélap"]
+    np.testing.assert_allclose([r["lat"] for r in dec["nodes"]], [-13.16, np.nan, -12.0, -6.42],
+                               rtol=1e-6)
+    assert [(r["source"], r["target"]) for r in dec["links"]] == [(2, 17), ("2", 3.5)]
+
+
+def test_columnar_bools_match_json_mode():
+    rows = [{"id": 1, "flag": True}, {"id": 2, "flag": False}, {"id": 3, "flag": 1}, {"id": 4, "flag": None}]
+    columns = {"id": "str", "flag": "str"}
+    dec = _decode(json.loads(payload_to_json(pack_columnar({"nodes": (rows, columns)}))))
+    flags = [r["flag"] for r in dec["nodes"]]
+    assert flags == [r["flag"] for r in pack_json({"nodes": (rows, columns)})["nodes"]]
+    assert [type(f) for f in flags] == [bool, bool, int, type(None)]
+
+
+def test_columnar_large_ints():
+    big = 2**53 + 1  # un Number de JS no lo representa exacto: va como texto
+    rows = [{"id": 2**40, "same_rg": 1}, {"id": big, "same_rg": 0}]
+    dec = _decode(pack_columnar({"pool": (rows, {"id": "str", "same_rg": "i32"})}))
+    assert [r["id"] for r in dec["pool"]] == [2**40, str(big)]
+
+    with pytest.raises(ValueError, match="same_rg"):
+        pack_columnar({"pool": ([{"same_rg": 2**31}], {"same_rg": "i32"})})
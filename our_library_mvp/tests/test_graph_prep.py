@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from our_library.graph_prep import lttb
+
+
+def _series(n, seed=0):
+    rng = np.random.default_rng(seed)
+    x = np.cumsum(rng.uniform(0.1, 5.0, n))  # estrictamente creciente, paso irregular
+    y = np.cumsum(rng.normal(size=n))
+    return x, y
+
+
+@pytest.mark.parametrize("n, n_out", [(10, 3), (10, 9), (1000, 50), (5000, 4999), (100_000, 2000)])
+def test_lttb_keeps_endpoints_and_size(n, n_out):
+    x, y = _series(n)
+    idx, bounds = lttb(x, y, n_out)
+
+    assert len(idx) == n_out
+    assert idx[0] == 0 and idx[-1] == n - 1
+    assert np.all(np.diff(x[idx]) > 0)
+    # cada punto elegido cae dentro del tramo que representa
+    assert bounds[0] == 0 and bounds[-1] == n and len(bounds) == n_out + 1
+    assert np.all(np.diff(bounds) > 0)
+    assert np.all((bounds[:-1] <= idx) & (idx < bounds[1:]))
+
+
+def test_lttb_keeps_spikes():
+    x = np.arange(1000.0)
+    y = np.zeros(1000)
+    y[[250, 700]] = [10.0, -10.0]
+    idx, _ = lttb(x, y, 20)
+    assert {250, 700} <= set(idx.tolist())
+
+
+@pytest.mark.parametrize("n, n_out", [(2, 5), (50, 50), (50, 80)])
+def test_lttb_short_series_returns_everything(n, n_out):
+    x, y = _series(n)
+    idx, bounds = lttb(x, y, n_out)
+    assert idx.tolist() == list(range(n))
+    assert bounds.tolist() == list(range(n + 1))
@@ -0,0 +1,79 @@
+import os
+
+import pandas as pd
+import pytest
+
+from our_library import turismo_extra_charts as tec
+
+
+@pytest.fixture(autouse=True)
+def _empty_cache():
+    tec.clear_dataset_cache()
+    yield
+    tec.clear_dataset_cache()
+
+
+@pytest.fixture
+def reads(monkeypatch):
+    """Cuenta las lecturas reales del CSV."""
+    calls = []
+    read_csv = pd.read_csv
+
+    def counting(*args, **kwargs):
+        calls.append(args[0])
+        return read_csv(*args, **kwargs)
+
+    monkeypatch.setattr(tec.pd, "read_csv", counting)
+    return calls
+
+
+def _write(path, rows):
+    pd.DataFrame(rows, columns=["FECHA", "REGION", "VISITAS"]).to_csv(path, index=False)
+
+
+def test_cache_hit_and_new_mtime_invalidates(tmp_path, reads):
+    path = tmp_path / "visitas.csv"
+    _write(path, [["2024-01-01", "CUSCO", 10], ["no es fecha", "LIMA", 5]])
+
+    first = tec._load_dataset(path, date_col="FECHA")
+    again = tec._load_dataset(path, date_col="FECHA")
+    assert len(reads) == 1
+    pd.testing.assert_frame_equal(first, again)
+    assert first["FECHA"].dtype.kind == "M" and len(first) == 1  # fecha inválida descartada
+
+    # mismo tamaño, otro contenido: solo cambia el mtime
+    _write(path, [["2024-01-01", "CUSCO", 99], ["no es fecha", "LIMA", 5]])
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    fresh = tec._load_dataset(path, date_col="FECHA")
+    assert len(reads) == 2
+    assert fresh["VISITAS"].tolist() == [99]
+    # la versión anterior del archivo no queda ocupando el cache
+    assert len(tec._dataset_cache) == 1
+
+
+def test_date_col_is_part_of_the_key(tmp_path, reads):
+    path = tmp_path / "visitas.csv"
+    _write(path, [["2024-01-01", "CUSCO", 10]])
+    raw = tec._load_dataset(path)
+    parsed = tec._load_dataset(path, date_col="FECHA")
+    assert len(reads) == 2
+    assert not pd.api.types.is_datetime64_any_dtype(raw["FECHA"])
+    assert parsed["FECHA"].dtype.kind == "M"
+
+
+def test_returned_frames_are_copies(tmp_path, reads):
+    path = tmp_path / "visitas.csv"
+    _write(path, [["2024-01-01", "CUSCO", 10], ["2024-02-01", "PUNO", 20]])
+
+    df = tec._load_dataset(path, date_col="FECHA")
+    df.loc[0, "VISITAS"] = -1
+    df["REGION"] = df["REGION"].str.lower()
+    df["EXTRA"] = 1
+    df.drop(index=1, inplace=True)
+
+    again = tec._load_dataset(path, date_col="FECHA")
+    assert len(reads) == 1
+    assert again["VISITAS"].tolist() == [10, 20]
+    assert again["REGION"].tolist() == ["CUSCO", "PUNO"]
+    assert "EXTRA" not in again.columns
@@ -0,0 +1,149 @@
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from our_library import turismo_feedback, turismo_recs
+from our_library.turismo_feedback import ClickFeedback
+
+
+def _click(t, id, src="force", session=None, **extra):
+    """Evento del bridge en t (segundos desde epoch)."""
+    ts = datetime.fromtimestamp(t, tz=timezone.utc)
+    return {"__ts": ts, "__src": src, "id": id, "__session": session, **extra}
+
+
+def _bonus_ref(pop, aff, fb):
+    out = pop / (pop + fb.pop_k)
+    if aff is None:
+        return out
+    share = fb.affinity_share
+    return (1 - share) * out + share * aff / (aff + fb.aff_k)
+
+
+# ---- decaimiento ----
+def test_popularity_halves_every_half_life():
+    fb = ClickFeedback(["a", "b"], half_life_s=100)
+    t0 = fb._t0
+    assert fb.observe(_click(t0 + 0, "a"))
+    assert fb.observe(_click(t0 + 100, "b"))
+    now = t0 + 200
+    np.testing.assert_allclose(fb.popularity(now), [0.25, 0.5], rtol=1e-6)
+
+
+def test_rescale_keeps_decayed_values():
+    # vida media de 1 s: el exponente pasa _MAX_EXP a los ~72 s
+    fb = ClickFeedback([str(i) for i in range(5)], half_life_s=1.0)
+    t0 = fb._t0
+    rng = np.random.default_rng(0)
+    times = np.sort(rng.uniform(0, 1000, size=200))
+    ids = rng.integers(0, 5, size=200)
+    for t, i in zip(times, ids):
+        fb.observe(_click(t0 + float(t), str(i)))
+    assert fb._t0 > t0  # re-escaló al menos una vez
+    assert np.isfinite(fb._pop).all()
+
+    now = t0 + 1001.0
+    ref = np.zeros(5)
+    np.add.at(ref, ids, 0.5 ** (now - t0 - times))
+    np.testing.assert_allclose(fb.popularity(now), ref, rtol=1e-6, atol=1e-300)
+    assert fb.popularity(now).max() > 0
+
+
+def test_rescale_applies_to_affinity():
+    fb = ClickFeedback(["a", "b"], half_life_s=1.0, affinity_share=1.0)
+    t0 = fb._t0
+    fb.set_anchor("d0", "a")
+    fb.observe(_click(t0 + 0, "b", session="d0"))
+    fb.observe(_click(t0 + 100, "b", session="d0"))  # 100·ln2 > _MAX_EXP
+    assert 100 * np.log(2) > turismo_feedback._MAX_EXP
+    now = fb._t0  # re-escalado al segundo click
+    assert now == pytest.approx(t0 + 100)
+    aff = 1.0 + 0.5 ** 100
+    np.testing.assert_allclose(fb.bonus(0, [1], now=now), aff / (aff + fb.aff_k))
+
+
+# ---- afinidad ----
+def test_pair_array_grows_past_initial_size():
+    n = 40  # 40·39 pares (ancla, recurso) > _INITIAL_PAIRS
+    codes = [f"c{i}" for i in range(n)]
+    fb = ClickFeedback(codes, half_life_s=1e9)
+    t0 = fb._t0
+    for a in range(n):
+        fb.set_anchor(f"d{a}", codes[a])
+    expected = {}
+    for a in range(n):
+        for i in range(n):
+            # el ancla no forma par consigo misma
+            fb.observe(_click(t0 + 0, codes[i], session=f"d{a}"))
+            if i != a:
+                expected[(a, i)] = 1.0
+    fb.observe(_click(t0 + 0, codes[3], session="d7"))
+    expected[(7, 3)] += 1
+
+    assert len(fb._pair_slot) == n * (n - 1) > turismo_feedback._INITIAL_PAIRS
+    assert len(fb._pair_w) == 2 * turismo_feedback._INITIAL_PAIRS
+    now = t0
+    pop = fb.popularity(now)
+    for a in (0, 7, n - 1):
+        idxs = np.arange(n)
+        aff = np.array([expected.get((a, i), 0.0) for i in idxs])
+        np.testing.assert_allclose(fb.bonus(a, idxs, now=now), _bonus_ref(pop, aff, fb), rtol=1e-9)
+    # sin ancla solo cuenta la popularidad
+    np.testing.assert_allclose(fb.bonus(None, [3], now=now), _bonus_ref(pop[[3]], None, fb))
+
+
+# ---- pesos por panel ----
+def test_brush_and_source_weights():
+    fb = ClickFeedback(["a", "b", "c"], half_life_s=1e9)
+    t0 = fb._t0
+    brush = _click(t0 + 0, None, src="map", __interaction="brush",
+                   selected_ids=["a", "b", "x"])  # "x" no está en el catálogo
+    assert fb.observe(brush)
+    assert fb.observe(_click(t0 + 0, "c", src="score"))
+    assert not fb.observe(_click(t0 + 0, "a", src="otro"))  # panel sin peso
+    assert not fb.observe(_click(t0 + 0, "x"))
+    assert not fb.observe(_click(t0 + 0, None, src="map", __interaction="brush"))
+    assert len(fb) == 2
+    np.testing.assert_allclose(fb.popularity(t0), [0.2, 0.2, 1.0])
+
+    fb2 = ClickFeedback(["a", "b"], brush_weight=0.5, source_weights={"map": 2.0})
+    t0 = fb2._t0
+    fb2.observe(_click(t0 + 0, "a", src="map"))
+    fb2.observe(_click(t0 + 0, None, src="map", __interaction="brush", selected_ids=["b"]))
+    fb2.observe(_click(t0 + 0, "b", src="force"))
+    np.testing.assert_allclose(fb2.popularity(t0), [2.0, 0.5])
+
+
+# ---- _rank_candidates ----
+def test_rank_candidates_uses_feedback():
+    df = pd.DataFrame({"CODE": [f"r{i}" for i in range(6)]}, index=np.arange(100, 106))
+    idxs = np.arange(6)
+    dists = np.linspace(0.1, 0.6, 6)  # r0 (la base) < r1 < ... < r5
+    fb = ClickFeedback.from_frame(df, half_life_s=1e9)
+    t0 = fb._t0
+
+    plain = turismo_recs._rank_candidates(df, 100, idxs, dists)
+    assert plain["CODE"].tolist() == ["r1", "r2", "r3", "r4", "r5"]
+    assert "FB_BONUS" not in plain.columns
+
+    fb.set_anchor("d0", "r0")
+    for _ in range(5):
+        fb.observe(_click(t0 + 0, "r5", session="d0"))
+    fb.observe(_click(t0 + 0, "r4"))
+
+    same = turismo_recs._rank_candidates(df, 100, idxs, dists, feedback=fb, fb_weight=0.0)
+    assert same["CODE"].tolist() == plain["CODE"].tolist()
+
+    recs = turismo_recs._rank_candidates(df, 100, idxs, dists, feedback=fb, fb_weight=5.0)
+    assert recs["CODE"].tolist() == ["r5", "r4", "r1", "r2", "r3"]
+    bonus = recs.set_index("CODE")["FB_BONUS"]
+    assert bonus["r5"] > bonus["r4"] > 0 and bonus["r1"] == 0
+    np.testing.assert_allclose(recs["SCORE"], 1 - dists[[5, 4, 1, 2, 3]] + 5 * recs["FB_BONUS"])
+
+    top = turismo_recs._rank_candidates(df, 100, idxs, dists, topk=2, feedback=fb, fb_weight=5.0)
+    assert top["CODE"].tolist() == ["r5", "r4"]
+
+    with pytest.raises(ValueError):
+        turismo_recs._rank_candidates(df.iloc[:5], 100, idxs[:5], dists[:5], feedback=fb)
@@ -0,0 +1,174 @@
+import numpy as np
+import pytest
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from our_library import turismo_recs
+
+_WORDS = ("museo playa iglesia plaza mirador laguna cañón nevado ruinas "
+          "mercado valle selva río catarata puente casona balneario").split()
+
+
+def _corpus(n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    return [" ".join(rng.choice(_WORDS, size=rng.integers(3, 12))) for _ in range(n)]
+
+
+# ---- _fit_transform_tfidf ----
+@pytest.mark.parametrize("n_jobs", [1, 2])
+@pytest.mark.parametrize("min_df, max_features", [(2, None), (2, 40), (1, 20000), (0.05, 25)])
+def test_tfidf_matches_sklearn(monkeypatch, n_jobs, min_df, max_features):
+    # con el umbral real (2000 docs por job) un corpus chico correría en serie
+    monkeypatch.setattr(turismo_recs, "_TFIDF_MIN_DOCS_PER_JOB", 1)
+    texts = _corpus()
+
+    tfidf, X = turismo_recs._fit_transform_tfidf(
+        texts, min_df=min_df, max_features=max_features, ngram_max=2, n_jobs=n_jobs)
+    ref = TfidfVectorizer(min_df=min_df, max_features=max_features, ngram_range=(1, 2))
+    X_ref = ref.fit_transform(texts)
+
+    assert tfidf.vocabulary_ == ref.vocabulary_
+    np.testing.assert_allclose(tfidf.idf_, ref.idf_)
+    assert X.shape == X_ref.shape
+    np.testing.assert_allclose(X.toarray(), X_ref.toarray(), atol=1e-12)
+    # el vectorizador devuelto transforma consultas como el de sklearn
+    q = ["playa y museo", "catarata en la selva"]
+    np.testing.assert_allclose(tfidf.transform(q).toarray(), ref.transform(q).toarray(), atol=1e-12)
+
+
+# ---- _rank_candidates ----
+def _rank_candidates_ref(df, base_idx, idxs, dists, alpha=1.0, geo_km=None,
+                         rg_mode=None, rg_weight=0.05):
+    """Implementación anterior (Series + apply + sort_values), como referencia."""
+    import pandas as pd
+
+    sim = pd.Series(1.0 - np.array(dists), index=idxs)
+    cand = df.iloc[idxs].copy()
+    if base_idx is not None and base_idx in cand.index:
+        cand = cand.drop(index=base_idx)
+    cand["SIM_TEXT"] = cand.index.map(sim).astype(float)
+    if "REGION_GEOGRAFICA" in df.columns and base_idx is not None:
+        base_rg = df.loc[base_idx, "REGION_GEOGRAFICA"]
+        if rg_mode == "filter":
+            cand = cand[cand["REGION_GEOGRAFICA"] == base_rg].copy()
+            cand["RG_BONUS"] = 0.0
+        elif rg_mode == "bonus":
+            cand["RG_BONUS"] = (cand["REGION_GEOGRAFICA"] == base_rg).astype(float)
+        else:
+            cand["RG_BONUS"] = 0.0
+    else:
+        cand["RG_BONUS"] = 0.0
+    cand["DIST_KM"] = np.nan
+    cand["GEO_BONUS"] = 0.0
+    if geo_km is not None and base_idx is not None:
+        lat0, lon0 = df.loc[base_idx, "LATITUD"], df.loc[base_idx, "LONGITUD"]
+        if pd.notna(lat0) and pd.notna(lon0):
+            cand["DIST_KM"] = cand.apply(lambda r: turismo_recs._haversine_km(
+                lat0, lon0, r.get("LATITUD", np.nan), r.get("LONGITUD", np.nan)), axis=1)
+            cand["GEO_BONUS"] = (1.0 - cand["DIST_KM"] / float(geo_km)).clip(lower=0, upper=1)
+    cand["SCORE"] = alpha*cand["SIM_TEXT"] + (1.0 - alpha)*cand["GEO_BONUS"] + rg_weight*cand["RG_BONUS"]
+    cols = [c for c in turismo_recs._RANK_OUT_COLS if c in cand.columns]
+    return cand.sort_values("SCORE", ascending=False)[cols]
+
+
+def _catalogue(n=400, seed=1):
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    lat = rng.uniform(-18, -3, n)
+    lon = rng.uniform(-81, -69, n)
+    lat[rng.random(n) < 0.1] = np.nan  # recursos sin coordenadas -> DIST_KM NaN
+    return pd.DataFrame({
+        "CODE": np.arange(1000, 1000 + n).astype(str),
+        "REGION": rng.choice(["CUSCO", "LIMA", "PUNO", "LORETO"], n),
+        "NOMBRE DEL RECURSO": [f"Recurso {i}" for i in range(n)],
+        "CATEGORIA": rng.choice(["Sitios Naturales", "Manifestaciones Culturales"], n),
+        "LATITUD": lat,
+        "LONGITUD": lon,
+        "REGION_GEOGRAFICA": rng.choice(["COSTA", "SIERRA", "SELVA"], n),
+    })
+
+
+@pytest.mark.parametrize("base_idx", [7, 3])   # 3: ancla sin coordenadas
+@pytest.mark.parametrize("alpha, geo_km", [(1.0, None), (0.6, 300.0), (0.0, 150.0)])
+@pytest.mark.parametrize("rg_mode", [None, "bonus", "filter"])
+@pytest.mark.parametrize("topk", [None, 10])
+def test_rank_candidates_matches_sort_values(base_idx, alpha, geo_km, rg_mode, topk):
+    import pandas as pd
+
+    df = _catalogue()
+    df.loc[3, "LATITUD"] = np.nan
+    rng = np.random.default_rng(base_idx)
+    idxs = np.concatenate([[base_idx], rng.choice(np.setdiff1d(np.arange(len(df)), [base_idx]),
+                                                 size=120, replace=False)])
+    dists = np.sort(rng.uniform(0.0, 1.0, len(idxs)))
+    dists[0] = 0.0
+
+    got = turismo_recs._rank_candidates(df, base_idx, idxs, dists, alpha=alpha, geo_km=geo_km,
+                                        rg_mode=rg_mode, rg_weight=0.05, topk=topk)
+    ref = _rank_candidates_ref(df, base_idx, idxs, dists, alpha=alpha, geo_km=geo_km,
+                               rg_mode=rg_mode, rg_weight=0.05)
+
+    assert base_idx not in got.index
+    assert list(got.columns) == list(ref.columns)
+    # mismos SCORE en el mismo orden (NaN al final)
+    n = len(got) if topk is not None else len(ref)
+    assert len(got) == min(len(ref), topk or len(ref))
+    np.testing.assert_allclose(got["SCORE"].to_numpy(), ref["SCORE"].to_numpy()[:n],
+                               rtol=1e-9, equal_nan=True)
+    # sort_values (quicksort) no fija el orden de los empates; el nuevo deja
+    # el orden de los vecinos. Fuera de los empates el orden es el mismo.
+    score = ref["SCORE"].round(12)
+    tied = score.duplicated(keep=False) | score.isna()
+    untied = ref.index[~tied.to_numpy()]
+    assert [i for i in got.index if i in untied] == [i for i in ref.index[:n] if i in untied]
+    # y cada fila devuelta es la misma fila de la referencia
+    pd.testing.assert_frame_equal(got, ref.loc[got.index], check_dtype=False, rtol=1e-9)
+    if topk is None:
+        assert set(got.index) == set(ref.index)
+
+
+# ---- evaluate_grid ----
+def _eval_catalogue(with_rg=True):
+    df = _catalogue(n=240)
+    df["TEXT"] = _corpus(n=len(df), seed=3)
+    df["SUB_TIPO_CATEGORIA"] = np.random.default_rng(4).choice(["Playas", "Museos", "Lagunas"], len(df))
+    if not with_rg:
+        df = df.drop(columns="REGION_GEOGRAFICA")
+    tfidf = TfidfVectorizer(ngram_range=(1, 2)).fit(df["TEXT"])
+    return tfidf, df
+
+
+def _evaluate(monkeypatch, df, tfidf, **kwargs):
+    monkeypatch.setattr(turismo_recs, "_load_models", lambda model_dir: (tfidf, None, df))
+    res = turismo_recs.evaluate_grid("unused", alphas=(0.7,), topk=5, n_jobs=1, **kwargs)
+    return res.drop(columns=["rg_mode", "geo_km"]).sort_values("alpha", kind="stable")
+
+
+def test_evaluate_grid_geo_km_zero_means_no_geo(monkeypatch):
+    import warnings
+
+    tfidf, df = _eval_catalogue()
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")  # sin división por cero
+        zero = _evaluate(monkeypatch, df, tfidf, geo_kms=(0,), rg_modes=(None,))
+        none = _evaluate(monkeypatch, df, tfidf, geo_kms=(None,), rg_modes=(None,))
+        neg_rel = _evaluate(monkeypatch, df, tfidf, geo_kms=(None,), rg_modes=(None,), rel_km=0)
+        no_rel = _evaluate(monkeypatch, df, tfidf, geo_kms=(None,), rg_modes=(None,), rel_km=None)
+    assert zero.equals(none)
+    assert neg_rel.equals(no_rel)
+
+
+def test_evaluate_grid_rg_filter_without_column_matches_serving(monkeypatch):
+    tfidf, df = _eval_catalogue(with_rg=False)
+    filt = _evaluate(monkeypatch, df, tfidf, geo_kms=(40.0,), rg_modes=("filter",))
+    none = _evaluate(monkeypatch, df, tfidf, geo_kms=(40.0,), rg_modes=(None,))
+    assert filt["queries"].iloc[0] > 0
+    assert filt.equals(none)
+
+    # _rank_candidates ignora el filtro igual
+    idxs = np.arange(1, 60)
+    dists = np.linspace(0.1, 0.9, len(idxs))
+    a = turismo_recs._rank_candidates(df, 0, idxs, dists, alpha=0.7, geo_km=40.0, rg_mode="filter")
+    b = turismo_recs._rank_candidates(df, 0, idxs, dists, alpha=0.7, geo_km=40.0, rg_mode=None)
+    assert len(a) == len(idxs)
+    assert a.index.equals(b.index)